@@ -21,18 +21,44 @@ from scipy.stats import weibull_min
 import math
 
 from calculator import *
+from profiler import stage
+import progress
 
 
 
-def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp, set_years, set_vehicles, shape, scale, sensitivity):
+# The sensitivity analysis consists of three steps, which the task graph of a run (see main.py) executes as separate tasks:
+#
+#   plan_sa       SA runs (sign, name, label, perturbation, perturbed inputs) and titles of the parameters
+#   calc_sa       results of calc_all for all or some of the SA runs
+#   collect_sa    results per direction and parameter (sa_result, see run_sa)
+
+def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp, set_years, set_vehicles, shape, scale, sensitivity, engine='reference', workers=1, arrays_path=None, checkpoints=None):
+
+    runs, sa_titles = plan_sa(start_year, end_year, n_vehicles, vehicles_data, cagr, loss, dismantling, recycling, production, sensitivity)
+
+    progress.plan('sa_run', len(runs))
+
+    results = calc_sa(runs, start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, engine, workers, f'{arrays_path}sa_fleet_detail.npy' if arrays_path is not None else None, checkpoints, lambda label, n, skipped: progress.done('sa_run', label, n, skipped))
+
+    return collect_sa(runs, results, sa_titles)
+
+
+
+###
+###  (SA.1, SA.2) SA RUNS
+###
+
+# All SA runs are collected first and calculated afterwards (see calc_sa). Each run is also described by its perturbation (input, column, vehicle or None, factor, maximum or None) for the worker processes (see sa_shared.py).
+
+def plan_sa(start_year, end_year, n_vehicles, vehicles_data, cagr, loss, dismantling, recycling, production, sensitivity):
 
-    sa_data_plus = []
-    sa_data_minus = []
     sa_titles = []
-    sa_tmp_plus = {}
-    sa_tmp_minus = {}
-    sa_tmp_elements = ['vehicles_data', 'cagr', 'registrations', 'fleet_detail', 'fleet', 'eol', 'loss', 'dismantling', 'recycling', 'production']
-    
+
+    runs = []
+
+    def add_run(sign, name, label, perturbation, _vehicles_data, _cagr, _loss, _dismantling, _recycling, _production):
+        runs.append((sign, name, label, perturbation, [_vehicles_data, _cagr, _loss, _dismantling, _recycling, _production]))
+
 
     # (SA.1) INPUT DATA
 
@@ -47,14 +73,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = vehicles_data.loc[(i, j), 'total_mass'] 
             _vehicles_data.loc[(i, j), 'total_mass'] = value * (1 + sensitivity)
             
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, _vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_plus.append(_closedloop)
-
         name = f'total_mass_vehicle_{i}'
-        sa_tmp_plus[name] = [_vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-        print(f'   (SA:) calculating +{sensitivity * 100}% for total_mass, vehicle {i} done.')
+        add_run('+', name, f'+{sensitivity * 100}% for total_mass, vehicle {i}', ('vehicles_data', 'total_mass', i, 1 + sensitivity, None), _vehicles_data, cagr, loss, dismantling, recycling, production)
 
 
         _vehicles_data = vehicles_data.copy()
@@ -63,22 +83,18 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = vehicles_data.loc[(i, j), 'total_mass'] 
             _vehicles_data.loc[(i, j), 'total_mass'] = value * (1 - sensitivity)
             
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, _vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_minus.append(_closedloop)
-        
-        sa_tmp_minus[name] = [_vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-        print(f'   (SA:) calculating -{sensitivity * 100}% for total_mass, vehicle {i} done.')
+        add_run('-', name, f'-{sensitivity * 100}% for total_mass, vehicle {i}', ('vehicles_data', 'total_mass', i, 1 - sensitivity, None), _vehicles_data, cagr, loss, dismantling, recycling, production)
 
         sa_titles.append(f'total mass of vehicle {i}')
 
 
     # (SA.1.1.2) VEHICLES_DATA: PLASTIC CONTENTS
 
-    parameter = ['plastic_content', 'pp_content', 'pa_content', 'pc_content', 'abs_content']
+    polymers = polymers_of(vehicles_data)
 
-    parameter_titels = ['plastic content', 'PP content', 'PA content', 'PC content', 'ABS content']
+    parameter = ['plastic_content'] + [f'{polymer}_content' for polymer in polymers]
+
+    parameter_titels = ['plastic content'] + [f'{polymer.upper()} content' for polymer in polymers]
     parameter_count = 0
 
     for p in parameter:
@@ -90,14 +106,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
                 value = vehicles_data.loc[(i, j), p] 
                 _vehicles_data.loc[(i, j), p] = min(value * (1 + sensitivity), 100) # max 100%
                 
-            _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, _vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-            sa_data_plus.append(_closedloop)
-
             name = f'{p}_vehicle_{i}'
-            sa_tmp_plus[name] = [_vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-            print(f'   (SA:) calculating +{sensitivity * 100}% for {p}, vehicle {i} done.')
+            add_run('+', name, f'+{sensitivity * 100}% for {p}, vehicle {i}', ('vehicles_data', p, i, 1 + sensitivity, 100), _vehicles_data, cagr, loss, dismantling, recycling, production)
 
 
             _vehicles_data = vehicles_data.copy()
@@ -106,13 +116,7 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
                 value = vehicles_data.loc[(i, j), p] 
                 _vehicles_data.loc[(i, j), p] = value * (1 - sensitivity)
                 
-            _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, _vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-            sa_data_minus.append(_closedloop)
-
-            sa_tmp_minus[name] = [_vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-            print(f'   (SA:) calculating -{sensitivity * 100}% for {p}, vehicle {i} done.')
+            add_run('-', name, f'-{sensitivity * 100}% for {p}, vehicle {i}', ('vehicles_data', p, i, 1 - sensitivity, None), _vehicles_data, cagr, loss, dismantling, recycling, production)
 
             sa_titles.append(f'{parameter_titels[parameter_count]} of vehicle {i}')
         
@@ -123,25 +127,13 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
 
     _cagr = cagr * (1 + sensitivity)
 
-    _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, _cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-    sa_data_plus.append(_closedloop)
-
     name = f'cagr'
-    sa_tmp_plus[name] = [vehicles_data, _cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-    print(f'   (SA:) calculating +{sensitivity * 100}% for CAGR done.')
+    add_run('+', name, f'+{sensitivity * 100}% for CAGR', ('cagr', None, None, 1 + sensitivity, None), vehicles_data, _cagr, loss, dismantling, recycling, production)
 
 
     _cagr = cagr * (1 - sensitivity)
 
-    _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, _cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-    sa_data_minus.append(_closedloop)
-
-    sa_tmp_minus[name] = [vehicles_data, _cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, production]
-
-    print(f'   (SA:) calculating -{sensitivity * 100}% for CAGR done.')
+    add_run('-', name, f'-{sensitivity * 100}% for CAGR', ('cagr', None, None, 1 - sensitivity, None), vehicles_data, _cagr, loss, dismantling, recycling, production)
 
     sa_titles.append(f'CAGR')
 
@@ -158,14 +150,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = loss.loc[j, p] 
             _loss.loc[j, p] = min(value * (1 + sensitivity), 100)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, _loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_plus.append(_closedloop)
-
         name = f'{p}'
-        sa_tmp_plus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, _loss, dismantling, recycling, production]
-
-        print(f'   (SA:) calculating +{sensitivity * 100}% for {p} done.')
+        add_run('+', name, f'+{sensitivity * 100}% for {p}', ('loss', p, None, 1 + sensitivity, 100), vehicles_data, cagr, _loss, dismantling, recycling, production)
 
 
         _loss = loss.copy()
@@ -174,22 +160,16 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = loss.loc[j, p] 
             _loss.loc[j, p] = value * (1 - sensitivity)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, _loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_minus.append(_closedloop)
-
-        sa_tmp_minus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, _loss, dismantling, recycling, production]
-
-        print(f'   (SA:) calculating -{sensitivity * 100}% for {p} done.')
+        add_run('-', name, f'-{sensitivity * 100}% for {p}', ('loss', p, None, 1 - sensitivity, None), vehicles_data, cagr, _loss, dismantling, recycling, production)
 
         sa_titles.append(f'{p.replace("_", " ")}')
 
 
     ### (SA.1.4) DISMANTLING CONTENT
 
-    parameter = ['pp_mass', 'pa_mass', 'pc_mass', 'abs_mass']
+    for polymer in polymers:
+        p = f'{polymer}_mass'
 
-    for p in parameter:
         for i in range(1, n_vehicles + 1):
 
             _dismantling = dismantling.copy()
@@ -198,14 +178,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
                 value = dismantling.loc[(i,j), p] 
                 _dismantling.loc[(i,j), p] = value * (1 + sensitivity)
 
-            _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, _dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-            sa_data_plus.append(_closedloop)
-
             name = f'dismantling_{p}_vehicle_{i}'
-            sa_tmp_plus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, _dismantling, recycling, production]
-
-            print(f'   (SA:) calculating +{sensitivity * 100}% for dismantling {p}, vehicle {i} done.')
+            add_run('+', name, f'+{sensitivity * 100}% for dismantling {p}, vehicle {i}', ('dismantling', p, i, 1 + sensitivity, None), vehicles_data, cagr, loss, _dismantling, recycling, production)
 
 
             _dismantling = dismantling.copy()
@@ -214,23 +188,15 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
                 value = dismantling.loc[(i,j), p] 
                 _dismantling.loc[(i,j), p] = value * (1 - sensitivity)
 
-            _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, _dismantling, recycling, production, set_years, set_vehicles, shape, scale)
-
-            sa_data_minus.append(_closedloop)
+            add_run('-', name, f'-{sensitivity * 100}% for dismantling {p}, vehicle {i}', ('dismantling', p, i, 1 - sensitivity, None), vehicles_data, cagr, loss, _dismantling, recycling, production)
 
-            sa_tmp_minus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, _dismantling, recycling, production]
-
-            print(f'   (SA:) calculating -{sensitivity * 100}% for dismantling {p}, vehicle {i} done.')
-
-            title = f'{p.replace("_", " ")}'
-            sa_titles.append(f'dismantled {title[:3].upper() + title[3:]} of vehicle {i}')
+            sa_titles.append(f'dismantled {polymer.upper()} mass of vehicle {i}')
 
 
     ### (SA.1.5) RECYCLING EFFICIENCY
 
-    parameter = ['pp_efficiency', 'pa_efficiency', 'pc_efficiency', 'abs_efficiency']
-
-    for p in parameter:
+    for polymer in polymers:
+        p = f'{polymer}_efficiency'
 
         _recycling = recycling.copy()
 
@@ -238,14 +204,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = recycling.loc[j, p] 
             _recycling.loc[j, p] = min(value * (1 + sensitivity), 100)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, _recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_plus.append(_closedloop)
-
         name = f'recycling_{p}'
-        sa_tmp_plus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, _recycling, production]
-
-        print(f'   (SA:) calculating +{sensitivity * 100}% for recycling {p} done.')
+        add_run('+', name, f'+{sensitivity * 100}% for recycling {p}', ('recycling', p, None, 1 + sensitivity, 100), vehicles_data, cagr, loss, dismantling, _recycling, production)
 
 
         _recycling = recycling.copy()
@@ -254,23 +214,15 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = recycling.loc[j, p] 
             _recycling.loc[j, p] = value * (1 - sensitivity)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, _recycling, production, set_years, set_vehicles, shape, scale)
-
-        sa_data_minus.append(_closedloop)
-
-        sa_tmp_minus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, _recycling, production]
+        add_run('-', name, f'-{sensitivity * 100}% for recycling {p}', ('recycling', p, None, 1 - sensitivity, None), vehicles_data, cagr, loss, dismantling, _recycling, production)
 
-        print(f'   (SA:) calculating -{sensitivity * 100}% for recycling {p} done.')
-
-        title = f'{p.replace("_", " ")}'
-        sa_titles.append(f'recycling {title[:3].upper() + title[3:]}')
+        sa_titles.append(f'recycling {polymer.upper()} efficiency')
 
 
     ### (SA.1.6) PRODUCTION EFFICIENCY
 
-    parameter = ['pp_efficiency', 'pa_efficiency', 'pc_efficiency', 'abs_efficiency']
-
-    for p in parameter:
+    for polymer in polymers:
+        p = f'{polymer}_efficiency'
 
         _production = production.copy()
 
@@ -278,14 +230,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = production.loc[j, p] 
             _production.loc[j, p] = min(value * (1 + sensitivity), 100)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, _production, set_years, set_vehicles, shape, scale)
-
-        sa_data_plus.append(_closedloop)
-
         name = f'production_{p}'
-        sa_tmp_plus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, _production]
-
-        print(f'   (SA:) calculating +{sensitivity * 100}% for production {p} done.')
+        add_run('+', name, f'+{sensitivity * 100}% for production {p}', ('production', p, None, 1 + sensitivity, 100), vehicles_data, cagr, loss, dismantling, recycling, _production)
 
 
         _production = production.copy()
@@ -294,23 +240,15 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = production.loc[j, p] 
             _production.loc[j, p] = value * (1 - sensitivity)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, _production, set_years, set_vehicles, shape, scale)
-
-        sa_data_minus.append(_closedloop)
-
-        sa_tmp_minus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, _production] 
+        add_run('-', name, f'-{sensitivity * 100}% for production {p}', ('production', p, None, 1 - sensitivity, None), vehicles_data, cagr, loss, dismantling, recycling, _production)
 
-        print(f'   (SA:) calculating -{sensitivity * 100}% for production {p} done.')
-
-        title = f'{p.replace("_", " ")}'
-        sa_titles.append(f'production {title[:3].upper() + title[3:]}')
+        sa_titles.append(f'production {polymer.upper()} efficiency')
 
 
     ### (SA.1.7) MAXIMUM RECYCLED INPUT
 
-    parameter = ['max_pp', 'max_pa', 'max_pc', 'max_abs']
-
-    for p in parameter:
+    for polymer in polymers:
+        p = f'max_{polymer}'
 
         _production = production.copy()
 
@@ -318,14 +256,8 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = production.loc[j, p] 
             _production.loc[j, p] = min(value * (1 + sensitivity), 100)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, _production, set_years, set_vehicles, shape, scale)
-
-        sa_data_plus.append(_closedloop)
-
         name = f'production_{p}'
-        sa_tmp_plus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, _production]
-
-        print(f'   (SA:) calculating +{sensitivity * 100}% for production {p} done.')
+        add_run('+', name, f'+{sensitivity * 100}% for production {p}', ('production', p, None, 1 + sensitivity, 100), vehicles_data, cagr, loss, dismantling, recycling, _production)
 
 
         _production = production.copy()
@@ -334,16 +266,9 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
             value = production.loc[j, p] 
             _production.loc[j, p] = value * (1 - sensitivity)
 
-        _registrations, _fleet_detail, _fleet, _eol, _closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, _production, set_years, set_vehicles, shape, scale)
-
-        sa_data_minus.append(_closedloop)
-
-        sa_tmp_minus[name] = [vehicles_data, cagr, _registrations, _fleet_detail, _fleet, _eol, loss, dismantling, recycling, _production]
-
-        print(f'   (SA:) calculating -{sensitivity * 100}% for production {p} done.')
+        add_run('-', name, f'-{sensitivity * 100}% for production {p}', ('production', p, None, 1 - sensitivity, None), vehicles_data, cagr, loss, dismantling, recycling, _production)
 
-        title = p[4:].upper()
-        sa_titles.append(f'max recycled {title} input')
+        sa_titles.append(f'max recycled {polymer.upper()} input')
 
 
     # (SA.2) MODEL DATA
@@ -404,4 +329,134 @@ def run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_ini
     # sa_titles.append('Weibull scale parameter')
 
 
+    return runs, sa_titles
+
+
+# Number of SA runs of plan_sa for the inputs of a scenario, without planning them (e.g. for the progress of a run, see progress.py)
+
+def count_sa(n_vehicles, vehicles_data):
+
+    n_polymers = len(polymers_of(vehicles_data))
+
+    # total mass, plastic and polymer contents per vehicle; CAGR; exports and unknown whereabouts; dismantling per vehicle and polymer; recycling, production and maximum recycled input per polymer
+
+    return 2 * (n_vehicles * (2 + n_polymers) + 1 + 2 + n_vehicles * n_polymers + 3 * n_polymers)
+
+
+
+###
+###  (SA.3) CALCULATE SA RUNS
+###
+
+# Results of calc_all (registrations, fleet_detail, fleet, eol, closedloop) for the SA runs, either one by one with calc_all, with engine = 'batch' in a single vectorized call of batch.calc_all_frames, or with more than one worker on parallel processes that share the baseline inputs (see sa_shared.py). With arrays_file, the fleet_detail arrays of the runs are written into this memory-mapped file (see storage.py). report(label, n, skipped) is called for completed runs (see progress.py).
+
+def calc_sa(runs, start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, engine='reference', workers=1, arrays_file=None, checkpoints=None, report=None):
+
+    if report is None:
+        report = lambda label, n, skipped: None
+
+    # With checkpoints (see checkpoint.py), the results of each run are saved as soon as they are calculated, and the runs completed before an interruption are loaded instead of calculated again:
+
+    keys = [sa_key(run) for run in runs]
+
+    results = [checkpoints.get(key) if checkpoints is not None else None for key in keys]
+    todo = [r for r in range(len(runs)) if results[r] is None]
+
+    if len(todo) < len(runs):
+        report('restored from checkpoints', len(runs) - len(todo), True)
+
+        print(f'   (SA:) {len(runs) - len(todo)} of {len(runs)} runs restored from checkpoints.')
+
+        # The restored runs may be views on the arrays file of the interrupted attempt, so the other runs are written into a new file:
+
+        if arrays_file is not None:
+            from storage import resume_array_file
+
+            arrays_file = resume_array_file(arrays_file)
+
+    def done(r, result):
+        results[r] = result
+
+        if checkpoints is not None:
+            checkpoints.put(keys[r], result)
+
+    if todo and workers > 1 and engine != 'continuous':
+        from sa_shared import calc_sa_shared
+
+        with stage('sa_run', run=f'{len(todo)} runs on {workers} processes'):
+            computed = calc_sa_shared(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, [(runs[r][1], runs[r][0], runs[r][3]) for r in todo], workers, arrays_file)
+
+        for r, result in zip(todo, computed):
+            done(r, result)
+
+        report(f'{len(todo)} runs on {workers} processes', len(todo), False)
+
+    elif todo and engine == 'batch':
+        from batch import calc_all_frames
+
+        inputs = [[runs[r][4][k] for r in todo] for k in range(6)]
+
+        out = None
+
+        if arrays_file is not None:
+            from storage import create_array
+            from batch import FLEET_COLUMNS
+
+            out = create_array(arrays_file, (len(todo), n_vehicles, n_years, n_years, len(FLEET_COLUMNS)))
+
+        with stage('sa_run', run=f'batch of {len(todo)} runs'):
+            computed = calc_all_frames(start_year, end_year, inputs[0], inputs[1], n_init_years, registrations, inputs[2], inputs[3], inputs[4], inputs[5], set_years, set_vehicles, [shape] * len(todo), [scale] * len(todo), out)
+
+        for r, result in zip(todo, computed):
+            done(r, result)
+
+        report(f'batch of {len(todo)} runs', len(todo), False)
+
+    for r, (sign, name, label, perturbation, (_vehicles_data, _cagr, _loss, _dismantling, _recycling, _production)) in enumerate(runs):
+
+        if results[r] is None:
+            with stage('sa_run', run=label):
+                done(r, calc_all(start_year, end_year, _vehicles_data, _cagr, n_init_years, registrations, _loss, _dismantling, _recycling, _production, set_years, set_vehicles, shape, scale, engine))
+
+            report(label, 1, False)
+
+        print(f'   (SA:) calculating {label} done.{progress.status()}')
+
+    return results
+
+
+# Checkpoint name of an SA run
+
+def sa_key(run):
+
+    return f"sa_{'plus' if run[0] == '+' else 'minus'}_{run[1]}"
+
+
+
+###
+###  (SA.4) COLLECT SA RESULTS
+###
+
+# Results of the SA runs per direction and parameter: sa_data_plus, sa_data_minus (closedloop per parameter), sa_titles, sa_tmp_plus, sa_tmp_minus ({name: [inputs and results]}), sa_tmp_elements
+
+def collect_sa(runs, results, sa_titles):
+
+    sa_data_plus = []
+    sa_data_minus = []
+    sa_tmp_plus = {}
+    sa_tmp_minus = {}
+    sa_tmp_elements = ['vehicles_data', 'cagr', 'registrations', 'fleet_detail', 'fleet', 'eol', 'loss', 'dismantling', 'recycling', 'production']
+
+    for r, (sign, name, label, perturbation, (_vehicles_data, _cagr, _loss, _dismantling, _recycling, _production)) in enumerate(runs):
+
+        _registrations, _fleet_detail, _fleet, _eol, _closedloop = results[r]
+
+        if sign == '+':
+            sa_data_plus.append(_closedloop)
+            sa_tmp_plus[name] = [_vehicles_data, _cagr, _registrations, _fleet_detail, _fleet, _eol, _loss, _dismantling, _recycling, _production]
+
+        else:
+            sa_data_minus.append(_closedloop)
+            sa_tmp_minus[name] = [_vehicles_data, _cagr, _registrations, _fleet_detail, _fleet, _eol, _loss, _dismantling, _recycling, _production]
+
     return sa_data_plus, sa_data_minus, sa_titles, sa_tmp_plus, sa_tmp_minus, sa_tmp_elements
\ No newline at end of file
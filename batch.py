@@ -0,0 +1,462 @@
+####
+#
+# CAPsim
+# Batch Calculation Module
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Evaluates calc_all for a batch of parameter sets in one vectorized call. All inputs carry a leading batch axis (b):
+#
+#   vehicles_data[b, id, year, column]      columns as in VEHICLES_COLUMNS
+#   cagr[b], shape[b], scale[b]
+#   loss[b, year, column]                   columns as in LOSS_COLUMNS
+#   dismantling[b, id, year, polymer]
+#   recycling[b, year, polymer]
+#   production[b, year, column]             columns as in PRODUCTION_COLUMNS
+#
+# The polymer axis follows the polymers of the scenario (see calculator.polymers_of), which all members share; the column lists below are those of the default polymers.
+#
+# Registrations and the number of initialization years are shared by all members. The vehicle fleet is calculated once per distinct (cagr, shape, scale) with the cohort survival kernel over the active ages of the cohorts (kernel.py), and all following stages run as array operations over the batch. Sums are accumulated in the same order as in calculator.py, so every member reproduces the results of calc_all.
+
+
+
+import numpy as np
+import pandas as pd
+
+from kernel import survival_active, weibull_pdf
+from calculator import POLYMERS, polymers_of, polymer_columns, calc_registrations
+
+
+
+VEHICLES_COLUMNS = polymer_columns(POLYMERS)['vehicles_data']
+LOSS_COLUMNS = ['exports', 'unknown_whereabouts']
+DISMANTLING_COLUMNS = polymer_columns(POLYMERS)['dismantling']
+RECYCLING_COLUMNS = polymer_columns(POLYMERS)['recycling']
+PRODUCTION_COLUMNS = polymer_columns(POLYMERS)['production']
+
+FLEET_COLUMNS = ['stock', 'elvs_exit', 'elvs_export', 'elvs_unknown', 'elvs_recycling']
+EOL_COLUMNS = polymer_columns(POLYMERS)['eol']
+CLOSEDLOOP_COLUMNS = polymer_columns(POLYMERS)['closedloop']
+
+
+
+###
+###  (1) STACK INPUTS
+###
+
+# Convert lists of input DataFrames (one per member) into arrays with a leading batch axis
+
+def stack_frames(frames, columns, set_years, set_vehicles=None):
+
+    if set_vehicles is None:
+        index = pd.Index(list(set_years))
+        shape = (len(set_years), len(columns))
+    else:
+        index = pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])
+        shape = (len(set_vehicles), len(set_years), len(columns))
+
+    return np.stack([df.reindex(index)[columns].to_numpy(dtype=float).reshape(shape) for df in frames])
+
+
+def stack_inputs(set_years, set_vehicles, vehicles_data, cagr, loss, dismantling, recycling, production, shape, scale):
+
+    polymers = polymers_of(vehicles_data[0])
+
+    if any(polymers_of(df) != polymers for df in vehicles_data):
+        raise ValueError('(!) All members of a batch need the same polymers.')
+
+    columns = polymer_columns(polymers)
+
+    return {
+        'polymers': polymers,
+        'vehicles_data': stack_frames(vehicles_data, columns['vehicles_data'], set_years, set_vehicles),
+        'cagr': np.array(cagr, dtype=float),
+        'loss': stack_frames(loss, LOSS_COLUMNS, set_years),
+        'dismantling': stack_frames(dismantling, columns['dismantling'], set_years, set_vehicles),
+        'recycling': stack_frames(recycling, columns['recycling'], set_years),
+        'production': stack_frames(production, columns['production'], set_years),
+        'shape': np.array(shape, dtype=float),
+        'scale': np.array(scale, dtype=float)}
+
+
+
+###
+###  (2) STAGES
+###
+
+# Sum over an axis in ascending order (like the loops in calculator.py) instead of numpy's pairwise summation
+
+def ordered_sum(x, axis):
+
+    x = np.moveaxis(x, axis, 0)
+    total = np.zeros(x.shape[1:])
+
+    for k in range(x.shape[0]):
+        total += x[k]
+
+    return total
+
+
+# registrations[b, id, year]
+
+def batch_registrations(start_year, end_year, set_years, set_vehicles, cagr, n_init_years, registrations):
+
+    return grow_registrations(init_registrations(set_years, set_vehicles, n_init_years, registrations), start_year, end_year, cagr, n_init_years)
+
+
+# init[id, year] of the initialization years
+
+def init_registrations(set_years, set_vehicles, n_init_years, registrations):
+
+    if n_init_years == 0:
+        raise ValueError('(!) Registrations cannot be predicted because no registration data is defined in the input file. Please add registration data for at least one year.')
+
+    years = list(set_years)
+    n_init = min(n_init_years, len(years))
+
+    return registrations['registrations'].reindex(pd.MultiIndex.from_product([list(set_vehicles), years[:n_init]])).to_numpy(dtype=float).reshape(len(set_vehicles), n_init)
+
+
+# registrations[b, id, year] from the registrations init[id, year] of the initialization years
+
+def grow_registrations(init, start_year, end_year, cagr, n_init_years):
+
+    n_vehicles, n_init = init.shape
+    n_years = end_year - start_year + 1
+
+    # Growth factors (1 + CAGR)^(number of years), evaluated with the same operand types as in calc_registrations:
+
+    init_year = start_year + n_init_years - 1
+
+    growth = np.array([[(1 + float(c) / 100) ** (year - init_year) for year in range(init_year + 1, end_year + 1)] for c in cagr], dtype=float).reshape(len(cagr), n_years - n_init)
+
+    reg = np.empty((len(cagr), n_vehicles, n_years))
+    reg[:, :, :n_init] = init
+    reg[:, :, n_init:] = init[None, :, -1:] * growth[:, None, :]
+
+    return reg
+
+
+# Cohort survival over the active ages (see kernel.py), calculated once per distinct (cagr, shape, scale): stock_age[g, id, year_reg, age] and the group g of each member. Groups with fewer active ages are padded with their residual stocks.
+
+def batch_survival(reg, cagr, shape, scale):
+
+    n_batch, n_vehicles, n_years = reg.shape
+
+    groups = {}
+    member_group = np.empty(n_batch, dtype=int)
+
+    for b in range(n_batch):
+        member_group[b] = groups.setdefault((cagr[b], shape[b], scale[b]), len(groups))
+
+    stock_ages = []
+
+    for (c, k, l), g in groups.items():
+        b = int(np.argmax(member_group == g))
+
+        stock_age, _ = survival_active(np.ascontiguousarray(reg[b].reshape(-1)), weibull_pdf(n_years, k, l))
+        stock_ages.append(stock_age.reshape(n_vehicles, n_years, -1))
+
+    n_active = max(s.shape[-1] for s in stock_ages)
+
+    stock_age = np.stack([np.concatenate([s, np.repeat(s[..., -1:], n_active - s.shape[-1], axis=-1)], axis=-1) for s in stock_ages])
+
+    return stock_age, member_group
+
+
+# stock[b, id, year_reg, year_now]
+
+def batch_fleet(reg, cagr, shape, scale):
+
+    stock_age, member_group = batch_survival(reg, cagr, shape, scale)
+
+    return cohort_stock(stock_age)[member_group]
+
+
+# stock[..., year_reg, year_now] from the stocks stock_age[..., year_reg, age] of the active ages
+
+def cohort_stock(stock_age):
+
+    n_years, n_active = stock_age.shape[-2:]
+
+    age = np.arange(n_years)[None, :] - np.arange(n_years)[:, None]  # age[year_reg, year_now]
+    valid = age >= 0
+    age = np.minimum(np.where(valid, age, 0), n_active - 1)
+
+    return np.where(valid, stock_age[..., np.arange(n_years)[:, None], age], 0.0)
+
+
+# elvs_exit, elvs_export, elvs_unknown, elvs_recycling [b, id, year_reg, year_now]
+
+def batch_eol(stock, loss):
+
+    n_years = stock.shape[-1]
+
+    # Fleet exits from the change in stock for year_reg < year_now:
+
+    exits = np.zeros_like(stock)
+    exits[..., 1:] = stock[..., :-1] - stock[..., 1:]
+    exits = np.where(np.triu(np.ones((n_years, n_years), dtype=bool), k=1), exits, 0.0)
+
+    exports = exits * loss[:, None, None, :, 0] / 100
+    unknown = exits * loss[:, None, None, :, 1] / 100
+    recycling = exits - exports - unknown
+
+    return exits, exports, unknown, recycling
+
+
+# eol[b, id, year, column] with columns as in EOL_COLUMNS
+
+def batch_recycling(elvs_recycling, vehicles_data, dismantling, recycling):
+
+    n_polymers = vehicles_data.shape[-1] - 2
+
+    mass = vehicles_data[..., 0][..., None]  # [b, id, year_reg, 1]
+    plastic = vehicles_data[..., 1][..., None]
+
+    inputs = np.stack([ordered_sum(elvs_recycling * mass * plastic / 100 * vehicles_data[..., 2 + p][..., None] / 100, axis=2) for p in range(n_polymers)], axis=-1)
+    input_elvs = ordered_sum(elvs_recycling, axis=2)
+
+    return recycling_outputs(inputs, input_elvs, dismantling, recycling)
+
+
+def recycling_outputs(inputs, input_elvs, dismantling, recycling):
+
+    n_polymers = inputs.shape[-1]
+
+    dismantling_output = input_elvs[..., None] * dismantling
+    recycling_output = (inputs - dismantling_output) * recycling[:, None, :, :] / 100
+
+    output_total = recycling_output[..., 0]
+    for p in range(1, n_polymers):
+        output_total = output_total + recycling_output[..., p]
+
+    return np.concatenate([inputs, input_elvs[..., None], dismantling_output, recycling_output, output_total[..., None]], axis=-1)
+
+
+# Fleet exits of the active ages in the layout [b, id, year_now, age] with year_reg[year_now, age] = year_now - age: elvs_exit, elvs_export, elvs_unknown, elvs_recycling and year_reg. Older cohorts have no exits, so O(Y * A) values cover all exits of batch_eol.
+
+def batch_eol_active(reg, cagr, shape, scale, loss):
+
+    n_years = reg.shape[-1]
+
+    stock_age, member_group = batch_survival(reg, cagr, shape, scale)
+
+    age = np.arange(stock_age.shape[-1])[None, :]
+    year_reg = np.arange(n_years)[:, None] - age
+    valid = (year_reg >= 0) & (age >= 1)
+    year_reg = np.where(year_reg >= 0, year_reg, 0)
+
+    exits = np.where(valid, stock_age[:, :, year_reg, np.maximum(age - 1, 0)] - stock_age[:, :, year_reg, age], 0.0)[member_group]
+
+    exports = exits * loss[:, None, :, None, 0] / 100
+    unknown = exits * loss[:, None, :, None, 1] / 100
+    recycling = exits - exports - unknown
+
+    return exits, exports, unknown, recycling, year_reg
+
+
+# eol[b, id, year, column] from the exits of the active ages (see batch_eol_active), summed in ascending order of the years of registration
+
+def batch_recycling_active(elvs_recycling, year_reg, vehicles_data, dismantling, recycling):
+
+    n_polymers = vehicles_data.shape[-1] - 2
+
+    elvs_recycling = elvs_recycling[..., ::-1]
+    year_reg = year_reg[:, ::-1]
+
+    mass = vehicles_data[:, :, year_reg, 0]  # [b, id, year_now, age]
+    plastic = vehicles_data[:, :, year_reg, 1]
+
+    inputs = np.stack([ordered_sum(elvs_recycling * mass * plastic / 100 * vehicles_data[:, :, year_reg, 2 + p] / 100, axis=3) for p in range(n_polymers)], axis=-1)
+    input_elvs = ordered_sum(elvs_recycling, axis=3)
+
+    return recycling_outputs(inputs, input_elvs, dismantling, recycling)
+
+
+# closedloop[b, year, column] with columns as in CLOSEDLOOP_COLUMNS
+
+def batch_closedloop(reg, vehicles_data, eol, production):
+
+    n_polymers = production.shape[-1] // 2
+
+    efficiency = production[..., :n_polymers] / 100
+    max_input = production[..., n_polymers:]
+
+    plastic = reg * vehicles_data[..., 0] * vehicles_data[..., 1] / 100  # [b, id, year]
+
+    demand = np.stack([ordered_sum(plastic * vehicles_data[..., 2 + p] / 100, axis=1) for p in range(n_polymers)], axis=-1)
+    demand_plastic = ordered_sum(plastic, axis=1)
+
+    supply = ordered_sum(eol[..., 2 * n_polymers + 1:3 * n_polymers + 1], axis=1)
+
+    # Check for maximum recycled input:
+
+    limit = demand * max_input / 100
+    supply = np.where(supply * efficiency > limit, limit / efficiency, supply)
+
+    supply_total = supply[..., 0]
+    supply_total_ = supply[..., 0] * efficiency[..., 0]
+
+    for p in range(1, n_polymers):
+        supply_total = supply_total + supply[..., p]
+        supply_total_ = supply_total_ + supply[..., p] * efficiency[..., p]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = supply * efficiency / demand * 100
+        total = supply_total_ / demand_plastic * 100
+
+    return np.concatenate([demand, demand_plastic[..., None], supply, supply_total[..., None], rates, total[..., None]], axis=-1)
+
+
+
+###
+###  (3) CALCULATE ALL
+###
+
+# Run all stages for a batch of stacked inputs (see stack_inputs) and return the stacked closed-loop results closedloop[b, year, column]. With details=True, a dictionary with the arrays of all stages is returned, including the dense fleet_detail over all (year_reg, year_now); without, only the active ages of the cohorts are evaluated. fleet_detail is written into out if given (e.g. a memory-mapped array, see storage.py).
+
+def calc_all_batch(start_year, end_year, n_init_years, registrations, inputs, set_years, set_vehicles, details=False, out=None):
+
+    cagr = inputs['cagr']
+
+    reg = batch_registrations(start_year, end_year, set_years, set_vehicles, cagr, n_init_years, registrations)
+
+    if not details:
+        _, _, _, elvs_recycling, year_reg = batch_eol_active(reg, cagr, inputs['shape'], inputs['scale'], inputs['loss'])
+
+        eol = batch_recycling_active(elvs_recycling, year_reg, inputs['vehicles_data'], inputs['dismantling'], inputs['recycling'])
+
+        return batch_closedloop(reg, inputs['vehicles_data'], eol, inputs['production'])
+
+    return batch_details(reg, inputs, out)
+
+
+# Arrays of all stages for the registrations reg[b, id, year] of a batch of stacked inputs (see calc_all_batch). In memory, the stages are evaluated over the whole batch; with out (e.g. a memory-mapped array), they are written into it per member and vehicle model (see write_details).
+
+def batch_details(reg, inputs, out=None):
+
+    if out is None:
+        stock = batch_fleet(reg, inputs['cagr'], inputs['shape'], inputs['scale'])
+
+        exits, exports, unknown, elvs_recycling = batch_eol(stock, inputs['loss'])
+
+        eol = batch_recycling(elvs_recycling, inputs['vehicles_data'], inputs['dismantling'], inputs['recycling'])
+
+        fleet_detail = np.stack([stock, exits, exports, unknown, elvs_recycling], axis=-1)
+        fleet = np.stack([ordered_sum(fleet_detail[..., k], axis=2) for k in range(len(FLEET_COLUMNS))], axis=-1)
+
+    else:
+        fleet_detail, fleet, eol = write_details(reg, inputs, out)
+
+    closedloop = batch_closedloop(reg, inputs['vehicles_data'], eol, inputs['production'])
+
+    return {
+        'polymers': inputs['polymers'],
+        'registrations': reg,
+        'fleet_detail': fleet_detail,
+        'fleet': fleet,
+        'eol': eol,
+        'closedloop': closedloop}
+
+
+# Fleet and EoL stages written into fleet_detail (out) per member and vehicle model as they are calculated, so no temporary arrays of the size of fleet_detail are created. Every vehicle model is summed in the same order as over the whole batch, so the results are the same. Returns fleet_detail, fleet and eol.
+
+def write_details(reg, inputs, out):
+
+    n_batch, n_vehicles, n_years = reg.shape
+
+    stock_age, member_group = batch_survival(reg, inputs['cagr'], inputs['shape'], inputs['scale'])
+
+    fleet = np.empty((n_batch, n_vehicles, n_years, len(FLEET_COLUMNS)))
+    eol = None
+
+    for b in range(n_batch):
+        for i in range(n_vehicles):
+            cohorts = out[b, i]  # [year_reg, year_now, k]
+
+            stock = cohort_stock(stock_age[member_group[b], i])
+
+            exits, exports, unknown, elvs_recycling = batch_eol(stock[None, None], inputs['loss'][b:b+1])
+
+            for k, values in enumerate([stock, exits[0, 0], exports[0, 0], unknown[0, 0], elvs_recycling[0, 0]]):
+                cohorts[..., k] = values
+                fleet[b, i, :, k] = ordered_sum(values, axis=0)
+
+            eol_i = batch_recycling(elvs_recycling, inputs['vehicles_data'][b:b+1, i:i+1], inputs['dismantling'][b:b+1, i:i+1], inputs['recycling'][b:b+1])
+
+            if eol is None:
+                eol = np.empty((n_batch, n_vehicles) + eol_i.shape[2:])
+
+            eol[b, i] = eol_i[0, 0]
+
+    return out, fleet, eol
+
+
+
+###
+###  (4) DATAFRAMES
+###
+
+# Convert member b of the stacked results into the DataFrames of calc_all (registrations, fleet_detail, fleet, eol, closedloop)
+
+def to_frames(results, b, set_years, set_vehicles, registrations):
+
+    vehicles = list(set_vehicles)
+    years = list(set_years)
+
+    columns = polymer_columns(results.get('polymers', POLYMERS))
+
+    fleet_detail = None
+
+    if results['fleet_detail'] is not None:
+        fleet_detail = pd.DataFrame(
+            results['fleet_detail'][b].reshape(-1, len(FLEET_COLUMNS)),
+            columns=FLEET_COLUMNS,
+            index=pd.MultiIndex.from_product([vehicles, years, years], names=['id', 'year_reg', 'year_now']))
+
+    fleet = pd.DataFrame(
+        results['fleet'][b].reshape(-1, len(FLEET_COLUMNS)),
+        columns=FLEET_COLUMNS,
+        index=pd.MultiIndex.from_product([vehicles, years], names=['id', 'year']))
+
+    eol = pd.DataFrame(
+        results['eol'][b].reshape(-1, len(columns['eol'])),
+        columns=columns['eol'],
+        index=pd.MultiIndex.from_product([vehicles, years], names=['id', 'year']))
+
+    closedloop = pd.DataFrame(
+        results['closedloop'][b],
+        columns=columns['closedloop'],
+        index=pd.Index(years, name='year'))
+
+    return registrations, fleet_detail, fleet, eol, closedloop
+
+
+# Batched drop-in for calc_all: takes lists of input DataFrames and parameters (one per member) and returns a list with the results of calc_all (registrations, fleet_detail, fleet, eol, closedloop) for each member
+
+def calc_all_frames(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, out=None):
+
+    inputs = stack_inputs(set_years, set_vehicles, vehicles_data, cagr, loss, dismantling, recycling, production, shape, scale)
+
+    results = calc_all_batch(start_year, end_year, n_init_years, registrations, inputs, set_years, set_vehicles, details=True, out=out)
+
+    # The registrations DataFrame is built once per distinct CAGR:
+
+    registrations_ = {}
+
+    for c in cagr:
+        if c not in registrations_:
+            registrations_[c] = calc_registrations(start_year, end_year, set_vehicles, c, n_init_years, registrations)
+
+    return [to_frames(results, b, set_years, set_vehicles, registrations_[cagr[b]].copy()) for b in range(len(cagr))]
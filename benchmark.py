@@ -0,0 +1,453 @@
+####
+#
+# CAPsim
+# Benchmark Module
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+import contextlib
+import io
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from reader import import_data
+from calculator import calc_registrations, calc_fleet, calc_eol, calc_recycling, calc_closedloop, calc_all
+from batch import stack_inputs, batch_registrations, batch_fleet, batch_eol, batch_recycling, batch_closedloop
+
+
+
+STAGES = ['import', 'calc_registrations', 'calc_fleet', 'calc_eol', 'calc_recycling', 'calc_closedloop', 'calc_all', 'run_sa', 'export']
+
+# run_sa evaluates calc_all twice per sensitivity parameter and is therefore excluded by default
+
+DEFAULT_STAGES = [stage for stage in STAGES if stage != 'run_sa']
+
+
+
+###
+###  (1) SYNTHETIC SCENARIOS
+###
+
+# Generate a synthetic scenario in memory with the same data structures as reader.import_data
+
+def make_scenario(n_vehicles=2, n_years=61, n_init_years=46, start_year=1990, seed=0):
+
+    if n_init_years < 1 or n_init_years > n_years:
+        raise ValueError('(!) The number of initialization years must be between 1 and the number of years.')
+
+    rng = np.random.default_rng(seed)
+
+    end_year = start_year + n_years - 1
+    set_years = range(start_year, end_year + 1)
+    set_vehicles = range(1, n_vehicles + 1)
+
+    scenario_name = f'SYNTHETIC_{n_vehicles}x{n_years}'
+
+    vehicles_names = pd.DataFrame({
+        'id': set_vehicles,
+        'name': [f'V{i}' for i in set_vehicles]})
+    vehicles_names.set_index('id', inplace=True)
+
+    index = pd.MultiIndex.from_tuples([(i, j) for i in set_vehicles for j in set_years], names=['id', 'year'])
+
+    # Vehicle model data with slowly increasing mass and plastic content:
+
+    trend = np.tile(np.linspace(0, 1, n_years), n_vehicles)
+    mass = np.repeat(rng.uniform(1200, 2000, n_vehicles), n_years)
+    plastic = np.repeat(rng.uniform(12, 18, n_vehicles), n_years)
+
+    vehicles_data = pd.DataFrame({
+        'total_mass': mass * (1 + 0.1 * trend),
+        'plastic_content': plastic + 4 * trend,
+        'pp_content': np.repeat(rng.uniform(30, 40, n_vehicles), n_years),
+        'pa_content': np.repeat(rng.uniform(8, 14, n_vehicles), n_years),
+        'pc_content': np.repeat(rng.uniform(5, 10, n_vehicles), n_years),
+        'abs_content': np.repeat(rng.uniform(5, 10, n_vehicles), n_years)}, index=index)
+
+    # Registrations for the initialization years (integer numbers of vehicles):
+
+    cagr = 1.0
+
+    registrations = pd.DataFrame({
+        'registrations': np.floor(rng.uniform(2e5, 2e6, (n_vehicles, 1)) * rng.uniform(0.9, 1.1, (n_vehicles, n_init_years))).ravel()},
+        index=pd.MultiIndex.from_tuples([(i, j) for i in set_vehicles for j in range(start_year, start_year + n_init_years)], names=['id', 'year']))
+
+    loss = pd.DataFrame({
+        'year': set_years,
+        'exports': np.full(n_years, 10.0),
+        'unknown_whereabouts': np.linspace(35, 20, n_years)})
+    loss.set_index('year', inplace=True)
+
+    dismantling = pd.DataFrame({
+        'pp_mass': np.repeat(rng.uniform(5, 15, n_vehicles), n_years),
+        'pa_mass': np.repeat(rng.uniform(0, 5, n_vehicles), n_years),
+        'pc_mass': np.repeat(rng.uniform(0, 2, n_vehicles), n_years),
+        'abs_mass': np.repeat(rng.uniform(0, 3, n_vehicles), n_years)}, index=index)
+
+    recycling = pd.DataFrame({
+        'year': set_years,
+        'pp_efficiency': np.linspace(30, 60, n_years),
+        'pa_efficiency': np.linspace(25, 50, n_years),
+        'pc_efficiency': np.linspace(35, 55, n_years),
+        'abs_efficiency': np.linspace(10, 40, n_years)})
+    recycling.set_index('year', inplace=True)
+
+    production = pd.DataFrame({
+        'year': set_years,
+        'pp_efficiency': np.full(n_years, 95.0),
+        'pa_efficiency': np.full(n_years, 95.0),
+        'pc_efficiency': np.full(n_years, 95.0),
+        'abs_efficiency': np.full(n_years, 95.0),
+        'max_pp': np.full(n_years, 100.0),
+        'max_pa': np.full(n_years, 100.0),
+        'max_pc': np.full(n_years, 100.0),
+        'max_abs': np.full(n_years, 100.0)})
+    production.set_index('year', inplace=True)
+
+    tmp = {
+        'vehicles_names': vehicles_names,
+        'vehicles_data': vehicles_data,
+        'loss': loss,
+        'dismantling': dismantling,
+        'recycling': recycling,
+        'production': production}
+
+    return scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp
+
+
+# Write a scenario to an input file with the cell layout expected by reader.import_data
+
+def write_scenario(scenario, file_path):
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = scenario
+
+    set_years = range(start_year, end_year + 1)
+
+    def sheet(n_rows):
+        grid = np.full((n_rows + 1, max(n_years, n_vehicles) + 2), None, dtype=object)
+        grid[0, 1] = 'CAPsim Input Data'
+        return grid
+
+    def put(grid, row, col, value):
+        grid[row + 1, col] = value  # row of the reader's DataFrame (first row is the header)
+
+    # Vehicles:
+
+    vehicles = sheet(15 + 8 * n_vehicles)
+    put(vehicles, 3, 2, scenario_name)
+    put(vehicles, 5, 2, start_year)
+    put(vehicles, 6, 2, end_year)
+    put(vehicles, 8, 2, n_vehicles)
+
+    row = 15
+
+    for i in range(1, n_vehicles + 1):
+        put(vehicles, 11, 1 + i, vehicles_names.loc[i, 'name'])
+
+        for k, column in enumerate(['total_mass', 'plastic_content', 'pp_content', 'pa_content', 'pc_content', 'abs_content']):
+            vehicles[row + k + 1, 2:2 + n_years] = vehicles_data.loc[i, column].loc[list(set_years)].values
+
+        row += 8
+
+    # Registrations:
+
+    regs = sheet(7 + n_vehicles)
+    put(regs, 3, 2, cagr)
+    regs[6, 2:2 + n_init_years] = list(range(start_year, start_year + n_init_years))
+
+    for i in range(1, n_vehicles + 1):
+        regs[7 + i, 2:2 + n_init_years] = registrations.loc[i, 'registrations'].values[:n_init_years]
+
+    # EoL:
+
+    eol = sheet(13 + 6 * n_vehicles)
+    eol[8, 2:2 + n_years] = loss['exports'].values
+    eol[9, 2:2 + n_years] = loss['unknown_whereabouts'].values
+
+    row = 13
+
+    for i in range(1, n_vehicles + 1):
+        for k, column in enumerate(['pp_mass', 'pa_mass', 'pc_mass', 'abs_mass']):
+            eol[row + k + 1, 2:2 + n_years] = dismantling.loc[i, column].values
+
+        row += 6
+
+    # Recycling:
+
+    rec = sheet(25)
+
+    for k, column in enumerate(['pp_efficiency', 'pa_efficiency', 'pc_efficiency', 'abs_efficiency']):
+        rec[8 + k, 2:2 + n_years] = recycling[column].values
+        rec[15 + k, 2:2 + n_years] = production[column].values
+
+    for k, column in enumerate(['max_pp', 'max_pa', 'max_pc', 'max_abs']):
+        rec[22 + k, 2:2 + n_years] = production[column].values
+
+    with pd.ExcelWriter(file_path) as writer:
+        for sheet_name, grid in [('Vehicles', vehicles), ('Registrations', regs), ('EoL', eol), ('Recycling', rec)]:
+            pd.DataFrame(grid).to_excel(writer, sheet_name=sheet_name, header=False, index=False)
+
+
+
+###
+###  (2) STAGE TIMINGS
+###
+
+# Time a function call (best of repeat calls) with the model's progress prints suppressed
+
+def time_call(func, *args, repeat=1):
+
+    best = math.inf
+    result = None
+
+    for r in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            result = func(*args)
+            best = min(best, time.perf_counter() - t)
+
+    return best, result
+
+
+# Time all selected stages for one scenario and return a dictionary {stage: seconds}
+
+def bench_scenario(scenario, shape, scale, stages=DEFAULT_STAGES, repeat=1, sensitivity=0.2, import_file=None, engine='reference'):
+
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        # IMPORT
+
+        if 'import' in stages:
+            if import_file is None:
+                import_file = os.path.join(tmp_dir, 'data_bench.xlsx')
+                write_scenario(scenario, import_file)
+
+            timings['import'], _ = time_call(import_data, import_file, repeat=repeat)
+
+        scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = scenario
+
+        set_years = range(start_year, end_year + 1)
+        set_vehicles = range(1, n_vehicles + 1)
+
+        # CALCULATION STAGES
+
+        if engine == 'batch':
+
+            # The batch engine runs the vectorized stages of batch.py instead of the loops of calculator.py:
+
+            inputs = stack_inputs(set_years, set_vehicles, [vehicles_data], [cagr], [loss], [dismantling], [recycling], [production], [shape], [scale])
+
+            timings['calc_registrations'], reg = time_call(batch_registrations, start_year, end_year, set_years, set_vehicles, inputs['cagr'], n_init_years, registrations, repeat=repeat)
+            timings['calc_fleet'], stock = time_call(batch_fleet, reg, inputs['cagr'], inputs['shape'], inputs['scale'], repeat=repeat)
+            timings['calc_eol'], (_, _, _, elvs_recycling) = time_call(batch_eol, stock, inputs['loss'], repeat=repeat)
+            timings['calc_recycling'], eol = time_call(batch_recycling, elvs_recycling, inputs['vehicles_data'], inputs['dismantling'], inputs['recycling'], repeat=repeat)
+            timings['calc_closedloop'], _ = time_call(batch_closedloop, reg, inputs['vehicles_data'], eol, inputs['production'], repeat=repeat)
+
+        else:
+            seconds, _registrations = time_call(calc_registrations, start_year, end_year, set_vehicles, cagr, n_init_years, registrations, repeat=repeat)
+            timings['calc_registrations'] = seconds
+
+            seconds, (fleet_detail, fleet) = time_call(calc_fleet, start_year, end_year, set_years, set_vehicles, _registrations, shape, scale, engine, repeat=repeat)
+            timings['calc_fleet'] = seconds
+
+            seconds, (fleet_detail, fleet) = time_call(calc_eol, start_year, end_year, set_years, set_vehicles, fleet_detail, fleet, loss, repeat=repeat)
+            timings['calc_eol'] = seconds
+
+            seconds, eol = time_call(calc_recycling, start_year, end_year, set_years, set_vehicles, vehicles_data, fleet_detail, dismantling, recycling, repeat=repeat)
+            timings['calc_recycling'] = seconds
+
+            seconds, closedloop = time_call(calc_closedloop, set_years, set_vehicles, vehicles_data, _registrations, eol, production, repeat=repeat)
+            timings['calc_closedloop'] = seconds
+
+        if 'calc_all' in stages or (engine == 'batch' and 'export' in stages):
+            timings['calc_all'], (_registrations, _, fleet, eol, closedloop) = time_call(calc_all, start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, engine, repeat=repeat)
+
+        if 'run_sa' in stages:
+            from analyzer import run_sa
+
+            timings['run_sa'], _ = time_call(run_sa, start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp, set_years, set_vehicles, shape, scale, sensitivity, engine, repeat=repeat)
+
+        # EXPORT
+
+        if 'export' in stages:
+            from writer import export_data
+
+            timings['export'], _ = time_call(export_data, os.path.join(tmp_dir, ''), 1, 1, set_years, set_vehicles, vehicles_names, _registrations, fleet, eol, closedloop, repeat=repeat)
+
+    return {stage: seconds for stage, seconds in timings.items() if stage in stages}
+
+
+# Run the benchmark for synthetic scenarios of all combinations of vehicle counts and horizon lengths and return a list of records
+
+def bench_scaling(vehicles=(2,), years=(61,), init_years=None, shape=3.2, scale=16.75, stages=DEFAULT_STAGES, repeat=1, sensitivity=0.2, engine='reference'):
+
+    records = []
+
+    for n_vehicles in vehicles:
+        for n_years in years:
+            n_init = min(init_years, n_years) if init_years is not None else max(1, (3 * n_years) // 4)
+
+            scenario = make_scenario(n_vehicles, n_years, n_init)
+            case = f'v{n_vehicles}_y{n_years}_i{n_init}'
+
+            print(f'   benchmarking {case}...')
+
+            timings = bench_scenario(scenario, shape, scale, stages, repeat, sensitivity, engine=engine)
+
+            for stage, seconds in timings.items():
+                records.append({
+                    'case': case,
+                    'n_vehicles': n_vehicles,
+                    'n_years': n_years,
+                    'n_init_years': n_init,
+                    'stage': stage,
+                    'seconds': seconds})
+
+    return records
+
+
+# Run the benchmark for input files (e.g. the shipped scenarios)
+
+def bench_files(import_files, shape=3.2, scale=16.75, stages=DEFAULT_STAGES, repeat=1, sensitivity=0.2, engine='reference'):
+
+    records = []
+
+    for import_file in import_files:
+        print(f'   benchmarking {import_file}...')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenario = import_data(import_file)
+
+        timings = bench_scenario(scenario, shape, scale, stages, repeat, sensitivity, import_file=import_file, engine=engine)
+
+        for stage, seconds in timings.items():
+            records.append({
+                'case': os.path.basename(import_file),
+                'n_vehicles': scenario[4],
+                'n_years': scenario[3],
+                'n_init_years': scenario[8],
+                'stage': stage,
+                'seconds': seconds})
+
+    return records
+
+
+
+###
+###  (3) SCALING CURVES
+###
+
+# Estimate the scaling exponent b of seconds ~ size^b per stage from a log-log fit over all cases that only differ in the given dimension ('n_vehicles' or 'n_years')
+
+def scaling_exponents(records, dimension):
+
+    other = 'n_years' if dimension == 'n_vehicles' else 'n_vehicles'
+
+    exponents = {}
+
+    for stage in dict.fromkeys(r['stage'] for r in records):
+        slopes = []
+
+        for fixed in sorted({r[other] for r in records}):
+            points = [(r[dimension], r['seconds']) for r in records if r['stage'] == stage and r[other] == fixed and r['seconds'] > 0]
+
+            if len({x for x, y in points}) > 1:
+                x = np.log([p[0] for p in points])
+                y = np.log([p[1] for p in points])
+                slopes.append(np.polyfit(x, y, 1)[0])
+
+        if slopes:
+            exponents[stage] = float(np.mean(slopes))
+
+    return exponents
+
+
+
+###
+###  (4) BASELINE
+###
+
+def save_baseline(records, file_path):
+
+    with open(file_path, 'w') as f:
+        json.dump({'records': records}, f, indent=2)
+
+
+# Compare records with a stored baseline and return a list of (case, stage, baseline seconds, seconds, ratio, flag)
+
+def compare_baseline(records, file_path, tolerance=0.2):
+
+    with open(file_path) as f:
+        baseline = {(r['case'], r['stage']): r['seconds'] for r in json.load(f)['records']}
+
+    diffs = []
+
+    for r in records:
+        key = (r['case'], r['stage'])
+
+        if key not in baseline:
+            continue
+
+        ratio = r['seconds'] / baseline[key] if baseline[key] > 0 else math.inf
+
+        if ratio > 1 + tolerance:
+            flag = 'slower'
+        elif ratio < 1 / (1 + tolerance):
+            flag = 'faster'
+        else:
+            flag = ''
+
+        diffs.append((r['case'], r['stage'], baseline[key], r['seconds'], ratio, flag))
+
+    return diffs
+
+
+
+###
+###  (5) REPORT
+###
+
+def print_report(records, diffs=None):
+
+    print(f"\n{'case':<22}{'stage':<22}{'time [s]':>12}")
+
+    for r in records:
+        print(f"{r['case']:<22}{r['stage']:<22}{r['seconds']:>12.4f}")
+
+    for dimension in ['n_vehicles', 'n_years']:
+        exponents = scaling_exponents(records, dimension)
+
+        if exponents:
+            print(f'\n   scaling exponents in {dimension} (time ~ {dimension}^b):')
+
+            for stage, b in exponents.items():
+                print(f'   {stage:<22}b = {b:.2f}')
+
+    if diffs is not None:
+        print(f"\n{'case':<22}{'stage':<22}{'baseline [s]':>14}{'time [s]':>12}{'ratio':>9}")
+
+        for case, stage, old, new, ratio, flag in diffs:
+            print(f'{case:<22}{stage:<22}{old:>14.4f}{new:>12.4f}{ratio:>9.2f}  {flag}')
+
+        n_slower = sum(1 for d in diffs if d[5] == 'slower')
+
+        if n_slower:
+            print(f'\n(!) {n_slower} stage(s) slower than the baseline.')
@@ -0,0 +1,238 @@
+####
+#
+# CAPsim
+# Cache Module for Incremental Runs
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+import hashlib
+import json
+import os
+import shutil
+
+
+
+VERSION = '1.0.0'
+
+# Model source files are hashed into the fingerprint, so any change of the model code invalidates previous results. The settings block of main.py (between its two rulers of '#') is fingerprinted separately with the settings of a run, so only the rest of main.py is hashed.
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+SETTINGS_FILE = 'main.py'
+SETTINGS_RULER = b'\n' + b'#' * 73 + b'\n'
+
+# Files of a run (not of a scenario) that are not reused from previous runs:
+
+RUN_FILES = ['progress.jsonl', 'run_report.json', 'run_report.csv', 'run_tasks.json', 'run_tasks.csv']
+
+
+
+###
+###  (1) FINGERPRINTS
+###
+
+# Calculate a fingerprint for a scenario from the content of its input file, the model settings and the model code version
+
+def code_source(file, source):
+
+    if file == SETTINGS_FILE:
+        parts = source.split(SETTINGS_RULER)
+
+        if len(parts) == 3:
+            return parts[0] + parts[2]
+
+    return source
+
+
+def code_version():
+
+    digest = hashlib.sha256(VERSION.encode())
+
+    for file in sorted(os.listdir(CODE_DIR)):
+        if file.endswith('.py'):
+            with open(os.path.join(CODE_DIR, file), 'rb') as f:
+                digest.update(file.encode())
+                digest.update(code_source(file, f.read()))
+
+    return digest.hexdigest()
+
+
+def fingerprint(import_file, settings):
+
+    digest = hashlib.sha256()
+
+    with open(import_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(code_version().encode())
+
+    return digest.hexdigest()
+
+
+
+###
+###  (2) SCENARIO CACHE
+###
+
+# Each exported scenario folder holds a manifest ({prefix}cache.json) with its fingerprint and a pickle ({prefix}cache.pkl) with the scenario state needed to redraw the scenario-comparison plots without recomputing the scenario
+
+def cache_files(export_path, prefix):
+
+    return f'{export_path}{prefix}cache.json', f'{export_path}{prefix}cache.pkl'
+
+
+def save_cache(export_path, prefix, fp, settings, state):
+
+    from storage import StatePickler
+
+    manifest_file, state_file = cache_files(export_path, prefix)
+
+    # DataFrames on memory-mapped arrays are stored as references to their files (see storage.py):
+
+    with open(state_file, 'wb') as f:
+        StatePickler(f, export_path).dump(state)
+
+    manifest = {
+        'fingerprint': fp,
+        'version': VERSION,
+        'code_version': code_version(),
+        'settings': settings}
+
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_cache(export_path, prefix):
+
+    from storage import StateUnpickler
+
+    _, state_file = cache_files(export_path, prefix)
+
+    with open(state_file, 'rb') as f:
+        return StateUnpickler(f, export_path).load()
+
+
+# Check whether a scenario folder holds a cached state whose manifest matches the fingerprint
+
+def match_cache(export_path, prefix, fp):
+
+    manifest_file, state_file = cache_files(export_path, prefix)
+
+    if not (os.path.isfile(manifest_file) and os.path.isfile(state_file)):
+        return False
+
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return manifest.get('fingerprint') == fp
+
+
+# Search previous results folders (newest first) for a scenario folder whose manifest matches the fingerprint
+
+def find_cache(results_path, scenario_dir, prefix, fp, exclude=None):
+
+    if not os.path.isdir(results_path):
+        return None
+
+    for run in sorted(os.listdir(results_path), reverse=True):
+        if run == exclude:
+            continue
+
+        export_path = os.path.join(results_path, run, scenario_dir, '')
+
+        if match_cache(export_path, prefix, fp):
+            return export_path
+
+    return None
+
+
+# Most recent results folder of a previous run, or None
+
+def find_last_run(results_path):
+
+    if not os.path.isdir(results_path):
+        return None
+
+    runs = sorted(run for run in os.listdir(results_path) if os.path.isdir(os.path.join(results_path, run)))
+
+    return os.path.join(results_path, runs[-1], '') if runs else None
+
+
+# Search previous results folders (newest first) for a cached state of the same scenario folder calculated with the current model code whose model settings take one of the given values ({setting: [values]}, for scenario diffing, see diffing.py)
+
+def find_previous(results_path, scenario_dir, prefix, settings, exclude=None):
+
+    if not os.path.isdir(results_path):
+        return None
+
+    version = code_version()
+
+    for run in sorted(os.listdir(results_path), reverse=True):
+        if run == exclude:
+            continue
+
+        export_path = os.path.join(results_path, run, scenario_dir, '')
+        manifest_file, state_file = cache_files(export_path, prefix)
+
+        if not (os.path.isfile(manifest_file) and os.path.isfile(state_file)):
+            continue
+
+        try:
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if manifest.get('version') != VERSION or manifest.get('code_version') != version:
+            continue
+
+        if all(manifest.get('settings', {}).get(k) in v for k, v in settings.items()):
+            return export_path
+
+    return None
+
+
+
+###
+###  (3) REUSE RESULTS
+###
+
+# Reuse the files of a cached scenario folder in the new results folder by hardlinks (copies if hardlinks are not supported). Subfolders of other scenarios are skipped in single-scenario folders, and the files of the previous run itself (RUN_FILES) are not reused.
+
+def link_results(src, dst, skip=('scenario_',)):
+
+    os.makedirs(dst, exist_ok=True)
+
+    for entry in os.listdir(src):
+        src_entry = os.path.join(src, entry)
+        dst_entry = os.path.join(dst, entry)
+
+        if os.path.isdir(src_entry):
+            if not entry.startswith(skip):
+                link_results(src_entry, dst_entry, skip)
+            continue
+
+        if entry in RUN_FILES:
+            continue
+
+        if os.path.exists(dst_entry):
+            os.remove(dst_entry)
+
+        try:
+            os.link(src_entry, dst_entry)
+        except OSError:
+            shutil.copy2(src_entry, dst_entry)
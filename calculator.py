@@ -20,6 +20,43 @@ import numpy as np
 from scipy.stats import weibull_min
 import math
 
+from kernel import calc_fleet_kernel
+
+
+
+# Calculation engines: 'reference' (loops below), 'kernel' (compiled cohort survival kernel in kernel.py), 'batch' (kernel and vectorized stages in batch.py), and 'continuous' (continuous mode without floored fleet exits in continuous.py; different numerical results)
+
+ENGINES = ['reference', 'kernel', 'batch', 'continuous']
+
+# Polymers of the input template (see reader.py)
+
+POLYMERS = ['pp', 'pa', 'pc', 'abs']
+
+
+
+###
+###  (0) POLYMERS
+###
+
+# Polymers of a scenario: the '<polymer>_content' columns of vehicles_data in their order. All stages run over this list, so further polymers (e.g. PE, PU, PMMA) only need their input columns.
+
+def polymers_of(vehicles_data):
+
+    return [column[:-len('_content')] for column in vehicles_data.columns if column.endswith('_content') and column != 'plastic_content']
+
+
+# Columns of the inputs and results for a list of polymers
+
+def polymer_columns(polymers):
+
+    return {
+        'vehicles_data': ['total_mass', 'plastic_content'] + [f'{p}_content' for p in polymers],
+        'dismantling': [f'{p}_mass' for p in polymers],
+        'recycling': [f'{p}_efficiency' for p in polymers],
+        'production': [f'{p}_efficiency' for p in polymers] + [f'max_{p}' for p in polymers],
+        'eol': [f'input_{p}' for p in polymers] + ['input_elvs'] + [f'dismantling_output_{p}' for p in polymers] + [f'recycling_output_{p}' for p in polymers] + ['recycling_output_total'],
+        'closedloop': [f'demand_{p}' for p in polymers] + ['demand_plastic'] + [f'supply_{p}' for p in polymers] + ['supply_total'] + list(polymers) + ['total']}
+
 
 
 ###
@@ -42,18 +79,20 @@ def calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, r
 
     elif init_year < end_year:
 
-        for veh in set_vehicles:
-            
-            init_reg = registrations.loc[(veh, init_year), 'registrations']
+        init_reg = registrations['registrations'].reindex(pd.MultiIndex.from_product([list(set_vehicles), [init_year]])).to_numpy(dtype=float)
+
+        # CAGR = (end value / start value)^(1 / number of years) - 1
+        # => end value = start value * (1 + CAGR)^(number of years)
+
+        years = range(init_year + 1, end_year + 1)
+        growth = np.array([(1 + cagr / 100) ** (year - init_year) for year in years], dtype=float)
 
-            # CAGR = (end value / start value)^(1 / number of years) - 1
-            # => end value = start value * (1 + CAGR)^(number of years)
+        # All projected rows per vehicle model (id) are appended at once:
 
-            for year in range(init_year + 1, end_year + 1):
-                new_row = pd.DataFrame(
-                    init_reg * (1 + cagr / 100) ** (year - init_year),
-                    columns = registrations.columns, index = [(veh, year)])
-                registrations = pd.concat([registrations, new_row])
+        new_rows = pd.DataFrame(
+            (init_reg[:, None] * growth[None, :]).reshape(-1, 1),
+            columns = registrations.columns, index = [(veh, year) for veh in set_vehicles for year in years])
+        registrations = pd.concat([registrations, new_rows])
 
     return registrations
 
@@ -68,7 +107,20 @@ def calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, r
 # fleet_detail[id, year_reg, year_now] = {stock, elvs_exit, elvs_export, elvs_unknown, elvs_recycling}
 # fleet[id, year] = {stock, elvs_exit, elvs_export, elvs_unknown, elvs_recycling}
 
-def calc_fleet(start_year, end_year, set_years, set_vehicles, registrations, shape, scale):
+# engine = 'reference' runs the recursion below, engines 'kernel' and 'batch' the compiled cohort survival kernel in kernel.py with identical results, engine = 'continuous' the continuous fleet model without floored exits
+
+def calc_fleet(start_year, end_year, set_years, set_vehicles, registrations, shape, scale, engine='reference'):
+
+    if engine not in ENGINES:
+        raise ValueError(f"(!) Unknown calculation engine '{engine}'. Please choose one of {ENGINES}.")
+
+    if engine == 'continuous':
+        from continuous import calc_fleet_continuous
+
+        return calc_fleet_continuous(start_year, end_year, set_years, set_vehicles, registrations, shape, scale)
+
+    if engine != 'reference':
+        return calc_fleet_kernel(start_year, end_year, set_years, set_vehicles, registrations, shape, scale)
 
 
     # DETAILED VEHICLE FLEET
@@ -235,32 +287,27 @@ def calc_eol(start_year, end_year, set_years, set_vehicles, fleet_detail, fleet,
 ###  (4) CALCULATE RECYCLING OUTPUTS
 ###
 
-# Model recycling outputs or recyclate supplies from ELVs based on the vehicles entering recycling (elvs_recycling) in the detailed vehicle fleet matrix fleet_detail per vehicle model (id) for each current year (year_now), the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data, the dismantling rates in dismantling, and the recycling efficiencies in recycling
+# Model recycling outputs or recyclate supplies from ELVs based on the vehicles entering recycling (elvs_recycling) in the detailed vehicle fleet matrix fleet_detail per vehicle model (id) for each current year (year_now), the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data, the dismantling rates in dismantling, and the recycling efficiencies in recycling. Polymer-specific values are arrays over the polymers of the scenario (see polymers_of).
 
-# eol[id, year] = {input_pp, input_pa, input_pc, input_abs, input_elvs, dismantling_output_pp, dismantling_output_pa, dismantling_output_pc, dismantling_output_abs, recycling_output_pp, recycling_output_pa, recycling_output_pc, recycling_output_abs}
+# eol[id, year] = {input_<polymer>, input_elvs, dismantling_output_<polymer>, recycling_output_<polymer>, recycling_output_total}
 
 def calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data, fleet_detail, dismantling, recycling):
 
-    eol = pd.DataFrame({
-        'id': [i for i in set_vehicles for j in set_years],
-        'year': [j for i in set_vehicles for j in set_years],
-        'input_pp': [0 for i in set_vehicles for j in set_years],
-        'input_pa': [0 for i in set_vehicles for j in set_years],
-        'input_pc': [0 for i in set_vehicles for j in set_years],
-        'input_abs': [0 for i in set_vehicles for j in set_years],
-        'input_elvs': [0 for i in set_vehicles for j in set_years],
+    columns = polymer_columns(polymers_of(vehicles_data))
+    n_polymers = len(columns['dismantling'])
+
+    input_columns = columns['eol'][:n_polymers]
+    dismantling_columns = columns['eol'][n_polymers + 1:2 * n_polymers + 1]
+    output_columns = columns['eol'][2 * n_polymers + 1:3 * n_polymers + 1]
 
-        'dismantling_output_pp': [0 for i in set_vehicles for j in set_years],
-        'dismantling_output_pa': [0 for i in set_vehicles for j in set_years],
-        'dismantling_output_pc': [0 for i in set_vehicles for j in set_years],
-        'dismantling_output_abs': [0 for i in set_vehicles for j in set_years],
+    contents = vehicles_data[columns['vehicles_data'][2:]]
+    dismantling = dismantling[columns['dismantling']]
+    recycling = recycling[columns['recycling']]
 
-        'recycling_output_pp': [0 for i in set_vehicles for j in set_years],
-        'recycling_output_pa': [0 for i in set_vehicles for j in set_years],
-        'recycling_output_pc': [0 for i in set_vehicles for j in set_years],
-        'recycling_output_abs': [0 for i in set_vehicles for j in set_years]
-        })
-    eol.set_index(['id', 'year'], inplace=True)
+    eol = pd.DataFrame(
+        0.0,
+        columns=columns['eol'],
+        index=pd.MultiIndex.from_product([list(set_vehicles), list(set_years)], names=['id', 'year']))
 
 
     for veh in set_vehicles:
@@ -268,42 +315,25 @@ def calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data,
 
         # POLYMER-SPECIFIC RECYCLING INPUTS
         
-        # Calculate polymer-specific recycling inputs (input_pp, input_pa, input_pc, input_abs) and number of ELVs entering recycling (input_elvs) per vehicle model (id) for each current year (year_now) based on the vehicles entering recycling (elvs_recycling) in the detailed vehicle fleet matrix fleet_detail and the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data
+        # Calculate polymer-specific recycling inputs (input_<polymer>) and number of ELVs entering recycling (input_elvs) per vehicle model (id) for each current year (year_now) based on the vehicles entering recycling (elvs_recycling) in the detailed vehicle fleet matrix fleet_detail and the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data
         
-        # adding eol[id, year] = {input_pp, input_pa, input_pc, input_abs, input_elvs}
+        # adding eol[id, year] = {input_<polymer>, input_elvs}
 
         for year_now in set_years:
 
-            pp = 0
-            pa = 0
-            pc = 0
-            abs = 0
+            inputs = np.zeros(n_polymers)
             n_veh_ = 0
 
             for year_reg in range(start_year, year_now + 1):
                 n_veh = fleet_detail.loc[(veh, year_reg, year_now), 'elvs_recycling']
                 v_mass = vehicles_data.loc[(veh, year_reg), 'total_mass']
                 v_plast_cont = vehicles_data.loc[(veh, year_reg), 'plastic_content']
-                v_pp_cont = vehicles_data.loc[(veh, year_reg), 'pp_content']
-                v_pa_cont = vehicles_data.loc[(veh, year_reg), 'pa_content']
-                v_pc_cont = vehicles_data.loc[(veh, year_reg), 'pc_content']
-                v_abs_cont = vehicles_data.loc[(veh, year_reg), 'abs_content']
-
-                pp_ = n_veh * v_mass * v_plast_cont / 100 * v_pp_cont / 100
-                pa_ = n_veh * v_mass * v_plast_cont / 100 * v_pa_cont / 100
-                pc_ = n_veh * v_mass * v_plast_cont / 100 * v_pc_cont / 100
-                abs_ = n_veh * v_mass * v_plast_cont / 100 * v_abs_cont / 100
-
-                pp += pp_
-                pa += pa_
-                pc += pc_
-                abs += abs_
+                v_cont = contents.loc[(veh, year_reg)].to_numpy(dtype=float)
+
+                inputs += n_veh * v_mass * v_plast_cont / 100 * v_cont / 100
                 n_veh_ += n_veh
 
-            eol.loc[(veh, year_now), 'input_pp'] = pp
-            eol.loc[(veh, year_now), 'input_pa'] = pa
-            eol.loc[(veh, year_now), 'input_pc'] = pc
-            eol.loc[(veh, year_now), 'input_abs'] = abs
+            eol.loc[(veh, year_now), input_columns] = inputs
             eol.loc[(veh, year_now), 'input_elvs'] = n_veh_
 
 
@@ -312,44 +342,29 @@ def calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data,
 
             # DISMANTLING OUTPUTS
             
-            # Calculate polymer-specific dismantling outputs (dismantling_output_pp, dismantling_output_pa, dismantling_output_pc, dismantling_output_abs) per vehicle model (id) for each current year (year_now) based on the number of ELVs entering recycling (input_elvs) in eol and the dismantling rates in dismantling
+            # Calculate polymer-specific dismantling outputs (dismantling_output_<polymer>) per vehicle model (id) for each current year (year_now) based on the number of ELVs entering recycling (input_elvs) in eol and the dismantling rates in dismantling
             
-            # adding eol[id, year] = {dismantling_output_pp, dismantling_output_pa, dismantling_output_pc, dismantling_output_abs}
+            # adding eol[id, year] = {dismantling_output_<polymer>}
 
             n_veh = eol.loc[(veh, year_now), 'input_elvs']
 
-            veh_dism_pp = dismantling.loc[(veh, year_now), 'pp_mass']
-            veh_dism_pa = dismantling.loc[(veh, year_now), 'pa_mass']
-            veh_dism_pc = dismantling.loc[(veh, year_now), 'pc_mass']
-            veh_dism_abs = dismantling.loc[(veh, year_now), 'abs_mass']
+            dismantling_output = n_veh * dismantling.loc[(veh, year_now)].to_numpy(dtype=float)
 
-            eol.loc[(veh, year_now), 'dismantling_output_pp'] = n_veh * veh_dism_pp
-            eol.loc[(veh, year_now), 'dismantling_output_pa'] = n_veh * veh_dism_pa
-            eol.loc[(veh, year_now), 'dismantling_output_pc'] = n_veh * veh_dism_pc
-            eol.loc[(veh, year_now), 'dismantling_output_abs'] = n_veh * veh_dism_abs
+            eol.loc[(veh, year_now), dismantling_columns] = dismantling_output
 
-            bodies_pp = eol.loc[(veh, year_now), 'input_pp'] - eol.loc[(veh, year_now), 'dismantling_output_pp']
-            bodies_pa = eol.loc[(veh, year_now), 'input_pa'] - eol.loc[(veh, year_now), 'dismantling_output_pa']
-            bodies_pc = eol.loc[(veh, year_now), 'input_pc'] - eol.loc[(veh, year_now), 'dismantling_output_pc']
-            bodies_abs = eol.loc[(veh, year_now), 'input_abs'] - eol.loc[(veh, year_now), 'dismantling_output_abs']
+            bodies = eol.loc[(veh, year_now), input_columns].to_numpy(dtype=float) - dismantling_output
 
 
             # RECYCLING OUTPUTS
             
-            # Calculate polymer-specific recycling outputs (recycling_output_pp, recycling_output_pa, recycling_output_pc, recycling_output_abs) and the total recycling output (recycling_output_total) per vehicle model (id) for each current year (year_now) based on the bodies entering recycling (input_pp, input_pa, input_pc, input_abs) and the recycling efficiencies in recycling
+            # Calculate polymer-specific recycling outputs (recycling_output_<polymer>) and the total recycling output (recycling_output_total) per vehicle model (id) for each current year (year_now) based on the bodies entering recycling and the recycling efficiencies in recycling
             
-            # adding eol[id, year] = {recycling_output_pp, recycling_output_pa, recycling_output_pc, recycling_output_abs, recycling_output_total}
+            # adding eol[id, year] = {recycling_output_<polymer>, recycling_output_total}
 
-            output_pp = bodies_pp * recycling.loc[year_now, 'pp_efficiency'] / 100
-            output_pa = bodies_pa * recycling.loc[year_now, 'pa_efficiency'] / 100
-            output_pc = bodies_pc * recycling.loc[year_now, 'pc_efficiency'] / 100
-            output_abs = bodies_abs * recycling.loc[year_now, 'abs_efficiency'] / 100
+            output = bodies * recycling.loc[year_now].to_numpy(dtype=float) / 100
 
-            eol.loc[(veh, year_now), 'recycling_output_pp'] = output_pp
-            eol.loc[(veh, year_now), 'recycling_output_pa'] = output_pa
-            eol.loc[(veh, year_now), 'recycling_output_pc'] = output_pc
-            eol.loc[(veh, year_now), 'recycling_output_abs'] = output_abs
-            eol.loc[(veh, year_now), 'recycling_output_total'] = output_pp + output_pa + output_pc + output_abs
+            eol.loc[(veh, year_now), output_columns] = output
+            eol.loc[(veh, year_now), 'recycling_output_total'] = sum(output)
 
     return eol
 
@@ -359,102 +374,66 @@ def calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data,
 ###  (5) CALCULATE CLOSED-LOOP RATES
 ###
 
-# Calculate closed-loop rates based on the polymer-specific recycling outputs (recycling_output_pp, recycling_output_pa, recycling_output_pc, recycling_output_abs) in eol, the vehicles registrations (registrations), the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data, and the production efficiencies and maximum recycled contents in production
+# Calculate closed-loop rates based on the polymer-specific recycling outputs (recycling_output_<polymer>) in eol, the vehicles registrations (registrations), the vehicle model data (total mass, plastic content, polymer contents) in vehicles_data, and the production efficiencies and maximum recycled contents in production
 
-# closedloop[year] = {demand_pp, demand_pa, demand_pc, demand_abs, demand_plastic, supply_pp, supply_pa, supply_pc, supply_abs, supply_total, pp, pa, pc, abs, total}
+# closedloop[year] = {demand_<polymer>, demand_plastic, supply_<polymer>, supply_total, <polymer>, total}
 
 def calc_closedloop(set_years, set_vehicles, vehicles_data, registrations, eol, production):
 
-    closedloop = pd.DataFrame({
-        'year': [j for j in set_years],
-
-        'demand_pp': [0 for j in set_years],
-        'demand_pa': [0 for j in set_years],
-        'demand_pc': [0 for j in set_years],
-        'demand_abs': [0 for j in set_years],
-        'demand_plastic': [0 for j in set_years],
-
-        'supply_pp': [0 for j in set_years],
-        'supply_pa': [0 for j in set_years],
-        'supply_pc': [0 for j in set_years],
-        'supply_abs': [0 for j in set_years],
-        'supply_total': [0 for j in set_years],
-
-        'pp': [0 for j in set_years],
-        'pa': [0 for j in set_years],
-        'pc': [0 for j in set_years],
-        'abs': [0 for j in set_years],
-        'total': [0 for j in set_years]
-        })
-    closedloop.set_index('year', inplace=True)
+    polymers = polymers_of(vehicles_data)
+    columns = polymer_columns(polymers)
+    n_polymers = len(polymers)
+
+    demand_columns = columns['closedloop'][:n_polymers]
+    supply_columns = columns['closedloop'][n_polymers + 1:2 * n_polymers + 1]
+
+    contents = vehicles_data[columns['vehicles_data'][2:]]
+    outputs = eol[columns['eol'][2 * n_polymers + 1:3 * n_polymers + 1]]
+    production = production[columns['production']]
+
+    closedloop = pd.DataFrame(
+        0.0,
+        columns=columns['closedloop'],
+        index=pd.Index(list(set_years), name='year'))
 
     for year_now in set_years:
-        demand_pp = 0
-        demand_pa = 0
-        demand_pc = 0
-        demand_abs = 0
+        demand = np.zeros(n_polymers)
         demand_plastic = 0
 
-        supply_pp = 0
-        supply_pa = 0
-        supply_pc = 0
-        supply_abs = 0
+        supply = np.zeros(n_polymers)
 
-        pp_eff = production.loc[year_now, 'pp_efficiency'] / 100
-        pa_eff = production.loc[year_now, 'pa_efficiency'] / 100
-        pc_eff = production.loc[year_now, 'pc_efficiency'] / 100
-        abs_eff = production.loc[year_now, 'abs_efficiency'] / 100
+        eff = production.loc[year_now].to_numpy(dtype=float)[:n_polymers] / 100
+        max_input = production.loc[year_now].to_numpy(dtype=float)[n_polymers:]
 
         for veh in set_vehicles:
             n_veh = registrations.loc[(veh, year_now), 'registrations']
             veh_mass = vehicles_data.loc[(veh, year_now), 'total_mass']
             veh_plastic = vehicles_data.loc[(veh, year_now), 'plastic_content']
-            veh_pp = vehicles_data.loc[(veh, year_now), 'pp_content']
-            veh_pa = vehicles_data.loc[(veh, year_now), 'pa_content']
-            veh_pc = vehicles_data.loc[(veh, year_now), 'pc_content']
-            veh_abs = vehicles_data.loc[(veh, year_now), 'abs_content']
-
-            demand_pp += n_veh * veh_mass * veh_plastic / 100 * veh_pp / 100
-            demand_pa += n_veh * veh_mass * veh_plastic / 100 * veh_pa / 100
-            demand_pc += n_veh * veh_mass * veh_plastic / 100 * veh_pc / 100
-            demand_abs += n_veh * veh_mass * veh_plastic / 100 * veh_abs / 100
+            veh_cont = contents.loc[(veh, year_now)].to_numpy(dtype=float)
+
+            demand += n_veh * veh_mass * veh_plastic / 100 * veh_cont / 100
             demand_plastic += n_veh * veh_mass * veh_plastic / 100
 
-            supply_pp += eol.loc[(veh, year_now), 'recycling_output_pp']
-            supply_pa += eol.loc[(veh, year_now), 'recycling_output_pa']
-            supply_pc += eol.loc[(veh, year_now), 'recycling_output_pc']
-            supply_abs += eol.loc[(veh, year_now), 'recycling_output_abs']
+            supply += outputs.loc[(veh, year_now)].to_numpy(dtype=float)
 
-        closedloop.loc[year_now, 'demand_pp'] = demand_pp
-        closedloop.loc[year_now, 'demand_pa'] = demand_pa
-        closedloop.loc[year_now, 'demand_pc'] = demand_pc
-        closedloop.loc[year_now, 'demand_abs'] = demand_abs
+        closedloop.loc[year_now, demand_columns] = demand
         closedloop.loc[year_now, 'demand_plastic'] = demand_plastic
 
         # Check for maximum recycled input:
 
-        if (supply_pp * pp_eff) > (demand_pp * production.loc[year_now, 'max_pp'] / 100):
-            supply_pp = demand_pp * production.loc[year_now, 'max_pp'] / 100 / pp_eff
-        if (supply_pa * pa_eff) > (demand_pa * production.loc[year_now, 'max_pa'] / 100):
-            supply_pa = demand_pa * production.loc[year_now, 'max_pa'] / 100 / pa_eff
-        if (supply_pc * pc_eff) > (demand_pc * production.loc[year_now, 'max_pc'] / 100):
-            supply_pc = demand_pc * production.loc[year_now, 'max_pc'] / 100 / pc_eff
-        if (supply_abs * abs_eff) > (demand_abs * production.loc[year_now, 'max_abs'] / 100):
-            supply_abs = demand_abs * production.loc[year_now, 'max_abs'] / 100 / abs_eff
-
-        closedloop.loc[year_now, 'supply_pp'] = supply_pp
-        closedloop.loc[year_now, 'supply_pa'] = supply_pa
-        closedloop.loc[year_now, 'supply_pc'] = supply_pc
-        closedloop.loc[year_now, 'supply_abs'] = supply_abs
-        closedloop.loc[year_now, 'supply_total'] = supply_pp + supply_pa + supply_pc + supply_abs
-
-        supply_total_ = supply_pp * pp_eff + supply_pa * pa_eff + supply_pc * pc_eff + supply_abs * abs_eff
-
-        closedloop.loc[year_now, 'pp'] = supply_pp * pp_eff / demand_pp * 100
-        closedloop.loc[year_now, 'pa'] = supply_pa * pa_eff / demand_pa * 100
-        closedloop.loc[year_now, 'pc'] = supply_pc * pc_eff / demand_pc * 100
-        closedloop.loc[year_now, 'abs'] = supply_abs * abs_eff / demand_abs * 100
-        closedloop.loc[year_now, 'total'] = supply_total_ / demand_plastic * 100
+        limit = demand * max_input / 100
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            supply = np.where(supply * eff > limit, limit / eff, supply)
+
+        closedloop.loc[year_now, supply_columns] = supply
+        closedloop.loc[year_now, 'supply_total'] = sum(supply)
+
+        supply_total_ = sum(supply * eff)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            closedloop.loc[year_now, polymers] = supply * eff / demand * 100
+            closedloop.loc[year_now, 'total'] = supply_total_ / demand_plastic * 100
 
     return closedloop
 
@@ -464,7 +443,20 @@ def calc_closedloop(set_years, set_vehicles, vehicles_data, registrations, eol,
 ###  CALCULATE ALL
 ###
 
-def calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale):
+def calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, engine='reference', out=None):
+
+    if engine == 'batch':
+        from batch import calc_all_frames
+
+        return calc_all_frames(start_year, end_year, [vehicles_data], [cagr], n_init_years, registrations, [loss], [dismantling], [recycling], [production], set_years, set_vehicles, [shape], [scale], out)[0]
+
+    if out is not None:
+        raise ValueError("(!) Writing fleet_detail into a given array (e.g. a memory-mapped file) requires the 'batch' engine.")
+
+    if engine == 'continuous':
+        from continuous import calc_all_continuous
+
+        return calc_all_continuous(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
 
 
     # (1) REGISTRATIONS
@@ -474,7 +466,7 @@ def calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrati
 
     # (2) VEHICLE FLEET
 
-    _fleet_detail, _fleet = calc_fleet(start_year, end_year, set_years, set_vehicles, _registrations, shape, scale)
+    _fleet_detail, _fleet = calc_fleet(start_year, end_year, set_years, set_vehicles, _registrations, shape, scale, engine)
 
 
     # (3) END-OF-LIFE (ELVS)
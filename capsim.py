@@ -0,0 +1,361 @@
+####
+#
+# CAPsim
+# Command-Line Interface
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Usage:
+#
+#   python capsim.py run [options]          model all scenarios without sensitivity analysis
+#   python capsim.py sa [options]           model all scenarios including sensitivity analysis
+#   python capsim.py export SCENARIO_PATH   re-export the results of a previous run from its cached state
+#   python capsim.py convert FILE [options] convert input files to tidy tables (CSV, JSON or Parquet, see reader.py)
+#   python capsim.py bench [options]        time the calculation stages for synthetic scenarios or input files
+#   python capsim.py regress ACTION         capture golden outputs, check calculation engines against them or report deviations
+#   python capsim.py sweep GRID [options]   evaluate a grid of parameter combinations on one input file into one table
+#   python capsim.py regions FILE [options] model several regions linked by exports of used vehicles into one table
+#   python capsim.py goalseek [options]     find the input value required to reach a target closed-loop rate
+#   python capsim.py optimize [options]     allocate a limited effort to recycling measures maximizing the closed-loop rate
+#   python capsim.py serve [options]        answer what-if queries (HTTP/JSON on localhost) with the scenarios kept in memory
+#
+# Run 'python capsim.py <command> --help' for all options. Heavy packages (pandas, scipy, matplotlib, openpyxl) are only imported by the commands that need them.
+
+
+
+import argparse
+import sys
+
+import main as settings
+
+
+
+###
+###  COMMANDS
+###
+
+def cmd_run(args, perform_sa=False):
+
+    from main import run
+
+    run(data_path=args.data, results_path=args.results, shape=args.shape, scale=args.scale, plotter_start_year=args.plotter_start_year, plotter_end_year=args.plotter_end_year, target_year=args.target_year, perform_sa=perform_sa, sensitivity=args.sensitivity, incremental=args.incremental, files=args.files, profile=args.profile, engine=args.engine, steps_per_year=args.steps_per_year, max_age=args.max_age, diffing=args.diffing, sa_workers=args.sa_workers, memmap=args.memmap, resume=args.resume, workers=args.workers, max_memory=args.max_memory)
+
+
+def cmd_sa(args):
+
+    cmd_run(args, perform_sa=True)
+
+
+def cmd_export(args):
+
+    from main import export_results
+
+    export_results(args.scenario_path, args.out)
+
+
+def cmd_convert(args):
+
+    import contextlib
+    import io
+    import os
+    import re
+
+    from reader import import_data, write_input_table
+
+    for file in args.files:
+        out = os.path.join(args.out, re.sub(r'\.[A-Za-z.]+$', '', os.path.basename(file)) + f'.{args.format}')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_input_table(import_data(file), out)
+
+        print(f"   '{file}' converted to '{out}'.")
+
+
+def cmd_bench(args):
+
+    import os
+
+    from benchmark import STAGES, DEFAULT_STAGES, bench_files, bench_scaling, compare_baseline, print_report, save_baseline
+
+    stages = STAGES if args.stages == ['all'] else (args.stages or DEFAULT_STAGES)
+
+    print('\n>  Benchmarking calculation stages...')
+
+    if args.files:
+        records = bench_files([os.path.join(args.data, file) for file in args.files], args.shape, args.scale, stages, args.repeat, engine=args.engine)
+    else:
+        records = bench_scaling(args.vehicles, args.years, args.init_years, args.shape, args.scale, stages, args.repeat, engine=args.engine)
+
+    diffs = compare_baseline(records, args.baseline, args.tolerance) if args.baseline else None
+
+    print_report(records, diffs)
+
+    if args.save_baseline:
+        save_baseline(records, args.save_baseline)
+
+        print(f'\n   baseline saved to {args.save_baseline}.')
+
+
+
+def cmd_regress(args):
+
+    import regression
+
+    cases = args.cases or regression.all_cases(args.data)
+
+    if args.action == 'capture':
+        print(f"\n>  Capturing golden outputs in '{args.golden}'...")
+
+        regression.capture_golden(cases, args.golden, args.data)
+        return
+
+    if args.action == 'deviation':
+        print(f"\n>  Summarizing the deviations of engine '{args.engine}' from the golden outputs in '{args.golden}'...")
+
+        regression.print_deviation(regression.deviation_report(args.engine, cases, args.golden, args.data))
+        return
+
+    tolerances = regression.load_tolerances(args.tolerances)
+
+    if args.action == 'check':
+        print(f"\n>  Checking engine '{args.engine}' against the golden outputs in '{args.golden}'...")
+
+        report = regression.check_golden(args.engine, cases, args.golden, args.data, tolerances)
+    else:
+        print(f"\n>  Comparing engine '{args.engine}' with the reference implementation...")
+
+        report = regression.compare_engines(args.engine, cases, args.data, tolerances)
+
+    if not regression.print_report(report, args.verbose):
+        return 1
+
+
+
+def cmd_sweep(args):
+
+    from sweep import load_grid, run_sweep, write_table
+
+    print(f"\n>  Evaluating the grid '{args.grid}'...")
+
+    table = run_sweep(load_grid(args.grid), args.file, args.shape, args.scale, args.workers, args.chunk_size)
+
+    write_table(table, args.out)
+
+    print(f"   {len(table)} rows written to '{args.out}'.")
+
+
+def cmd_regions(args):
+
+    from regions import load_regions, run_regions, region_table
+    from sweep import write_table
+
+    print(f"\n>  Modelling the regions of '{args.regions}'...")
+
+    table = region_table(run_regions(load_regions(args.regions), args.shape, args.scale, args.workers, args.max_generations))
+
+    write_table(table, args.out)
+
+    print(f"   {len(table)} rows written to '{args.out}'.")
+
+
+def cmd_goalseek(args):
+
+    from service import Session
+    from goalseek import goal_seek, print_result
+
+    print('\n>  Loading scenario...')
+
+    session = Session(args.data, [args.file], args.shape, args.scale, args.engine)
+
+    overrides = [{k: v for k, v in {'input': args.input, 'column': column, 'vehicles': args.vehicles, 'start_year': args.start_year, 'end_year': args.end_year}.items() if v is not None} for column in args.column]
+
+    print(f'\n>  Solving for {args.rate} = {args.target} in {args.year}...')
+
+    print_result(goal_seek(session, list(session.scenarios)[0], overrides, args.target, args.bounds, args.year, args.rate, args.mode, xtol=args.xtol))
+
+
+def cmd_optimize(args):
+
+    import json
+
+    from service import Session
+    from optimize import optimize, print_result
+
+    with open(args.levers) as f:
+        levers = json.load(f)
+
+    print('\n>  Loading scenario...')
+
+    session = Session(args.data, [args.file], args.shape, args.scale, args.engine)
+
+    print(f'\n>  Maximizing the total closed-loop rate in {args.year}...')
+
+    print_result(optimize(session, list(session.scenarios)[0], levers, args.year, args.budget, args.starts))
+
+
+def cmd_serve(args):
+
+    import os
+
+    from service import Session, serve
+
+    print('\n>  Loading scenarios...')
+
+    files = [os.path.basename(file) for file in args.files] if args.files else None
+
+    serve(Session(args.data, files, args.shape, args.scale, args.engine), args.host, args.port)
+
+
+
+###
+###  ARGUMENTS
+###
+
+def add_settings(parser, engine=settings.engine):
+
+    parser.add_argument('--data', default='data/', help="folder with the input files (default: 'data/')")
+    parser.add_argument('--files', nargs='+', help='input files in the data folder (default: all data* files, .xlsx, .xls, .csv, .csv.gz, .json or .parquet)')
+    parser.add_argument('--shape', type=float, default=settings.shape, help=f'Weibull shape parameter k (default: {settings.shape})')
+    parser.add_argument('--scale', type=float, default=settings.scale, help=f'Weibull scale parameter lambda (default: {settings.scale})')
+    parser.add_argument('--engine', choices=['reference', 'kernel', 'batch', 'continuous'], default=engine, help=f"calculation engine: 'reference', the compiled cohort survival 'kernel', 'batch' (vectorized stages, SA runs in one call), or 'continuous' (different numerical mode without floored fleet exits) (default: '{engine}')")
+
+
+def add_run_settings(parser):
+
+    add_settings(parser)
+
+    parser.add_argument('--results', default='results/', help="folder for the results (default: 'results/')")
+    parser.add_argument('--plotter-start-year', type=int, default=settings.plotter_start_year, help=f'first year of the multi-scenario plots (default: {settings.plotter_start_year})')
+    parser.add_argument('--plotter-end-year', type=int, default=settings.plotter_end_year, help=f'last year of the multi-scenario plots (default: {settings.plotter_end_year})')
+    parser.add_argument('--target-year', type=int, default=settings.target_year, help=f'highlighted target year (default: {settings.target_year})')
+    parser.add_argument('--sensitivity', type=float, default=settings.sensitivity, help=f'relative change in the sensitivity analysis (default: {settings.sensitivity})')
+    parser.add_argument('--steps-per-year', type=int, default=settings.steps_per_year, help=f'time steps per year of the additional sub-annual fleet and EoL results, e.g. 4 (quarterly) or 12 (monthly) (default: {settings.steps_per_year})')
+    parser.add_argument('--max-age', type=float, default=settings.max_age, help='maximum age in years up to which cohorts are tracked in sub-annual results, older vehicles leave the fleet as exits (default: whole time span)')
+    parser.add_argument('--sa-workers', type=int, default=settings.sa_workers, help=f'worker processes of the sensitivity analysis sharing the baseline inputs in shared memory (default: {settings.sa_workers})')
+    parser.add_argument('--workers', type=int, default=settings.workers, help=f'tasks of a run (modeling, SA runs, export) executed in parallel on worker processes (default: {settings.workers})')
+    parser.add_argument('--max-memory', type=float, default=settings.max_memory, help='limit of the estimated memory of the running tasks in MB (default: no limit)')
+    parser.add_argument('--memmap', action='store_true', default=settings.memmap, help="store the cohort arrays in memory-mapped files in 'arrays/' of the results (batch engine only)")
+    parser.add_argument('--resume', nargs='?', const=True, default=settings.resume, metavar='RUN_FOLDER', help="resume an interrupted run (default: the most recent run in the results folder) from its checkpoints")
+    parser.add_argument('--no-incremental', dest='incremental', action='store_false', help='recompute all scenarios instead of reusing unchanged results')
+    parser.add_argument('--no-diffing', dest='diffing', action='store_false', help='recompute changed scenarios completely instead of from the first changed year')
+    parser.add_argument('--profile', action='store_true', help='record wall time, CPU time and peak memory per stage in run_report.json/.csv')
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(prog='capsim', description='CAPsim - Circular Automotive Plastics simulation model')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('run', help='model all scenarios without sensitivity analysis')
+    add_run_settings(p)
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser('sa', help='model all scenarios including sensitivity analysis')
+    add_run_settings(p)
+    p.set_defaults(func=cmd_sa)
+
+    p = subparsers.add_parser('export', help='re-export the results of a scenario folder of a previous run')
+    p.add_argument('scenario_path', help="scenario folder of a previous run (e.g. 'results/<timestamp>/scenario_01')")
+    p.add_argument('--out', help='export folder (default: the scenario folder)')
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser('convert', help='convert input files to tidy tables (CSV, JSON or Parquet)')
+    p.add_argument('files', nargs='+', help="input files (e.g. 'data/data_01.xlsx')")
+    p.add_argument('--out', default='data/', help="folder of the converted files (default: 'data/')")
+    p.add_argument('--format', choices=['csv', 'csv.gz', 'json', 'parquet'], default='csv', help="format of the converted files (default: 'csv')")
+    p.set_defaults(func=cmd_convert)
+
+    p = subparsers.add_parser('bench', help='time the import and the calculation stages')
+    add_settings(p)
+    p.add_argument('--vehicles', type=int, nargs='+', default=[2], help='numbers of vehicle models of the synthetic scenarios (default: 2)')
+    p.add_argument('--years', type=int, nargs='+', default=[20, 40, 61], help='horizon lengths of the synthetic scenarios (default: 20 40 61)')
+    p.add_argument('--init-years', type=int, help='number of initialization years of the synthetic scenarios (default: 3/4 of the horizon)')
+    p.add_argument('--stages', nargs='+', help="stages to time, or 'all' to include run_sa (default: all stages except run_sa)")
+    p.add_argument('--repeat', type=int, default=1, help='number of repetitions per stage, the best time is reported (default: 1)')
+    p.add_argument('--baseline', help='JSON file with baseline timings to compare with')
+    p.add_argument('--save-baseline', help='save the timings as baseline to this JSON file')
+    p.add_argument('--tolerance', type=float, default=0.2, help='relative tolerance for regressions against the baseline (default: 0.2)')
+    p.set_defaults(func=cmd_bench)
+
+    p = subparsers.add_parser('regress', help='compare calculation engines with golden outputs of the reference implementation')
+    p.add_argument('action', choices=['capture', 'check', 'compare', 'deviation'], help='capture golden outputs, check an engine against them, compare an engine with the reference side by side, or summarize the deviations of a numerical mode')
+    p.add_argument('--engine', choices=['reference', 'kernel', 'batch', 'continuous'], default='reference', help="calculation engine to check (default: 'reference')")
+    p.add_argument('--cases', nargs='+', help='cases to run (default: all shipped scenarios and synthetic edge cases)')
+    p.add_argument('--golden', default='golden/', help="folder of the golden outputs (default: 'golden/')")
+    p.add_argument('--data', default='data/', help="folder with the shipped input files (default: 'data/')")
+    p.add_argument('--tolerances', help='JSON file with tolerances {output: {column: [rtol, atol]}}')
+    p.add_argument('--verbose', action='store_true', help='print the deviations of all columns')
+    p.set_defaults(func=cmd_regress)
+
+    p = subparsers.add_parser('sweep', help='evaluate a grid of parameter combinations on one input file')
+    p.add_argument('grid', help='JSON file with the grid (see sweep.py)')
+    p.add_argument('--file', help="base input file (default: 'file' in the grid)")
+    p.add_argument('--shape', type=float, default=settings.shape, help=f'Weibull shape parameter k unless varied by the grid (default: {settings.shape})')
+    p.add_argument('--scale', type=float, default=settings.scale, help=f'Weibull scale parameter lambda unless varied by the grid (default: {settings.scale})')
+    p.add_argument('--out', default='sweep.csv.gz', help="table of the closed-loop results, .csv, .csv.gz or .parquet (default: 'sweep.csv.gz')")
+    p.add_argument('--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    p.add_argument('--chunk-size', type=int, default=256, help='combinations per chunk (default: 256)')
+    p.set_defaults(func=cmd_sweep)
+
+    p = subparsers.add_parser('regions', help='model several regions linked by exports of used vehicles')
+    p.add_argument('regions', help='JSON file with the regions and the flows between them (see regions.py)')
+    p.add_argument('--shape', type=float, default=settings.shape, help=f'Weibull shape parameter k (default: {settings.shape})')
+    p.add_argument('--scale', type=float, default=settings.scale, help=f'Weibull scale parameter lambda (default: {settings.scale})')
+    p.add_argument('--out', default='regions.csv', help="table with one row per region and year, .csv, .csv.gz or .parquet (default: 'regions.csv')")
+    p.add_argument('--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    p.add_argument('--max-generations', type=int, default=20, help='maximum number of times exported vehicles are passed on (default: 20)')
+    p.set_defaults(func=cmd_regions)
+
+    p = subparsers.add_parser('goalseek', help='find the input value required to reach a target closed-loop rate')
+    add_settings(p, engine='batch')
+    p.add_argument('--file', required=True, help="input file in the data folder (e.g. 'data_01.xlsx')")
+    p.add_argument('--input', required=True, choices=['vehicles_data', 'loss', 'dismantling', 'recycling', 'production'], help='input of the parameter')
+    p.add_argument('--column', required=True, nargs='+', help="input column(s) of the parameter, set to the same value (e.g. 'pp_efficiency')")
+    p.add_argument('--mode', choices=['value', 'factor'], default='value', help="solve for a value or a factor on the input values (default: 'value')")
+    p.add_argument('--vehicles', nargs='+', help='vehicle models (ids or names) of the parameter (default: all)')
+    p.add_argument('--start-year', type=int, help='first year of the parameter (default: start year)')
+    p.add_argument('--end-year', type=int, help='last year of the parameter (default: end year)')
+    p.add_argument('--target', type=float, required=True, help='target closed-loop rate [%%]')
+    p.add_argument('--year', type=int, default=settings.target_year, help=f'target year (default: {settings.target_year})')
+    p.add_argument('--rate', default='total', help="closed-loop result to reach: 'total', 'pp', 'pa', 'pc', 'abs' (default: 'total')")
+    p.add_argument('--bounds', type=float, nargs=2, required=True, help='search interval of the parameter (e.g. 0 100)')
+    p.add_argument('--xtol', type=float, default=1e-6, help='absolute tolerance of the solution (default: 1e-6)')
+    p.set_defaults(func=cmd_goalseek)
+
+    p = subparsers.add_parser('optimize', help='allocate a limited effort to recycling measures maximizing the closed-loop rate')
+    add_settings(p, engine='batch')
+    p.add_argument('--file', required=True, help="input file in the data folder (e.g. 'data_01.xlsx')")
+    p.add_argument('--levers', required=True, help='JSON file with the levers, their bounds and costs (see optimize.py)')
+    p.add_argument('--budget', type=float, help='maximum effort, sum of cost * |change| (default: unlimited)')
+    p.add_argument('--year', type=int, default=settings.target_year, help=f'target year (default: {settings.target_year})')
+    p.add_argument('--starts', type=int, default=8, help='starting points of the nonlinear solver (default: 8)')
+    p.set_defaults(func=cmd_optimize)
+
+    p = subparsers.add_parser('serve', help='answer what-if queries with the scenarios kept in memory (HTTP/JSON)')
+    add_settings(p, engine='batch')
+    p.add_argument('--host', default='127.0.0.1', help="host to listen on (default: '127.0.0.1')")
+    p.add_argument('--port', type=int, default=8765, help='port to listen on (default: 8765)')
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def cli(argv=None):
+
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
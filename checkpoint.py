@@ -0,0 +1,121 @@
+####
+#
+# CAPsim
+# Scenario Checkpoints
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Saves the intermediate results of a scenario while it is being modeled, so an interrupted run (crash, preempted batch job) can be resumed without losing completed work. Each completed calculation is pickled to its own file in the folder 'checkpoints/' of the scenario results as soon as it is done:
+#
+#   scenario.pkl                    results of the stages (1) to (5) (see main.model_scenario)
+#   sa_plus_<name>.pkl              results of a run of the sensitivity analysis (see analyzer.run_sa)
+#   sa_minus_<name>.pkl
+#   manifest.json                   fingerprint of the scenario (see cache.py)
+#
+# Files are written to a temporary file first and then renamed, so an interruption never leaves a partial checkpoint, and every existing checkpoint file is complete. Since each checkpoint has its own file, the tasks of a run can save checkpoints of the same scenario from parallel worker processes (see scheduler.py). With resume = True (see main.py), a run continues in its results folder: scenarios completed before the interruption are reused from their cache, and the checkpoints of an interrupted scenario are loaded if its fingerprint (input file, settings, model code) is unchanged. The checkpoints are removed once the scenario is exported and cached.
+
+
+
+import json
+import os
+import pickle
+import shutil
+
+# storage.py (numpy, pandas) is imported by the methods that need it, so that importing this module (e.g. by main.py) stays fast.
+
+
+
+###
+###  (1) CHECKPOINTS
+###
+
+class Checkpoints:
+
+    def __init__(self, export_path, fp, resume=False):
+
+        self.export_path = export_path
+        self.path = os.path.join(export_path, 'checkpoints', '')
+        self.fp = fp
+
+        manifest = self.read_manifest() if resume else None
+
+        if manifest is None or manifest.get('fingerprint') != fp:
+            self.clear()
+
+            self.write('manifest.json', lambda f: json.dump({'fingerprint': fp}, f, indent=2))
+
+        completed = self.completed()
+
+        if completed:
+            print(f'   resuming from {len(completed)} checkpoint(s) in {self.path}')
+
+
+    def read_manifest(self):
+
+        try:
+            with open(f'{self.path}manifest.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def write(self, file, write):
+
+        os.makedirs(self.path, exist_ok=True)
+
+        tmp_file = f'{self.path}{file}.{os.getpid()}.tmp'
+
+        with open(tmp_file, 'w' if file.endswith('.json') else 'wb') as f:
+            write(f)
+
+        os.replace(tmp_file, f'{self.path}{file}')
+
+
+    # Names of the completed checkpoints
+
+    def completed(self):
+
+        if not os.path.isdir(self.path):
+            return []
+
+        return sorted(file[:-4] for file in os.listdir(self.path) if file.endswith('.pkl'))
+
+
+    # Saved value of a checkpoint, or None if it was not completed (or cannot be read)
+
+    def get(self, key):
+
+        from storage import StateUnpickler
+
+        if not os.path.isfile(f'{self.path}{key}.pkl'):
+            return None
+
+        try:
+            with open(f'{self.path}{key}.pkl', 'rb') as f:
+                return StateUnpickler(f, self.export_path).load()
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+
+    # Save a checkpoint (DataFrames on memory-mapped arrays are stored as references to their files, see storage.py)
+
+    def put(self, key, value):
+
+        from storage import StatePickler
+
+        self.write(f'{key}.pkl', lambda f: StatePickler(f, self.export_path).dump(value))
+
+
+    def clear(self):
+
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,196 @@
+####
+#
+# CAPsim
+# Continuous Fleet Model
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# (!) Different numerical mode: the number of vehicles exiting the fleet is not floored to whole vehicles.
+#
+# Without math.floor in calc_fleet, the stock of a cohort is its registrations times the survival function of the discretized Weibull distribution,
+#
+#   survival(age) = max(0, 1 - sum(weibull_pdf(0..age)))
+#
+# and the stock, exits, exports, unknown whereabouts and recycling inputs of the fleet are discrete convolutions of the registrations (weighted by the plastic contents of the cohorts) with the survival function and the exit kernel
+#
+#   exit(age) = survival(age - 1) - survival(age)
+#
+# They are calculated with FFT convolutions for all vehicle models at once in O(Y log Y). The results deviate from the floored reference by up to one vehicle per cohort and year; 'python capsim.py regress deviation' reports the deviations for the shipped scenarios.
+
+
+
+import numpy as np
+import pandas as pd
+from scipy.signal import fftconvolve
+
+from kernel import weibull_pdf
+from calculator import calc_registrations
+from batch import FLEET_COLUMNS, EOL_COLUMNS, CLOSEDLOOP_COLUMNS, stack_inputs, batch_closedloop, to_frames
+
+
+
+###
+###  (1) KERNELS
+###
+
+def survival_kernel(n_ages, shape, scale):
+
+    return np.maximum(0.0, 1.0 - np.cumsum(weibull_pdf(n_ages, shape, scale)))
+
+
+def exit_kernel(survival):
+
+    exits = np.zeros_like(survival)
+    exits[1:] = survival[:-1] - survival[1:]
+
+    return exits
+
+
+# Convolve series[..., year_reg] with kernel[age] and truncate to the horizon: result[..., year_now] = sum(series[..., year_reg] * kernel[year_now - year_reg])
+
+def convolve(series, kernel):
+
+    n_years = series.shape[-1]
+
+    return fftconvolve(series, kernel.reshape((1,) * (series.ndim - 1) + (-1,)), axes=-1)[..., :n_years]
+
+
+
+###
+###  (2) VEHICLE FLEET
+###
+
+# Continuous counterpart of calculator.calc_fleet (stock and fleet exits per cohort, stock of the fleet)
+
+def calc_fleet_continuous(start_year, end_year, set_years, set_vehicles, registrations, shape, scale):
+
+    n_years = len(set_years)
+
+    reg = registrations['registrations'].reindex(pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])).to_numpy(dtype=float).reshape(len(set_vehicles), n_years)
+
+    survival = survival_kernel(n_years, shape, scale)
+
+    fleet_detail = detail_arrays(reg, survival, np.zeros((n_years, 2)))
+    fleet_detail[..., 2:] = 0.0
+
+    fleet = np.zeros((len(set_vehicles), n_years, len(FLEET_COLUMNS)))
+    fleet[..., 0] = convolve(reg, survival)
+
+    results = {
+        'fleet_detail': fleet_detail[None],
+        'fleet': fleet[None],
+        'eol': np.zeros((1, len(set_vehicles), n_years, len(EOL_COLUMNS))),
+        'closedloop': np.zeros((1, n_years, len(CLOSEDLOOP_COLUMNS)))}
+
+    _, fleet_detail, fleet, _, _ = to_frames(results, 0, set_years, set_vehicles, registrations)
+
+    return fleet_detail, fleet
+
+
+# fleet_detail[id, year_reg, year_now, column] of the continuous model
+
+def detail_arrays(reg, survival, loss):
+
+    n_years = len(survival)
+
+    exits = exit_kernel(survival)
+
+    age = np.arange(n_years)[None, :] - np.arange(n_years)[:, None]  # age[year_reg, year_now]
+    valid = age >= 0
+    age = np.where(valid, age, 0)
+
+    stock = np.where(valid, reg[:, :, None] * survival[age], 0.0)
+    elvs_exit = np.where(valid, reg[:, :, None] * exits[age], 0.0)
+
+    exports = elvs_exit * loss[:, 0] / 100
+    unknown = elvs_exit * loss[:, 1] / 100
+
+    return np.stack([stock, elvs_exit, exports, unknown, elvs_exit - exports - unknown], axis=-1)
+
+
+
+###
+###  (3) CALCULATE ALL
+###
+
+# Continuous counterpart of calculator.calc_all for a single parameter set. Returns the same five DataFrames (registrations, fleet_detail, fleet, eol, closedloop); with details=False the dense fleet_detail is skipped (None), which keeps long horizons cheap.
+
+def calc_all_continuous(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, details=True):
+
+    n_years = len(set_years)
+
+    _registrations = calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, registrations)
+
+    inputs = stack_inputs(set_years, set_vehicles, [vehicles_data], [cagr], [loss], [dismantling], [recycling], [production], [shape], [scale])
+
+    n_polymers = len(inputs['polymers'])
+
+    vehicles_data_ = inputs['vehicles_data'][0]  # [id, year, column]
+    loss_ = inputs['loss'][0]  # [year, column]
+
+    reg = _registrations['registrations'].reindex(pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])).to_numpy(dtype=float).reshape(len(set_vehicles), n_years)
+
+    survival = survival_kernel(n_years, shape, scale)
+    exits = exit_kernel(survival)
+
+    # Share of fleet exits entering recycling per current year:
+
+    recycling_share = 1 - loss_[:, 0] / 100 - loss_[:, 1] / 100
+
+
+    # (2) VEHICLE FLEET, (3) END-OF-LIFE
+
+    stock = convolve(reg, survival)
+    elvs_exit = convolve(reg, exits)
+
+    elvs_export = elvs_exit * loss_[:, 0] / 100
+    elvs_unknown = elvs_exit * loss_[:, 1] / 100
+
+    fleet = np.stack([stock, elvs_exit, elvs_export, elvs_unknown, elvs_exit - elvs_export - elvs_unknown], axis=-1)
+
+
+    # (4) RECYCLING OUTPUTS
+
+    plastic = reg * vehicles_data_[..., 0] * vehicles_data_[..., 1] / 100  # plastic mass of the registrations [id, year_reg]
+
+    inputs_ = np.stack([convolve(plastic * vehicles_data_[..., 2 + p] / 100, exits) * recycling_share for p in range(n_polymers)], axis=-1)
+    input_elvs = fleet[..., 4]
+
+    dismantling_output = input_elvs[..., None] * inputs['dismantling'][0]
+    recycling_output = (inputs_ - dismantling_output) * inputs['recycling'][0][None, :, :] / 100
+
+    eol = np.concatenate([inputs_, input_elvs[..., None], dismantling_output, recycling_output, recycling_output.sum(axis=-1, keepdims=True)], axis=-1)
+
+
+    # (5) CLOSED-LOOP RATES
+
+    closedloop = batch_closedloop(reg[None], inputs['vehicles_data'], eol[None], inputs['production'])
+
+
+    # DETAILED VEHICLE FLEET
+
+    fleet_detail = None
+
+    if details:
+        fleet_detail = detail_arrays(reg, survival, loss_)[None]
+
+    results = {
+        'polymers': inputs['polymers'],
+        'registrations': reg[None],
+        'fleet_detail': fleet_detail,
+        'fleet': fleet[None],
+        'eol': eol[None],
+        'closedloop': closedloop}
+
+    return to_frames(results, 0, set_years, set_vehicles, _registrations)
+
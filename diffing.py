@@ -0,0 +1,195 @@
+####
+#
+# CAPsim
+# Scenario Diffing
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Recalculates a scenario from the results of a previous run of the same scenario (cached state, see cache.py) after its inputs have changed.
+#
+# All stages are causal in time, so a change of the inputs in year y only affects the results of year y and later:
+#
+#   registrations (incl. CAGR)              -> vehicle fleet of the cohorts registered from y on, and all following stages
+#   loss (exports, unknown whereabouts)     -> end-of-life from y on
+#   vehicles_data (of the cohorts from y)   -> recycling from y on (via the cohorts) and closed-loop rates
+#   dismantling, recycling                  -> recycling from y on
+#   production                              -> closed-loop rates from y on
+#
+# Each stage is recalculated from the earliest year changed in its own inputs or in the inputs of a preceding stage; the rows of earlier years are reused from the previous run. The stages are evaluated as array operations with the summation order of calculator.py (see batch.py), so the results equal those of a full recalculation.
+
+
+
+import numpy as np
+import pandas as pd
+
+from kernel import survival_active, weibull_pdf
+from calculator import polymers_of, polymer_columns
+from batch import FLEET_COLUMNS, LOSS_COLUMNS, stack_frames, ordered_sum, batch_recycling, batch_closedloop, to_frames
+
+
+
+STAGES = ['fleet', 'eol', 'recycling', 'closedloop']
+
+
+
+###
+###  (1) CHANGES
+###
+
+# Index of the first year in which two input DataFrames differ (len(set_years) if they are equal)
+
+def first_changed_year(previous, current, columns, set_years, set_vehicles=None):
+
+    values = stack_frames([previous, current], columns, set_years, set_vehicles)
+
+    changed = ~((values[0] == values[1]) | (np.isnan(values[0]) & np.isnan(values[1])))
+
+    if set_vehicles is not None:
+        changed = changed.any(axis=0)
+
+    years = np.flatnonzero(changed.any(axis=-1))
+
+    return int(years[0]) if len(years) else len(set_years)
+
+
+# Compare the inputs of a scenario with the cached scenario state of a previous run, and return the index of the first year to recalculate per stage ({stage: year}), or None if the scenario has to be recalculated completely (different time span, vehicle models or polymers, or incomplete previous results)
+
+def first_changes(previous, start_year, end_year, set_years, set_vehicles, vehicles_data, registrations, loss, dismantling, recycling, production):
+
+    if (previous.get('start_year'), previous.get('end_year'), previous.get('n_vehicles')) != (start_year, end_year, len(set_vehicles)):
+        return None
+
+    if any(previous.get(k) is None for k in ('registrations', 'vehicles_data', 'fleet_detail', 'fleet', 'eol', 'closedloop')):
+        return None
+
+    polymers = polymers_of(vehicles_data)
+
+    if polymers_of(previous['vehicles_data']) != polymers:
+        return None
+
+    columns = polymer_columns(polymers)
+
+    changes = {
+        'fleet': first_changed_year(previous['registrations'], registrations, ['registrations'], set_years, set_vehicles),
+        'eol': first_changed_year(previous['loss'], loss, LOSS_COLUMNS, set_years),
+        'recycling': min(
+            first_changed_year(previous['vehicles_data'], vehicles_data, columns['vehicles_data'], set_years, set_vehicles),
+            first_changed_year(previous['dismantling'], dismantling, columns['dismantling'], set_years, set_vehicles),
+            first_changed_year(previous['recycling'], recycling, columns['recycling'], set_years)),
+        'closedloop': first_changed_year(previous['production'], production, columns['production'], set_years)}
+
+    # Changes carry over to all following stages:
+
+    for k in range(1, len(STAGES)):
+        changes[STAGES[k]] = min(changes[STAGES[k]], changes[STAGES[k-1]])
+
+    return changes
+
+
+
+###
+###  (2) RECALCULATION
+###
+
+# Recalculate the stages of a scenario from the years in changes (see first_changes) and reuse the results of earlier years from the previous run. Returns fleet_detail, fleet, eol and closedloop as in calculator.calc_all.
+
+def calc_diff(previous, changes, vehicles_data, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale):
+
+    vehicles = list(set_vehicles)
+    years = list(set_years)
+
+    n_vehicles = len(vehicles)
+    n_years = len(years)
+
+    index = pd.MultiIndex.from_product([vehicles, years])
+
+    reg = registrations['registrations'].reindex(index).to_numpy(dtype=float).reshape(n_vehicles, n_years)
+
+    polymers = polymers_of(vehicles_data)
+    columns = polymer_columns(polymers)
+
+    vehicles_data_ = stack_frames([vehicles_data], columns['vehicles_data'], set_years, set_vehicles)
+    loss_ = stack_frames([loss], LOSS_COLUMNS, set_years)[0]
+    dismantling_ = stack_frames([dismantling], columns['dismantling'], set_years, set_vehicles)
+    recycling_ = stack_frames([recycling], columns['recycling'], set_years)
+    production_ = stack_frames([production], columns['production'], set_years)
+
+    # Results of the previous run:
+
+    fleet_detail = previous['fleet_detail'].reindex(pd.MultiIndex.from_product([vehicles, years, years]))[FLEET_COLUMNS].to_numpy(dtype=float).reshape(n_vehicles, n_years, n_years, len(FLEET_COLUMNS))
+    fleet = previous['fleet'].reindex(index)[FLEET_COLUMNS].to_numpy(dtype=float).reshape(n_vehicles, n_years, len(FLEET_COLUMNS))
+    eol = previous['eol'].reindex(index)[columns['eol']].to_numpy(dtype=float).reshape(n_vehicles, n_years, len(columns['eol']))
+    closedloop = previous['closedloop'].reindex(years)[columns['closedloop']].to_numpy(dtype=float)
+
+
+    # (2) VEHICLE FLEET of the cohorts registered from the first changed year on
+
+    y = changes['fleet']
+
+    if y < n_years:
+        stock_age, _ = survival_active(np.ascontiguousarray(reg[:, y:].reshape(-1)), weibull_pdf(n_years, shape, scale))
+
+        n_active = stock_age.shape[1]
+
+        age = np.arange(n_years)[None, :] - np.arange(y, n_years)[:, None]  # age[year_reg, year_now]
+        valid = age >= 0
+        age = np.minimum(np.where(valid, age, 0), n_active - 1)
+
+        fleet_detail[:, y:, :, 0] = np.where(valid, stock_age.reshape(n_vehicles, n_years - y, n_active)[:, np.arange(n_years - y)[:, None], age], 0.0)
+
+        fleet[:, y:, 0] = ordered_sum(fleet_detail[:, :, y:, 0], axis=1)
+
+
+    # (3) END-OF-LIFE from the first changed year on
+
+    y = changes['eol']
+
+    if y < n_years:
+        year_now = np.arange(y, n_years)
+        stock = fleet_detail[..., 0]
+
+        exits = np.where(np.arange(n_years)[:, None] < year_now[None, :], stock[:, :, np.maximum(year_now - 1, 0)] - stock[:, :, year_now], 0.0)
+        exports = exits * loss_[year_now, 0] / 100
+        unknown = exits * loss_[year_now, 1] / 100
+
+        fleet_detail[:, :, y:, 1:] = np.stack([exits, exports, unknown, exits - exports - unknown], axis=-1)
+
+        for k in range(1, len(FLEET_COLUMNS)):
+            fleet[:, y:, k] = ordered_sum(fleet_detail[:, :, y:, k], axis=1)
+
+
+    # (4) RECYCLING OUTPUTS from the first changed year on
+
+    y = changes['recycling']
+
+    if y < n_years:
+        eol[:, y:] = batch_recycling(fleet_detail[None, :, :, y:, 4], vehicles_data_, dismantling_[:, :, y:], recycling_[:, y:])[0]
+
+
+    # (5) CLOSED-LOOP RATES from the first changed year on
+
+    y = changes['closedloop']
+
+    if y < n_years:
+        closedloop[y:] = batch_closedloop(reg[None, :, y:], vehicles_data_[:, :, y:], eol[None, :, y:], production_[:, y:])[0]
+
+    results = {
+        'polymers': polymers,
+        'fleet_detail': fleet_detail[None],
+        'fleet': fleet[None],
+        'eol': eol[None],
+        'closedloop': closedloop[None]}
+
+    _, fleet_detail, fleet, eol, closedloop = to_frames(results, 0, set_years, set_vehicles, registrations)
+
+    return fleet_detail, fleet, eol, closedloop
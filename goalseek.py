@@ -0,0 +1,105 @@
+####
+#
+# CAPsim
+# Goal Seek
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Finds the value of an input parameter that is required to reach a target closed-loop rate in a target year, e.g. the PP recycling efficiency for 10% recycled PP content in 2035.
+#
+# The parameter is one or more input columns set to the same value (or scaled by the same factor), defined like the overrides of service.py:
+#
+#   goal_seek(session, 'data_01', [{'input': 'recycling', 'column': 'pp_efficiency', 'start_year': 2030}], target=10, bounds=(0, 100), year=2035, rate='pp')
+#
+# Each evaluation only recalculates the stages affected by the parameter (see diffing.py), e.g. recycling outputs and closed-loop rates for recycling efficiencies, while the vehicle fleet and end-of-life results are reused. The root is searched with Brent's method within the bounds; the closed-loop rate must reach the target between them.
+
+
+
+import time
+
+from scipy.optimize import brentq
+
+
+
+###
+###  (1) GOAL SEEK
+###
+
+# Closed-loop rate in year for the parameter value x
+
+def evaluate(session, scenario, overrides, x, year, rate='total', mode='value', cagr=None):
+
+    closedloop, _ = session.whatif(scenario, [dict(override, **{mode: x}) for override in overrides], cagr)
+
+    return float(closedloop.loc[year, rate])
+
+
+def goal_seek(session, scenario, overrides, target, bounds, year, rate='total', mode='value', cagr=None, xtol=1e-6, maxiter=100):
+
+    if mode not in ('value', 'factor'):
+        raise ValueError(f"(!) Unknown mode '{mode}'. Please choose 'value' or 'factor'.")
+
+    if not overrides:
+        raise ValueError('(!) No parameter to solve for. Please define at least one input column.')
+
+    if year not in session.get(scenario)['set_years']:
+        raise ValueError(f'(!) The target year {year} is not within the time span of scenario {scenario}.')
+
+    if rate not in session.baseline(scenario).columns:
+        raise ValueError(f"(!) Unknown closed-loop result '{rate}'. Please choose one of {list(session.baseline(scenario).columns)}.")
+
+    t = time.perf_counter()
+    evaluations = 0
+
+    def f(x):
+        nonlocal evaluations
+        evaluations += 1
+
+        return evaluate(session, scenario, overrides, x, year, rate, mode, cagr) - target
+
+    lower, upper = bounds
+    f_lower, f_upper = f(lower), f(upper)
+
+    if f_lower * f_upper > 0:
+        raise ValueError(f'(!) The target {rate} = {target} in {year} is not reached within the bounds: {rate} = {f_lower + target:.4g} for {lower} and {f_upper + target:.4g} for {upper}.')
+
+    if f_lower == 0:
+        solution, iterations, converged = lower, 0, True
+    elif f_upper == 0:
+        solution, iterations, converged = upper, 0, True
+    else:
+        solution, info = brentq(f, lower, upper, xtol=xtol, maxiter=maxiter, full_output=True, disp=False)
+        iterations, converged = info.iterations, info.converged
+
+    return {
+        'scenario': scenario,
+        'parameter': [f"{o['input']}.{o['column']}" for o in overrides],
+        'mode': mode,
+        'year': year,
+        'rate': rate,
+        'target': target,
+        'solution': float(solution),
+        'achieved': evaluate(session, scenario, overrides, solution, year, rate, mode, cagr),
+        'baseline': float(session.baseline(scenario).loc[year, rate]),
+        'iterations': iterations,
+        'evaluations': evaluations,
+        'converged': bool(converged),
+        'seconds': time.perf_counter() - t}
+
+
+def print_result(result):
+
+    print(f"   parameter:   {', '.join(result['parameter'])} ({result['mode']})")
+    print(f"   target:      {result['rate']} = {result['target']} in {result['year']} (baseline {result['baseline']:.4f})")
+    print(f"   solution:    {result['solution']:.6g} ({result['rate']} = {result['achieved']:.4f})")
+    print(f"   iterations:  {result['iterations']} ({result['evaluations']} evaluations, {result['seconds']:.2f} s){'' if result['converged'] else ' - (!) not converged'}")
@@ -0,0 +1,217 @@
+####
+#
+# CAPsim
+# Cohort Survival Kernel
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Compiled implementation of the stock recursion of calculator.calc_fleet. The recursion runs over contiguous arrays of cohorts (vehicle model, year of registration) and ages in native loops and keeps the exact semantics of the reference implementation:
+#
+#   elvs_exit = floor(registrations * weibull_pdf(age))
+#   exit_sum += elvs_exit
+#   if exit_sum > registrations:  elvs_exit = registrations (age 0) or min(previous stock, elvs_exit) (age > 0)
+#   stock = registrations - elvs_exit (age 0) or previous stock - elvs_exit (age > 0)
+#
+# Numba is used if installed; otherwise the recursion runs as a NumPy loop over ages, vectorized over all cohorts.
+#
+# The recursion only runs over the active ages of the cohorts: once floor(registrations * weibull_pdf(age)) is zero for all following ages, no further vehicles exit the fleet and the stock stays at its residual. Later ages are read from the last active age, so the work is O(Y * A) for Y years and A active ages instead of O(Y^2).
+#
+# The truncation covers the recursion only. calc_fleet_kernel still maps the active ages to the dense fleet_detail[id, year_reg, year_now] that calc_eol, the cache and the xlsx export expect, so memory and the following stages stay O(Y^2); the reference engine (calculator.calc_fleet, calc_eol) walks the full triangle. Only the closed-loop path of batch.py without details (batch_eol_active, batch_recycling_active, used by sweep.py) stays O(Y * A) throughout.
+
+
+
+import numpy as np
+import pandas as pd
+from scipy.stats import weibull_min
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+
+###
+###  (1) SURVIVAL KERNEL
+###
+
+# survival(registrations[cohort], pdf[age]) -> stock[cohort, age], elvs_exit[cohort, age]
+
+def _survival_numpy(registrations, pdf):
+
+    n_cohorts = len(registrations)
+    n_ages = len(pdf)
+
+    stock = np.zeros((n_cohorts, n_ages))
+    elvs_exit = np.zeros((n_cohorts, n_ages))
+
+    exit_sum = np.zeros(n_cohorts)
+
+    for age in range(n_ages):
+        _exit = np.floor(registrations * pdf[age])
+
+        exit_sum += _exit
+
+        # No negative stock permitted:
+
+        over = exit_sum > registrations
+
+        if age == 0:
+            _exit = np.where(over, registrations, _exit)
+            stock[:, age] = registrations - _exit
+
+        else:
+            _exit = np.where(over, np.minimum(stock[:, age-1], _exit), _exit)
+            stock[:, age] = stock[:, age-1] - _exit
+
+        elvs_exit[:, age] = _exit
+
+    return stock, elvs_exit
+
+
+def _survival_loops(registrations, pdf):
+
+    n_cohorts = registrations.shape[0]
+    n_ages = pdf.shape[0]
+
+    stock = np.zeros((n_cohorts, n_ages))
+    elvs_exit = np.zeros((n_cohorts, n_ages))
+
+    for c in range(n_cohorts):
+        reg = registrations[c]
+        exit_sum = 0.0
+
+        for age in range(n_ages):
+            _exit = np.floor(reg * pdf[age])
+
+            exit_sum += _exit
+
+            if exit_sum > reg:
+                if age == 0:
+                    _exit = reg
+                else:
+                    _exit = min(stock[c, age-1], _exit)
+
+            elvs_exit[c, age] = _exit
+
+            if age == 0:
+                stock[c, age] = reg - _exit
+            else:
+                stock[c, age] = stock[c, age-1] - _exit
+
+    return stock, elvs_exit
+
+
+if numba is not None:
+    survival = numba.njit(cache=True)(_survival_loops)
+    BACKEND = 'numba'
+else:
+    survival = _survival_numpy
+    BACKEND = 'numpy'
+
+
+def weibull_pdf(n_ages, shape, scale):
+
+    return weibull_min.pdf(np.arange(n_ages), shape, scale=scale)
+
+
+# Number of active ages: from this age on, floor(registrations * pdf) is zero for every cohort (exits stay zero and stocks constant)
+
+def active_ages(registrations, pdf):
+
+    active = np.flatnonzero(np.max(registrations, initial=0.0) * pdf >= 1)
+
+    if len(active) == 0:
+        return 1
+
+    return int(active[-1]) + 1
+
+
+# survival over the active ages only: stock[cohort, age] and elvs_exit[cohort, age] for age < active_ages(registrations, pdf)
+
+def survival_active(registrations, pdf):
+
+    return survival(registrations, pdf[:active_ages(registrations, pdf)])
+
+
+
+###
+###  (2) VEHICLE FLEET
+###
+
+# Drop-in replacement for calculator.calc_fleet with identical outputs
+
+def calc_fleet_kernel(start_year, end_year, set_years, set_vehicles, registrations, shape, scale):
+
+    years = np.array(list(set_years))
+    vehicles = np.array(list(set_vehicles))
+
+    n_years = len(years)
+    n_vehicles = len(vehicles)
+
+    # Registrations per cohort in the order (id, year_reg):
+
+    index = pd.MultiIndex.from_product([vehicles, years])
+    reg = registrations['registrations'].reindex(index).to_numpy(dtype=float)
+
+    pdf = weibull_pdf(n_years, shape, scale)
+
+    stock_age, exit_age = survival_active(np.ascontiguousarray(reg), pdf)
+
+    n_active = stock_age.shape[1]
+
+    # Map ages to current years: year_now = year_reg + age (ages beyond the active ages keep the residual stock and have no exits)
+
+    age = np.arange(n_years)[None, :] - np.arange(n_years)[:, None]  # age[year_reg, year_now]
+    valid = age >= 0
+    age = np.where(valid, age, 0)
+    active = np.minimum(age, n_active - 1)
+
+    stock = np.where(valid, stock_age.reshape(n_vehicles, n_years, n_active)[:, np.arange(n_years)[:, None], active], 0.0)
+    elvs_exit = np.where(valid & (age < n_active), exit_age.reshape(n_vehicles, n_years, n_active)[:, np.arange(n_years)[:, None], active], 0.0)
+
+
+    # DETAILED VEHICLE FLEET
+
+    n = n_vehicles * n_years * n_years
+    zeros = np.zeros(n, dtype=np.int64)
+
+    fleet_detail = pd.DataFrame({
+        'stock': stock.reshape(n),
+        'elvs_exit': elvs_exit.reshape(n),
+        'elvs_export': zeros,
+        'elvs_unknown': zeros,
+        'elvs_recycling': zeros},
+        index=pd.MultiIndex.from_product([vehicles, years, years], names=['id', 'year_reg', 'year_now']))
+
+
+    # CUMULATED VEHICLE FLEET
+
+    # Stocks are summed in the order of the years of registration as in the reference implementation:
+
+    stock_sum = np.zeros((n_vehicles, n_years))
+
+    for r in range(n_years):
+        stock_sum += stock[:, r, :]
+
+    zeros = np.zeros(n_vehicles * n_years, dtype=np.int64)
+
+    fleet = pd.DataFrame({
+        'stock': stock_sum.reshape(-1),
+        'elvs_exit': zeros,
+        'elvs_export': zeros,
+        'elvs_unknown': zeros,
+        'elvs_recycling': zeros},
+        index=pd.MultiIndex.from_product([vehicles, years], names=['id', 'year']))
+
+    return fleet_detail, fleet
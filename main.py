@@ -27,24 +27,21 @@
 
 
 
-import pandas as pd
-from scipy.stats import weibull_min
-import matplotlib.pyplot as plt
+
 from datetime import datetime
+import json
 import os
 import re
 import shutil
-import math
 
-from reader import import_data
-from calculator import *
-from analyzer import run_sa
-from plotter import plot_data
-from plotter_multi import plot_multi_data
-from plotter_sa import plot_sa_data
-from plotter_sa_multi import plot_sa_multi_data
-from writer import export_data
-from writer_sa import export_sa_data
+from cache import fingerprint, match_cache, find_cache, find_last_run, find_previous, link_results, load_cache, save_cache
+from checkpoint import Checkpoints
+from scheduler import Scheduler
+import profiler
+from profiler import stage
+import progress
+
+# pandas, scipy, matplotlib and openpyxl are imported by the functions that need them, so that importing this module (e.g. by capsim.py) stays fast.
 
 
 
@@ -54,10 +51,26 @@ from writer_sa import export_sa_data
 ###  SETTINGS
 ###
 
+# Default settings for 'python main.py'. All settings can be overridden
+# as arguments of run() or on the command line (see capsim.py).
+
 # Set Weibull parameters:
 shape = 3.2  # k
 scale = 16.75  # lambda
 
+# Set calculation engine:
+# 'reference' - original recursion (for audits)
+# 'kernel'    - compiled cohort survival kernel (Numba if installed, otherwise NumPy) with identical results
+# 'batch'     - kernel and vectorized stages; all sensitivity analysis runs are calculated in one call
+# 'continuous' - (!) different numerical mode: fleet exits are not floored to whole vehicles (see continuous.py)
+engine = 'reference'  # ['reference'/'kernel'/'batch'/'continuous']
+
+# Set time resolution of the additional sub-annual fleet and EoL results:
+# (!) 1 - annual results only; 4 - quarterly, 12 - monthly results in results_steps.xlsx
+#     Cohorts are tracked up to max_age years (None: whole time span); older vehicles leave the fleet as exits.
+steps_per_year = 1  # [1/4/12]
+max_age = None  # years
+
 # Set time span for plotting multi-scenario results:
 # (!) years must be consistant with the input data
 plotter_start_year = 2025
@@ -73,61 +86,133 @@ target_year = 2035
 perform_sa = True  # [True/False]
 sensitivity = 0.2
 
+# Set number of worker processes of the sensitivity analysis:
+# (!) With more than one worker, the SA runs are calculated in parallel with
+#     the stages of batch.py; the baseline inputs are shared with the workers
+#     in shared memory (see sa_shared.py). Not for the 'continuous' engine.
+sa_workers = 1
+
+# Set number of tasks of a run executed in parallel:
+# (!) A run is executed as a graph of tasks (modeling, SA runs and export per
+#     scenario, comparison plots; see scheduler.py). With more than one worker,
+#     independent tasks run on parallel worker processes, and the SA runs of a
+#     scenario are split into one task per worker. The estimated memory of the
+#     running tasks is limited to max_memory (None: no limit).
+workers = 1
+max_memory = None  # MB
+
+# Store the cohort arrays (fleet_detail) in memory-mapped files?
+# (!) The arrays of the scenario and of the sensitivity analysis are written
+#     to 'arrays/' in the results folder instead of being kept in memory
+#     (see storage.py). Only for the 'batch' engine; disables diffing.
+memmap = False  # [True/False]
+
+# Reuse results of unchanged scenarios from previous runs?
+# (!) A scenario is only recomputed if its input file, the settings above or
+#     the model code have changed since a previous run in 'results/'.
+incremental = True  # [True/False]
+
+# Recalculate changed scenarios only from the first changed year?
+# (!) The previous results of a scenario are reused up to the first year and
+#     stage affected by changes in its input file (not for the 'continuous'
+#     engine). The sensitivity analysis is always recalculated completely.
+diffing = True  # [True/False]
+
+# Resume an interrupted run?
+# (!) Continues the most recent run in 'results/' (or the given results folder
+#     of a run): completed scenarios are reused, and an interrupted scenario is
+#     continued from its checkpoints (see checkpoint.py).
+resume = False  # [True/False/'results/<timestamp>/']
+
+# Record wall time, CPU time and peak memory per stage?
+# (!) Results in a run report (run_report.json, run_report.csv) in the results
+#     folder. Memory tracing slows down the model calculations.
+profile = False  # [True/False]
+
 #########################################################################
 
 
 
-print('\n##### CAPsim - Circular Automotive Plastics simulation model #####')
-print('Copyright 2025 Dominik Reichert')
+###
+###  IMPORT DATA
+###
 
-plots = []
-sa_plots = []
-sa_results = []
+# Find all input files (scenarios) in the data folder, in any of the formats of reader.py (Excel or tidy tables)
 
+def find_input_files(data_path='data/'):
 
+    from reader import INPUT_FORMATS
 
-###
-###  IMPORT DATA
-###
+    files = sorted([
+        file for file in os.listdir(data_path) if file.lower().startswith('data') and file.lower().endswith(INPUT_FORMATS)
+        ])
 
-print('\n>  Looking for input files...')
+    if not files:
+        raise FileNotFoundError(f"(!) The expected input file 'data.xlsx' was not found in '{data_path}'.")
 
-files = sorted([
-    file for file in os.listdir('data/') if file.lower().startswith('data') and file.lower().endswith(('.xls', '.xlsx'))
-    ])
+    # A scenario may only be defined by one file:
 
-if not files:
-    raise FileNotFoundError(f"(!) The expected input file 'data.xlsx' was not found in 'data/'.")
-    
-n_scenarios = len(files)
+    names = [re.sub(r'\.[a-z.]+$', '', file.lower()) for file in files]
+    duplicates = sorted(file for file, name in zip(files, names) if names.count(name) > 1)
 
-print(f'   number of input files (scenarios) found: {n_scenarios}')
+    if duplicates:
+        raise ValueError(f"(!) The input files {', '.join(duplicates)} in '{data_path}' define the same scenario. Please keep only one of them.")
 
+    return files
 
-### IMPORT DATA FROM EXCEL FILE FOR EACH SCENARIO
 
-for s in range(n_scenarios):
+# Import and validate all input files before modeling, and raise a ValueError listing the problems of all invalid input files at once (see validator.py). Returns the imported data of each file ({file: (terminal output of the import, data)}), which is passed on to model_scenario, so every input file is only imported once.
 
-    if n_scenarios > 1:
-        scenario_id = re.search(r'data_(\d+)\.xlsx$', files[s]).group(1)
+def check_input_files(data_path, files):
 
-        print(f'\n>  Importing data of scenario {scenario_id}...')
+    import contextlib
+    import io
 
-    else:
-        print('\n>  Importing data...')
+    from reader import import_data
 
-    import_file = f"data/{files[s]}"
+    imported = {}
+    errors = []
 
-    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = import_data(import_file)
+    for file in files:
+        output = io.StringIO()
 
+        try:
+            with contextlib.redirect_stdout(output):
+                data = import_data(os.path.join(data_path, file))
 
+        except ValueError as e:
+            errors.append(str(e))
 
-    ###
-    ###  MODELING
-    ###
+        else:
+            imported[file] = (output.getvalue(), data)
 
-    if n_scenarios > 1:
-        print(f'\n>  Start modeling of scenario {scenario_id}...')
+    if errors:
+        raise ValueError('\n'.join(errors))
+
+    return imported
+
+
+
+###
+###  MODELING
+###
+
+# Import and model a single scenario from an input file (stages (1) to (5) and sub-annual results) and return all scenario data and results as a dictionary. With the scenario results of a previous run (previous), only the stages and years affected by changed inputs are recalculated. With arrays_path, the cohort arrays are stored in memory-mapped files in arrays_path (see storage.py). With imported (see check_input_files), the input file is not imported again.
+
+def model_scenario(import_file, shape=shape, scale=scale, engine=engine, steps_per_year=steps_per_year, max_age=max_age, previous=None, arrays_path=None, imported=None):
+
+    from reader import import_data
+    from calculator import calc_registrations, calc_fleet, calc_eol, calc_recycling, calc_closedloop, calc_all
+
+    if imported is not None:
+        output, data = imported
+        print(output, end='')
+
+    else:
+        with stage('import_data', file=import_file):
+            data = import_data(import_file)
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = data
 
     set_years = range(start_year, end_year + 1)
     set_vehicles = range(1, n_vehicles + 1)
@@ -139,18 +224,59 @@ for s in range(n_scenarios):
 
     registrations_origin = registrations.copy()
 
-    registrations = calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, registrations)
+    with stage('calc_registrations'):
+        registrations = calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, registrations)
 
     tmp['registrations'] = registrations
 
     print('   modeling future vehicle registrations done.')
 
 
+    # Scenario diffing: recalculate the stages (2) to (5) from the first changed year only
+
+    changes = None
+
+    if previous is not None:
+        from diffing import STAGES, first_changes, calc_diff
+
+        changes = first_changes(previous, start_year, end_year, set_years, set_vehicles, vehicles_data, registrations, loss, dismantling, recycling, production)
+
+    if changes is not None:
+        first = min(STAGES, key=lambda k: changes[k])
+
+        if changes[first] < n_years:
+            print(f'\n>  Inputs changed from {set_years[changes[first]]} on, recalculating {first} and following stages from the previous run...')
+        else:
+            print('\n>  Inputs unchanged, reusing the results of the previous run...')
+
+        with stage('calc_diff', **changes):
+            fleet_detail, fleet, eol, closedloop = calc_diff(previous, changes, vehicles_data, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
+
+
+    # Vectorized engines calculate the stages (2) to (5) in a single call:
+
+    vectorized = changes is not None or engine in ('batch', 'continuous')
+
+    if vectorized and changes is None:
+        out = None
+
+        if arrays_path is not None:
+            from storage import create_array
+            from batch import FLEET_COLUMNS
+
+            out = create_array(f'{arrays_path}fleet_detail.npy', (1, n_vehicles, n_years, n_years, len(FLEET_COLUMNS)))
+
+        with stage('calc_all'):
+            _, fleet_detail, fleet, eol, closedloop = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations_origin, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, engine, out)
+
+
     # (2) MODEL VEHICLE FLEET
 
     print('\n>  Modeling vehicle fleet...')
 
-    fleet_detail, fleet = calc_fleet(start_year, end_year, set_years, set_vehicles, registrations, shape, scale)
+    if not vectorized:
+        with stage('calc_fleet'):
+            fleet_detail, fleet = calc_fleet(start_year, end_year, set_years, set_vehicles, registrations, shape, scale, engine)
 
     tmp['fleet_detail'] = fleet_detail
     tmp['fleet'] = fleet
@@ -163,10 +289,12 @@ for s in range(n_scenarios):
     # (3.1) MODEL FLEET EXITS
     # (3.2) MODEL EXPORTS AND UNKNOWN WHEREABOUTS
     # (3.3) MODEL VEHICLES ENTERING RECYCLING
-    
+
     print('\n>  Modeling ELVs...')
 
-    fleet_detail, fleet = calc_eol(start_year, end_year, set_years, set_vehicles, fleet_detail, fleet, loss)
+    if not vectorized:
+        with stage('calc_eol'):
+            fleet_detail, fleet = calc_eol(start_year, end_year, set_years, set_vehicles, fleet_detail, fleet, loss)
 
     tmp['fleet_detail'] = fleet_detail
     tmp['fleet'] = fleet
@@ -178,7 +306,9 @@ for s in range(n_scenarios):
 
     print('\n>  Modeling recycling...')
 
-    eol = calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data, fleet_detail, dismantling, recycling)
+    if not vectorized:
+        with stage('calc_recycling'):
+            eol = calc_recycling(start_year, end_year, set_years, set_vehicles, vehicles_data, fleet_detail, dismantling, recycling)
 
     tmp['eol'] = eol
 
@@ -189,13 +319,90 @@ for s in range(n_scenarios):
 
     print('\n>  Modeling closed-loop rates...')
 
-    closedloop = calc_closedloop(set_years, set_vehicles, vehicles_data, registrations, eol, production)
+    if not vectorized:
+        with stage('calc_closedloop'):
+            closedloop = calc_closedloop(set_years, set_vehicles, vehicles_data, registrations, eol, production)
 
     tmp['closedloop'] = closedloop
 
     print('   modeling closed-loop rates done.')
 
 
+    scenario = {
+        'scenario_name': scenario_name,
+        'start_year': start_year,
+        'end_year': end_year,
+        'n_years': n_years,
+        'n_vehicles': n_vehicles,
+        'vehicles_names': vehicles_names,
+        'vehicles_data': vehicles_data,
+        'cagr': cagr,
+        'n_init_years': n_init_years,
+        'registrations_origin': registrations_origin,
+        'registrations': registrations,
+        'loss': loss,
+        'dismantling': dismantling,
+        'recycling': recycling,
+        'production': production,
+        'tmp': tmp,
+        'set_years': set_years,
+        'set_vehicles': set_vehicles,
+        'fleet_detail': fleet_detail,
+        'fleet': fleet,
+        'eol': eol,
+        'closedloop': closedloop,
+        'fleet_steps': None,
+        'eol_steps': None,
+        'sa_result': None}
+
+
+    ### SUB-ANNUAL RESULTS
+
+    if steps_per_year > 1:
+
+        from timestep import calc_all_steps
+
+        print(f'\n>  Modeling vehicle fleet and ELVs in {steps_per_year} steps per year...')
+
+        with stage('calc_steps', steps_per_year=steps_per_year):
+            _, scenario['fleet_steps'], scenario['eol_steps'], _, _, _ = calc_all_steps(start_year, end_year, vehicles_data, cagr, n_init_years, registrations_origin, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, steps_per_year, max_age)
+
+        print('   modeling sub-annual fleet and ELVs done.')
+
+    return scenario
+
+
+# Model a scenario (see model_scenario) or restore its results from the checkpoints of an interrupted run, and return the scenario and whether it was restored
+
+def model_task(import_file, shape, scale, engine, steps_per_year, max_age, previous=None, arrays_path=None, checkpoints=None, scenario_id=None, imported=None):
+
+    if scenario_id is not None:
+        print(f'\n>  Start modeling of scenario {scenario_id}...')
+
+    scenario = checkpoints.get('scenario') if checkpoints is not None else None
+
+    if scenario is not None:
+        print('\n>  Modeling results restored from checkpoints.')
+
+        return scenario, True
+
+    scenario = model_scenario(import_file, shape, scale, engine, steps_per_year, max_age, previous, arrays_path, imported)
+
+    if checkpoints is not None:
+        checkpoints.put('scenario', scenario)
+
+    return scenario, False
+
+
+# Import and model a single scenario from an input file, optionally including the sensitivity analysis, and return all scenario data and results as a dictionary (see model_scenario). With checkpoints (see checkpoint.py), the results of the stages and of each SA run are saved as soon as they are calculated, and the completed ones are loaded instead of calculated again when an interrupted run is resumed.
+
+def run_scenario(import_file, shape=shape, scale=scale, perform_sa=perform_sa, sensitivity=sensitivity, engine=engine, steps_per_year=steps_per_year, max_age=max_age, previous=None, sa_workers=sa_workers, arrays_path=None, checkpoints=None):
+
+    scenario, restored = model_task(import_file, shape, scale, engine, steps_per_year, max_age, previous, arrays_path, checkpoints)
+
+    progress.done('model', 'restored from checkpoints' if restored else scenario['scenario_name'], skipped=restored)
+
+
 
     ###
     ###  SENSITIVITY ANALYSIS
@@ -203,183 +410,531 @@ for s in range(n_scenarios):
 
     if perform_sa:
 
+        from analyzer import run_sa
+
+        s = scenario
+
         print('\n>  Performing sensitivity analysis...')
 
-        sa_data_plus, sa_data_minus, sa_titles, sa_tmp_plus, sa_tmp_minus, sa_tmp_elements = run_sa(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations_origin, loss, dismantling, recycling, production, tmp, set_years, set_vehicles, shape, scale, sensitivity)
+        with stage('run_sa'):
+            sa_data_plus, sa_data_minus, sa_titles, sa_tmp_plus, sa_tmp_minus, sa_tmp_elements = run_sa(s['start_year'], s['end_year'], s['n_years'], s['n_vehicles'], s['vehicles_data'], s['cagr'], s['n_init_years'], s['registrations_origin'], s['loss'], s['dismantling'], s['recycling'], s['production'], s['tmp'], s['set_years'], s['set_vehicles'], shape, scale, sensitivity, engine, sa_workers, arrays_path, checkpoints)
 
-        sa_results.append([sa_data_plus, sa_data_minus, sa_titles, sa_tmp_plus, sa_tmp_minus, sa_tmp_elements])
+        scenario['sa_result'] = [sa_data_plus, sa_data_minus, sa_titles, sa_tmp_plus, sa_tmp_minus, sa_tmp_elements]
 
         print('   sensitivity analysis done.')
 
+    return scenario
 
 
-    ###
-    ###  EXPORT RESULTS
-    ###
 
-    print('\n>  Export results...')
+###
+###  EXPORT RESULTS
+###
+
+# Export the results of a single scenario (tmp files, plots, Excel results and sensitivity analysis results) to export_path, and return the plot data for the scenario-comparison plots. report(label) is called after the Excel results of each SA run are written (see progress.py).
+
+def export_scenario(scenario, export_path, scenario_id, n_scenarios, plotter_start_year=plotter_start_year, plotter_end_year=plotter_end_year, target_year=target_year, sensitivity=sensitivity, report=None):
 
+    import pandas as pd
+    from plotter import plot_data
+    from plotter_sa import plot_sa_data
+    from writer import export_data
+    from writer_sa import export_sa_data
 
-    # (a) EXPORT SINGLE-SCENARIO RESULTS
+    s = scenario
+    sa_result = s['sa_result']
+    perform_sa = sa_result is not None
 
     if n_scenarios == 1:
+        prefix = ''
+    else:
+        prefix = f'{scenario_id}_'
 
-        scenario_id = 1
+    os.makedirs(export_path, exist_ok=True)
 
+    # Create SA results folder:
 
-        # CREATE RESULTS FOLDER AND TMP-FILES
+    if perform_sa:
+        _path = export_path + 'sensitivity_analysis'
+        os.makedirs(_path, exist_ok=True)
+        export_sa_path = _path + '/'
 
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        export_path_ = 'results/' + timestamp
-        os.makedirs(export_path_, exist_ok=True)
+    print('   results folder created.')
 
-        export_path = export_path_ + '/'
+    # Save tmp files:
 
-        # Copy input file:
+    with stage('export_tmp', file=f'{prefix}tmp.xlsx'):
+        with pd.ExcelWriter(f'{export_path}{prefix}tmp.xlsx', engine='openpyxl') as writer:
+            for sheet_name, df in s['tmp'].items():
+                df.to_excel(writer, sheet_name=str(sheet_name))
 
-        dst = export_path + files[s]
-        shutil.copy(import_file, dst)
+    print('   tmp files saved.')
 
-        # Create SA results folder:
 
-        if perform_sa:
-            _path = export_path + 'sensitivity_analysis'
-            os.makedirs(_path, exist_ok=True)
-            export_sa_path = _path + '/'
+    # PLOT RESULTS
 
-        print('   results folder created.')
+    with stage('plot_data'):
+        plot = plot_data(export_path, scenario_id, s['scenario_name'], n_scenarios, s['set_years'], s['set_vehicles'], s['vehicles_names'], s['registrations'], s['cagr'], s['fleet'], s['closedloop'], target_year)
 
-        # Save tmp files:
+    print('   plots created.')
 
-        with pd.ExcelWriter(f'{export_path}tmp.xlsx', engine='openpyxl') as writer:
-            for sheet_name, df in tmp.items():
-                df.to_excel(writer, sheet_name=str(sheet_name))
 
-        print('   tmp files saved.')
+    # PLOT SENSITIVITY ANALYSIS RESULTS
 
+    sa_plot = None
 
-        # PLOT RESULTS
+    if perform_sa:
 
-        plot_data(export_path, scenario_id, scenario_name, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, cagr, fleet, closedloop, target_year)
+        with stage('plot_sa_data'):
+            sa_plot, tmp_tornado_1, tmp_tornado_2, results_range = plot_sa_data(export_sa_path, scenario_id, s['scenario_name'], n_scenarios, s['start_year'], s['end_year'], s['set_years'], plotter_start_year, plotter_end_year, s['set_vehicles'], s['vehicles_names'], s['registrations'], s['cagr'], s['fleet'], s['closedloop'], target_year, sa_result, sensitivity)
 
-        print('   plots created.')
+        print('   sensitivity analysis plots created.')
 
 
-        # PLOT SENSITIVITY ANALYSIS RESULTS
+    # EXPORT RESULTS
 
-        if perform_sa:
+    with stage('export_data', file=f'{prefix}results.xlsx'):
+        export_data(export_path, scenario_id, n_scenarios, s['set_years'], s['set_vehicles'], s['vehicles_names'], s['registrations'], s['fleet'], s['eol'], s['closedloop'])
 
-            sa_plot, tmp_tornado_1, tmp_tornado_2, results_range = plot_sa_data(export_sa_path, scenario_id, scenario_name, n_scenarios, start_year, end_year, set_years, plotter_start_year, plotter_end_year, set_vehicles, vehicles_names, registrations, cagr, fleet, closedloop, target_year, sa_results[s-1], sensitivity)
+    print('   results exported.')
 
-            print('   sensitivity analysis plots created.')
+    if s.get('fleet_steps') is not None:
+        with stage('export_steps', file=f'{prefix}results_steps.xlsx'):
+            with pd.ExcelWriter(f'{export_path}{prefix}results_steps.xlsx', engine='openpyxl') as writer:
+                s['fleet_steps'].to_excel(writer, sheet_name='fleet')
+                s['eol_steps'].to_excel(writer, sheet_name='eol')
 
+        print('   sub-annual results exported.')
 
-        # EXPORT RESULTS
 
-        export_data(export_path, scenario_id, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, fleet, eol, closedloop)
+    # EXPORT SENSITIVITY ANALYSIS RESULTS
 
-        print('   results exported.')
+    if perform_sa:
 
-    else:
+        # Create tmp folder and define export paths:
 
-        # (b) EXPORT MULTI-SCENARIO RESULTS
+        _path = export_sa_path + 'tmp'
+        os.makedirs(_path, exist_ok=True)
+        export_sa_tmp_path = _path + '/'
 
-        # CREATE RESULTS FOLDER AND TMP-FILES
+        _export_sa_path = f'{export_sa_path}{prefix}'
+        _export_sa_tmp_path = f'{export_sa_tmp_path}{prefix}'
 
-        if s == 0:
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            export_path_ = 'results/' + timestamp
+        # Export SA data and results:
 
-        export_path_origin = f'{export_path_}/'
-        export_path = f'{export_path_}/scenario_{scenario_id}/'
-        os.makedirs(export_path, exist_ok=True)
+        with stage('export_sa_data'):
+            export_sa_data(_export_sa_path, _export_sa_tmp_path, 0, [sa_result], tmp_tornado_1, tmp_tornado_2, results_range, s['start_year'], s['end_year'], s['set_years'], target_year, plotter_end_year, report)
 
-        # Copy input file:
+        print('   sensitivity analysis data and results exported.')
 
-        dst = export_path + files[s]
-        shutil.copy(import_file, dst)
+    return plot, sa_plot
 
-        # Create SA results folder:
 
-        if perform_sa:
-            _path = export_path + 'sensitivity_analysis'
-            os.makedirs(_path, exist_ok=True)
-            export_sa_path = _path + '/'
+# Plot the scenario-comparison results of a multi-scenario run
 
-        print('   results folder created.')
+def export_comparison(export_path, n_scenarios, plots, sa_plots, plotter_start_year=plotter_start_year, plotter_end_year=plotter_end_year):
 
-        # Save tmp files:
+    from plotter_multi import plot_multi_data
+    from plotter_sa_multi import plot_sa_multi_data
 
-        with pd.ExcelWriter(f'{export_path}{scenario_id}_tmp.xlsx', engine='openpyxl') as writer:
-            for sheet_name, df in tmp.items():
-                df.to_excel(writer, sheet_name=str(sheet_name))
+    with stage('plot_multi_data'):
+        plot_multi_data(export_path, n_scenarios, plots, plotter_start_year, plotter_end_year)
 
-        print('   tmp files saved.')
+    if all(sa_plot is not None for sa_plot in sa_plots):
+        with stage('plot_sa_multi_data'):
+            plot_sa_multi_data(export_path, n_scenarios, sa_plots, plotter_start_year, plotter_end_year)
 
+    print('   plot for scenario comparison created.')
 
-        # PLOT SINGLE RESULTS
 
-        plot = plot_data(export_path, scenario_id, scenario_name, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, cagr, fleet, closedloop, target_year)
 
-        plots.append(plot)
+# Re-export the results of a scenario folder of a previous run from its cached state without recomputing the scenario
 
-        print('   plots created.')
+def export_results(scenario_path, export_path=None):
 
+    scenario_path = os.path.join(scenario_path, '')
 
-        # PLOT SENSITIVITY ANALYSIS RESULTS
+    manifests = [file for file in os.listdir(scenario_path) if file.endswith('cache.json')]
 
-        if perform_sa:
+    if not manifests:
+        raise FileNotFoundError(f"(!) No cached scenario state was found in '{scenario_path}'.")
 
-            sa_plot, tmp_tornado_1, tmp_tornado_2, results_range = plot_sa_data(export_sa_path, scenario_id, scenario_name, n_scenarios, start_year, end_year, set_years, plotter_start_year, plotter_end_year, set_vehicles, vehicles_names, registrations, cagr, fleet, closedloop, target_year, sa_results[s], sensitivity)
+    cache_prefix = manifests[0][:-len('cache.json')]
 
-            sa_plots.append(sa_plot)
+    with open(scenario_path + manifests[0]) as f:
+        settings = json.load(f)['settings']
 
-            print('   sensitivity analysis plot created.')
+    state = load_cache(scenario_path, cache_prefix)
 
+    if 'scenario' not in state:
+        raise ValueError(f"(!) The cached state in '{scenario_path}' does not contain the scenario results. Please rerun the scenario.")
 
-        # EXPORT RESULTS
+    if export_path is None:
+        export_path = scenario_path
 
-        export_data(export_path, scenario_id, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, fleet, eol, closedloop)
+    export_path = os.path.join(export_path, '')
 
-        print('   results exported.')
+    print(f"\n>  Export results of '{scenario_path}' to '{export_path}'...")
 
+    plot, sa_plot = export_scenario(state['scenario'], export_path, state['scenario_id'], state['n_scenarios'], settings['plotter_start_year'], settings['plotter_end_year'], settings['target_year'], settings['sensitivity'])
 
-        # PLOT SCENARIO-COMPARISON RESULTS
+    return plot, sa_plot
 
-        if s + 1 == n_scenarios:
-            plot_multi_data(export_path_origin, n_scenarios, plots, plotter_start_year, plotter_end_year)
 
-            if perform_sa:
-                plot_sa_multi_data(export_path_origin, n_scenarios, sa_plots, plotter_start_year, plotter_end_year)
 
-        print('   plot for scenario comparison created.')
+###
+###  TASKS OF A RUN
+###
 
+# A run is executed as a graph of tasks per scenario (see run and scheduler.py). Tasks of different scenarios are independent; the SA runs of a scenario are split into n_chunks tasks (every n_chunks-th run):
+#
+#   model_<id>  ->  sa_plan_<id>  ->  sa_<id>_<k>  ->  sa_collect_<id>  ->  export_<id>  ->  comparison
+#
+# The SA tasks only receive the inputs of the scenario, not its results (SA_INPUTS).
 
-    # (c) EXPORT SENSITIVITY ANALYSIS RESULTS
+SA_INPUTS = ['start_year', 'end_year', 'n_years', 'n_vehicles', 'vehicles_data', 'cagr', 'n_init_years', 'registrations_origin', 'loss', 'dismantling', 'recycling', 'production', 'set_years', 'set_vehicles']
 
-    if perform_sa:
 
-        # Create tmp folder and define export paths:
+def sa_plan_task(model, sensitivity):
 
-        _path = export_sa_path + 'tmp'
-        os.makedirs(_path, exist_ok=True)
-        export_sa_tmp_path = _path + '/'
+    from analyzer import plan_sa
+
+    s = model[0]
+
+    print('\n>  Performing sensitivity analysis...')
+
+    runs, sa_titles = plan_sa(s['start_year'], s['end_year'], s['n_vehicles'], s['vehicles_data'], s['cagr'], s['loss'], s['dismantling'], s['recycling'], s['production'], sensitivity)
+
+    return {'runs': runs, 'titles': sa_titles, 'inputs': {k: s[k] for k in SA_INPUTS}}
+
+
+# Calculate every n_chunks-th SA run from run k on. Returns the results and, if the task could not report its progress itself (on a worker process), the number of calculated and restored runs ({False: calculated, True: restored}).
+
+def sa_task(plan, k, n_chunks, scenario_id, shape, scale, engine, sa_workers, arrays_path, checkpoints):
+
+    from analyzer import calc_sa
+
+    runs = plan['runs'][k::n_chunks]
+    i = plan['inputs']
+
+    arrays_file = None
+
+    if arrays_path is not None:
+        arrays_file = f'{arrays_path}sa_fleet_detail.npy' if n_chunks == 1 else f'{arrays_path}sa_fleet_detail_{k}.npy'
+
+    counts = {False: 0, True: 0}
+
+    def report(label, n, skipped):
+        counts[skipped] += n
+        progress.done('sa_run', label, n, skipped, scenario_id)
+
+    with stage('run_sa', scenario=scenario_id, chunk=k):
+        results = calc_sa(runs, i['start_year'], i['end_year'], i['n_years'], i['n_vehicles'], i['vehicles_data'], i['cagr'], i['n_init_years'], i['registrations_origin'], i['loss'], i['dismantling'], i['recycling'], i['production'], i['set_years'], i['set_vehicles'], shape, scale, engine, sa_workers, arrays_file, checkpoints, report)
+
+    return results, None if progress.is_enabled() else counts
+
+
+def sa_collect_task(plan, chunks):
+
+    from analyzer import collect_sa
+
+    results = [None] * len(plan['runs'])
+
+    for k, (chunk_results, counts) in enumerate(chunks):
+        results[k::len(chunks)] = chunk_results
+
+    sa_result = list(collect_sa(plan['runs'], results, plan['titles']))
+
+    print('   sensitivity analysis done.')
+
+    return sa_result
+
+
+def export_task(model, sa_result, import_file, export_path, file_name, scenario_id, n_scenarios, plotter_start_year, plotter_end_year, target_year, sensitivity, cache_prefix, scenario_fp, settings, checkpoints):
+
+    scenario = model[0]
+    scenario['sa_result'] = sa_result
+
+    print('\n>  Export results...' if n_scenarios == 1 else f'\n>  Export results of scenario {scenario_id}...')
+
+    os.makedirs(export_path, exist_ok=True)
+
+    # Copy input file:
+
+    shutil.copy(import_file, export_path + file_name)
+
+    with stage('export_scenario', scenario=scenario_id):
+        plot, sa_plot = export_scenario(scenario, export_path, scenario_id, n_scenarios, plotter_start_year, plotter_end_year, target_year, sensitivity, lambda label: progress.done('sa_export', label, scenario=scenario_id))
+
+    # Save cache for incremental runs and for 'capsim export':
+
+    save_cache(export_path, cache_prefix, scenario_fp, settings, {
+        'scenario_id': scenario_id,
+        'n_scenarios': n_scenarios,
+        'scenario': scenario,
+        'plot': plot,
+        'sa_plot': sa_plot})
+
+    if checkpoints is not None:
+        checkpoints.clear()
+
+    return plot, sa_plot
+
+
+def comparison_task(export_path_origin, n_scenarios, exports, plotter_start_year, plotter_end_year):
+
+    export_comparison(export_path_origin, n_scenarios, [plot for plot, sa_plot in exports], [sa_plot for plot, sa_plot in exports], plotter_start_year, plotter_end_year)
+
+
+# Estimated memory (MB) of the tasks: cohort arrays (fleet_detail) of the runs they hold, twice for the SA runs being calculated
+
+def cohort_memory(n_vehicles, n_years, n_runs=1):
+
+    return n_runs * n_vehicles * n_years ** 2 * 5 * 8 / 1e6
+
+
+def sa_task_memory(plan, k, n_chunks, *args):
+
+    return 2 * cohort_memory(plan['inputs']['n_vehicles'], plan['inputs']['n_years'], len(plan['runs'][k::n_chunks]))
+
+
+def export_task_memory(model, sa_result, *args):
+
+    return cohort_memory(model[0]['n_vehicles'], model[0]['n_years'], 1 + (len(sa_result[3]) + len(sa_result[4]) if sa_result is not None else 0))
+
+
+
+###
+###  RUN
+###
+
+# Run all scenarios found in data_path and export the results to a new timestamped folder in results_path
+
+def run(data_path='data/', results_path='results/', shape=shape, scale=scale, plotter_start_year=plotter_start_year, plotter_end_year=plotter_end_year, target_year=target_year, perform_sa=perform_sa, sensitivity=sensitivity, incremental=incremental, files=None, profile=profile, engine=engine, steps_per_year=steps_per_year, max_age=max_age, diffing=diffing, sa_workers=sa_workers, memmap=memmap, resume=resume, workers=workers, max_memory=max_memory):
+
+    if memmap and engine != 'batch':
+        raise ValueError("(!) Memory-mapped cohort arrays (memmap) require the 'batch' engine.")
+
+    if profile:
+        profiler.reset()
+        profiler.enable()
+
+    print('\n##### CAPsim - Circular Automotive Plastics simulation model #####')
+    print('Copyright 2025 Dominik Reichert')
+
+    print('\n>  Looking for input files...')
+
+    if files is None:
+        files = find_input_files(data_path)
+
+    n_scenarios = len(files)
+
+    print(f'   number of input files (scenarios) found: {n_scenarios}')
+
+    # Invalid input files abort the run before any scenario is modeled:
+
+    with stage('check_input_files'):
+        imported = check_input_files(data_path, files)
+
+    print('   input files validated.')
+
+    from analyzer import count_sa
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    export_path_origin = os.path.join(results_path, timestamp, '')
+
+    # Resume an interrupted run in its results folder:
+
+    if resume:
+        resume_path = find_last_run(results_path) if resume is True else os.path.join(resume, '')
+
+        if resume_path is None or not os.path.isdir(resume_path):
+            print(f'   no run to resume found in {results_path if resume is True else resume}, starting a new run')
+            resume = False
 
-        if n_scenarios == 1:
-            _export_sa_path = f'{export_sa_path}'
-            _export_sa_tmp_path = f'{export_sa_tmp_path}'
         else:
-            _export_sa_path = f'{export_sa_path}{scenario_id}_'
-            _export_sa_tmp_path = f'{export_sa_tmp_path}{scenario_id}_'
+            export_path_origin = resume_path
+            timestamp = os.path.basename(os.path.normpath(resume_path))
 
-        # Export SA data and results:
+            print(f'   resuming the run in {export_path_origin}')
 
-        export_sa_data(_export_sa_path, _export_sa_tmp_path, s, sa_results, tmp_tornado_1, tmp_tornado_2, results_range, start_year, end_year, set_years, target_year, plotter_end_year)
+    # Progress and ETA of the tasks of all scenarios (events in progress.jsonl, see progress.py):
 
-        print('   sensitivity analysis data and results exported.')
+    progress.enable(n_scenarios, os.path.join(export_path_origin, 'progress.jsonl'))
+
+    settings = {
+        'shape': shape,
+        'scale': scale,
+        'plotter_start_year': plotter_start_year,
+        'plotter_end_year': plotter_end_year,
+        'target_year': target_year,
+        'perform_sa': perform_sa,
+        'sensitivity': sensitivity,
+        'engine': engine,
+        'steps_per_year': steps_per_year,
+        'max_age': max_age}
+
+
+    # The run is executed as a graph of tasks (see TASKS OF A RUN and scheduler.py); unchanged scenarios are reused directly:
+
+    graph = Scheduler(workers, max_memory)
+    tasks = {}
+    exports = []
+
+    n_chunks = workers if workers > 1 else 1
+
+    for s in range(n_scenarios):
+
+        if n_scenarios > 1:
+            scenario_id = re.search(r'data_(\d+)\.[a-z.]+$', files[s].lower()).group(1)
+            scenario_dir = f'scenario_{scenario_id}'
+            cache_prefix = f'{scenario_id}_'
+
+            print(f'\n>  Preparing scenario {scenario_id}...')
+
+        else:
+            scenario_id = 1
+            scenario_dir = ''
+            cache_prefix = ''
+
+            print('\n>  Preparing scenario...')
+
+        import_file = os.path.join(data_path, files[s])
+        export_path = os.path.join(export_path_origin, scenario_dir, '')
+
+
+        ### REUSE RESULTS OF UNCHANGED SCENARIOS
+
+        scenario_fp = fingerprint(import_file, settings)
+
+        cached_path = None
+
+        if resume and match_cache(export_path, cache_prefix, scenario_fp):
+            cached_path = export_path
+
+        elif incremental:
+            cached_path = find_cache(results_path, scenario_dir, cache_prefix, scenario_fp, exclude=timestamp)
+
+        if cached_path is not None:
+            print(f'   input file and settings unchanged, reusing results from {cached_path}')
+
+            progress.begin_scenario(scenario_id, reused=True, model=1, sa_run=0, export=1, sa_export=0)
+
+            with stage('reuse_scenario', scenario=scenario_id):
+                if cached_path != export_path:
+                    link_results(cached_path, export_path)
+
+                state = load_cache(export_path, cache_prefix)
+
+            exports.append((state['plot'], state['sa_plot']))
+
+            progress.done('model', 'reused', skipped=True)
+            progress.done('export', 'reused', skipped=True)
+
+            print(f'\n>  Scenario {scenario_id} completed.{progress.status()}')
+
+            continue
+
+
+        ### SCENARIO DIFFING
+
+        # Results of a previous run of the scenario with the same Weibull parameters and an engine with identical results (diffing would read the cohort arrays of the previous run into memory, so not with memmap):
+
+        previous = None
+
+        if incremental and diffing and engine != 'continuous' and not memmap:
+            previous_path = find_previous(results_path, scenario_dir, cache_prefix, {'shape': [shape], 'scale': [scale], 'engine': ['reference', 'kernel', 'batch']}, exclude=timestamp)
+
+            if previous_path is not None:
+                print(f'   input file or settings changed, comparing with the results in {previous_path}')
+
+                previous = load_cache(previous_path, cache_prefix).get('scenario')
+
+
+        ### TASKS
+
+        n_sa = count_sa(imported[files[s]][1][4], imported[files[s]][1][6]) if perform_sa else 0
+
+        progress.begin_scenario(scenario_id, model=1, sa_run=n_sa, export=1, sa_export=n_sa)
+
+        # Checkpoints of the scenario (loaded when resuming an interrupted run with unchanged input file and settings):
+
+        checkpoints = Checkpoints(export_path, scenario_fp, resume)
+
+        arrays_path = os.path.join(export_path, 'arrays', '') if memmap else None
+
+        model = graph.add(f'model_{scenario_id}', model_task, import_file, shape, scale, engine, steps_per_year, max_age, previous, arrays_path, checkpoints, scenario_id if n_scenarios > 1 else None, imported.pop(files[s]))
+        tasks[model.name] = ('model', scenario_id)
+
+        sa_result = None
+
+        if perform_sa:
+            plan = graph.add(f'sa_plan_{scenario_id}', sa_plan_task, model, sensitivity, local=True)
+            tasks[plan.name] = ('sa_plan', scenario_id)
+
+            chunks = []
+
+            for k in range(n_chunks):
+                chunk = graph.add(f'sa_{scenario_id}_{k}', sa_task, plan, k, n_chunks, scenario_id, shape, scale, engine, sa_workers if n_chunks == 1 else 1, arrays_path, checkpoints, memory=sa_task_memory)
+                tasks[chunk.name] = ('sa', scenario_id)
+                chunks.append(chunk)
+
+            sa_result = graph.add(f'sa_collect_{scenario_id}', sa_collect_task, plan, chunks, local=True)
+            tasks[sa_result.name] = ('sa_collect', scenario_id)
+
+        export = graph.add(f'export_{scenario_id}', export_task, model, sa_result, import_file, export_path, files[s], scenario_id, n_scenarios, plotter_start_year, plotter_end_year, target_year, sensitivity, cache_prefix, scenario_fp, settings, checkpoints, memory=export_task_memory)
+        tasks[export.name] = ('export', scenario_id)
+
+        exports.append(export)
+
+
+    # PLOT SCENARIO-COMPARISON RESULTS
+
+    if n_scenarios > 1:
+        graph.add('comparison', comparison_task, export_path_origin, n_scenarios, exports, plotter_start_year, plotter_end_year)
+        tasks['comparison'] = ('comparison', None)
+
+
+    # Progress of the tasks (tasks on worker processes cannot report their progress themselves):
+
+    def on_done(name, value):
+
+        kind, scenario_id = tasks[name]
+
+        if kind == 'model':
+            scenario, restored = value
+            progress.done('model', 'restored from checkpoints' if restored else scenario['scenario_name'], skipped=restored, scenario=scenario_id)
+
+        elif kind == 'sa_plan':
+            progress.plan('sa_run', len(value['runs']), scenario=scenario_id)
+
+        elif kind == 'sa' and value[1] is not None:
+            progress.done('sa_run', name, value[1][False], scenario=scenario_id)
+            progress.done('sa_run', 'restored from checkpoints', value[1][True], skipped=True, scenario=scenario_id)
+
+        elif kind == 'export':
+            progress.finish('sa_export', f'scenario {scenario_id}', scenario=scenario_id)
+            progress.done('export', f'scenario {scenario_id}', scenario=scenario_id)
+
+            print(f'\n>  Scenario {scenario_id} completed.{progress.status()}')
+
+    graph.on_done = on_done
+
+    graph.run()
+
+    graph.write_report(export_path_origin)
+
+    progress.disable()
+
+    if profile:
+        profiler.write_report(export_path_origin)
+        profiler.disable()
+
+    print('\n>  End')
 
+    return export_path_origin
 
-    print(f'\n>  Scenario {scenario_id} completed.')
 
 
-print('\n>  End')
\ No newline at end of file
+if __name__ == '__main__':
+    run()
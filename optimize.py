@@ -0,0 +1,390 @@
+####
+#
+# CAPsim
+# Optimization of Recycling Measures
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Allocates a limited effort to measures (levers) on dismantling masses, recycling efficiencies, production efficiencies and maximum recycled contents so that the total closed-loop rate in a target year is maximized.
+#
+# The vehicle fleet and the end-of-life stages do not depend on these inputs, and the recycling and closed-loop stages of a year only use the inputs of the same year. With the recycling inputs in_p[id] and the ELVs entering recycling elvs[id] of the target year taken from the baseline, the total closed-loop rate is
+#
+#   supply_p = sum_id (in_p[id] - elvs[id] * dismantling_p[id]) * recycling_p / 100
+#   total    = sum_p min(supply_p * production_p / 100, demand_p * max_p / 100) / demand_plastic * 100
+#
+# which is evaluated in microseconds per candidate. If at most one of dismantling, recycling efficiency and production efficiency is a lever per polymer, the rate is linear below the caps and the problem is solved exactly as a linear program (scipy.optimize.linprog); otherwise with SLSQP from several starting points. The solution is verified with the full model (service.Session).
+#
+# Levers are defined like the overrides of service.py, with bounds and a cost per unit of change:
+#
+#   [{"input": "recycling", "column": "pp_efficiency", "bounds": [20, 80], "cost": 1.0},
+#    {"input": "dismantling", "column": "pp_mass", "vehicles": ["BEV"], "bounds": [0, 20], "cost": 0.5},
+#    {"input": "production", "column": "max_pp", "bounds": [0, 50], "cost": 0.2}]
+#
+# The effort is sum(cost * |value - baseline value|) and is limited by the budget.
+
+
+
+import time
+
+import numpy as np
+from scipy.optimize import linprog, minimize
+
+from calculator import polymers_of, polymer_columns
+
+
+
+# Inputs with levers:
+
+LEVER_INPUTS = ['dismantling', 'recycling', 'production']
+
+
+
+###
+###  (1) PROBLEM
+###
+
+# Baseline quantities of the target year and the levers
+
+def build_problem(session, scenario, levers, year):
+
+    s = session.get(scenario)
+
+    if year not in s['set_years']:
+        raise ValueError(f'(!) The target year {year} is not within the time span of scenario {scenario}.')
+
+    vehicles = list(s['set_vehicles'])
+    names = {str(name): i for i, name in s['vehicles_names']['name'].items()}
+
+    eol = s['eol'].xs(year, level='year').reindex(vehicles)
+    closedloop = s['closedloop'].loc[year]
+
+    polymers = polymers_of(s['vehicles_data'])
+    columns = polymer_columns(polymers)
+    n_polymers = len(polymers)
+
+    problem = {
+        'year': year,
+        'vehicles': vehicles,
+        'polymers': polymers,
+        'inputs': eol[columns['eol'][:n_polymers]].to_numpy(dtype=float),  # [id, polymer]
+        'elvs': eol['input_elvs'].to_numpy(dtype=float),  # [id]
+        'dismantling': s['dismantling'].xs(year, level='year').reindex(vehicles)[columns['dismantling']].to_numpy(dtype=float),  # [id, polymer]
+        'recycling': s['recycling'].loc[year, columns['recycling']].to_numpy(dtype=float),
+        'production': s['production'].loc[year, columns['production'][:n_polymers]].to_numpy(dtype=float),
+        'max': s['production'].loc[year, columns['production'][n_polymers:]].to_numpy(dtype=float),
+        'demand': closedloop[columns['closedloop'][:n_polymers]].to_numpy(dtype=float),
+        'demand_plastic': float(closedloop['demand_plastic']),
+        'levers': []}
+
+    for lever in levers:
+        if not isinstance(lever, dict):
+            raise ValueError(f'(!) A lever must be an object with input, column, bounds and cost, not {lever!r}.')
+
+        if lever.get('input') not in LEVER_INPUTS or lever.get('column') not in columns[lever['input']]:
+            raise ValueError(f"(!) Unknown lever {lever.get('input')}.{lever.get('column')}. Levers can change the columns {({k: columns[k] for k in LEVER_INPUTS})}.")
+
+        try:
+            bounds = [float(b) for b in lever.get('bounds', [])]
+            cost = float(lever.get('cost', 1.0))
+
+        except (TypeError, ValueError):
+            raise ValueError(f"(!) Lever {lever['input']}.{lever['column']} needs numeric bounds [lower, upper] and a numeric cost.")
+
+        if len(bounds) != 2 or bounds[0] > bounds[1]:
+            raise ValueError(f"(!) Lever {lever['input']}.{lever['column']} needs bounds [lower, upper].")
+
+        if lever.get('vehicles') is not None and lever['input'] != 'dismantling':
+            raise ValueError(f"(!) Lever {lever['input']}.{lever['column']} is not defined per vehicle model. Only dismantling levers can have vehicles.")
+
+        if lever.get('vehicles') is not None and not isinstance(lever['vehicles'], list):
+            raise ValueError(f"(!) The vehicles of lever {lever['input']}.{lever['column']} must be a list of ids or names.")
+
+        column = lever['column']
+        p = columns[lever['input']].index(column) % n_polymers
+        is_max = lever['input'] == 'production' and columns['production'].index(column) >= n_polymers
+
+        rows = None
+
+        if lever['input'] == 'dismantling':
+            rows = np.ones(len(vehicles), dtype=bool)
+
+            if lever.get('vehicles') is not None:
+                ids = [names.get(str(v), v) for v in lever['vehicles']]
+
+                for i in ids:
+                    if i not in vehicles:
+                        raise ValueError(f"(!) Unknown vehicle model '{i}'. Please use one of the ids {vehicles} or names {list(names)}.")
+
+                rows = np.isin(vehicles, ids)
+
+            baseline = float(problem['dismantling'][rows, p].mean())
+
+        elif lever['input'] == 'recycling':
+            baseline = float(problem['recycling'][p])
+
+        elif is_max:
+            baseline = float(problem['max'][p])
+
+        else:
+            baseline = float(problem['production'][p])
+
+        problem['levers'].append({
+            'name': f"{lever['input']}.{column}" + (f" ({', '.join(str(v) for v in lever['vehicles'])})" if lever.get('vehicles') else ''),
+            'lever': lever,
+            'kind': 'max' if is_max else lever['input'],
+            'polymer': p,
+            'rows': rows,
+            'baseline': baseline,
+            'bounds': (bounds[0], bounds[1]),
+            'cost': cost})
+
+    return problem
+
+
+# Recycling supply times production efficiency (supply_p * production_p / 100) and caps (demand_p * max_p / 100) per polymer in the target year for the lever values x
+
+def terms(problem, x):
+
+    dismantling = problem['dismantling'].copy()
+    recycling = problem['recycling'].copy()
+    production = problem['production'].copy()
+    max_input = problem['max'].copy()
+
+    for lever, value in zip(problem['levers'], x):
+        p = lever['polymer']
+
+        if lever['kind'] == 'dismantling':
+            dismantling[lever['rows'], p] = value
+        elif lever['kind'] == 'recycling':
+            recycling[p] = value
+        elif lever['kind'] == 'max':
+            max_input[p] = value
+        else:
+            production[p] = value
+
+    supply = ((problem['inputs'] - problem['elvs'][:, None] * dismantling) * recycling / 100).sum(axis=0)
+
+    return supply * production / 100, problem['demand'] * max_input / 100
+
+
+# Total closed-loop rate in the target year for the lever values x
+
+def evaluate(problem, x):
+
+    supply, limit = terms(problem, x)
+
+    return float(np.minimum(supply, limit).sum() / problem['demand_plastic'] * 100)
+
+
+# The rate is linear below the caps if each polymer has at most one lever on dismantling, recycling or production efficiency
+
+def is_linear(problem):
+
+    for p in range(len(problem['polymers'])):
+        kinds = {lever['kind'] for lever in problem['levers'] if lever['polymer'] == p and lever['kind'] != 'max'}
+
+        if len(kinds) > 1:
+            return False
+
+    return True
+
+
+
+###
+###  (2) SOLVERS
+###
+
+# Variables z = [up, down] with x = baseline + up - down; effort = cost * (up + down). Among equal rates, the solution with the least effort is preferred (TIE per unit of effort).
+
+TIE = 1e-6
+
+def split_bounds(problem):
+
+    x0 = np.array([lever['baseline'] for lever in problem['levers']])
+    lower = np.array([lever['bounds'][0] for lever in problem['levers']])
+    upper = np.array([lever['bounds'][1] for lever in problem['levers']])
+
+    return x0, lower, upper, [(0, max(0.0, u - b)) for b, u in zip(x0, upper)] + [(0, max(0.0, b - l)) for b, l in zip(x0, lower)]
+
+
+def solve_linear(problem, budget):
+
+    n = len(problem['levers'])
+    n_polymers = len(problem['polymers'])
+
+    x0, lower, upper, bounds = split_bounds(problem)
+    cost = np.array([lever['cost'] for lever in problem['levers']])
+
+    # Supply and caps per polymer are affine in x: value_p(x) = value_p(x0) + gradient_p . (x - x0)
+
+    supply0, limit0 = terms(problem, x0)
+    supply_gradient = np.zeros((n_polymers, n))
+    limit_gradient = np.zeros((n_polymers, n))
+
+    for k in range(n):
+        step = np.zeros(n)
+        step[k] = 1.0
+
+        supply1, limit1 = terms(problem, x0 + step)
+        supply_gradient[:, k] = supply1 - supply0
+        limit_gradient[:, k] = limit1 - limit0
+
+    # Variables [up, down, t] with t_p <= supply_p(x) and t_p <= limit_p(x); maximize sum(t)
+
+    c = np.concatenate([TIE * cost, TIE * cost, -np.ones(n_polymers) / problem['demand_plastic'] * 100])
+
+    A = [np.hstack([-supply_gradient, supply_gradient, np.eye(n_polymers)]), np.hstack([-limit_gradient, limit_gradient, np.eye(n_polymers)])]
+    b = [supply0, limit0]
+
+    if budget is not None:
+        A.append(np.concatenate([cost, cost, np.zeros(n_polymers)])[None, :])
+        b.append([budget])
+
+    # lower <= x0 + up - down <= upper
+
+    A.append(np.hstack([np.eye(n), -np.eye(n), np.zeros((n, n_polymers))]))
+    b.append(upper - x0)
+    A.append(np.hstack([-np.eye(n), np.eye(n), np.zeros((n, n_polymers))]))
+    b.append(x0 - lower)
+
+    result = linprog(c, A_ub=np.vstack(A), b_ub=np.concatenate(b), bounds=bounds + [(None, None)] * n_polymers, method='highs')
+
+    if not result.success:
+        raise ValueError(f'(!) The linear program could not be solved: {result.message}')
+
+    return x0 + result.x[:n] - result.x[n:2*n], result.nit
+
+
+def solve_nonlinear(problem, budget, starts=8, seed=0):
+
+    n = len(problem['levers'])
+
+    x0, lower, upper, bounds = split_bounds(problem)
+    cost = np.array([lever['cost'] for lever in problem['levers']])
+
+    constraints = [
+        {'type': 'ineq', 'fun': lambda z: upper - (x0 + z[:n] - z[n:])},
+        {'type': 'ineq', 'fun': lambda z: (x0 + z[:n] - z[n:]) - lower}]
+
+    if budget is not None:
+        constraints.append({'type': 'ineq', 'fun': lambda z: budget - cost @ (z[:n] + z[n:])})
+
+    rng = np.random.default_rng(seed)
+
+    best, best_value, iterations = None, -np.inf, 0
+
+    for k in range(starts):
+        z = np.zeros(2 * n) if k == 0 else np.array([rng.uniform(l, u) for l, u in bounds])
+
+        # Scale random starting points into the budget:
+
+        if budget is not None and cost @ (z[:n] + z[n:]) > budget:
+            z *= budget / (cost @ (z[:n] + z[n:]))
+
+        result = minimize(lambda z: -evaluate(problem, x0 + z[:n] - z[n:]) + TIE * cost @ (z[:n] + z[n:]), z, method='SLSQP', bounds=bounds, constraints=constraints)
+        iterations += result.nit
+
+        feasible = all(np.all(con['fun'](result.x) >= -1e-9) for con in constraints)
+
+        if feasible and -result.fun > best_value:
+            best, best_value = result.x, -result.fun
+
+    if best is None:
+        raise ValueError('(!) No feasible allocation was found. Please check the bounds and the budget.')
+
+    return polish(problem, x0 + best[:n] - best[n:], x0, lower, upper), iterations
+
+
+# Move each lever back towards its baseline value as far as the rate does not decrease, which removes effort on levers without effect (e.g. caps that do not bind)
+
+def polish(problem, x, x0, lower, upper):
+
+    x = x.copy()
+    rate = evaluate(problem, x)
+
+    for k in range(len(x)):
+        back = np.clip(x0[k], lower[k], upper[k]) - x[k]
+        share = 0.0
+        step = 0.5
+
+        # Bisection on the share of the way back:
+
+        for _ in range(50):
+            y = x.copy()
+            y[k] += back * min(1.0, share + 2 * step)
+
+            if evaluate(problem, y) >= rate - 1e-12 * abs(rate):
+                share = min(1.0, share + 2 * step)
+            else:
+                step /= 2
+
+            if share == 1.0:
+                break
+
+        x[k] += back * share
+
+    return x
+
+
+def optimize(session, scenario, levers, year, budget=None, starts=8):
+
+    t = time.perf_counter()
+
+    problem = build_problem(session, scenario, levers, year)
+
+    if not problem['levers']:
+        raise ValueError('(!) No levers defined.')
+
+    linear = is_linear(problem)
+
+    if linear:
+        x, iterations = solve_linear(problem, budget)
+    else:
+        x, iterations = solve_nonlinear(problem, budget, starts)
+
+    x = np.clip(x, [lever['bounds'][0] for lever in problem['levers']], [lever['bounds'][1] for lever in problem['levers']])
+
+    seconds = time.perf_counter() - t
+
+    # Verify with the full model (levers from the target year on):
+
+    overrides = []
+
+    for lever, value in zip(problem['levers'], x):
+        override = {k: lever['lever'][k] for k in ('input', 'column', 'vehicles') if k in lever['lever']}
+        overrides.append(dict(override, value=float(value), start_year=year, end_year=year))
+
+    closedloop, _ = session.whatif(scenario, overrides)
+
+    return {
+        'scenario': scenario,
+        'year': year,
+        'budget': budget,
+        'method': 'linprog' if linear else 'SLSQP',
+        'levers': [{'name': lever['name'], 'baseline': lever['baseline'], 'value': float(value), 'effort': lever['cost'] * abs(float(value) - lever['baseline'])} for lever, value in zip(problem['levers'], x)],
+        'effort': float(sum(lever['cost'] * abs(float(value) - lever['baseline']) for lever, value in zip(problem['levers'], x))),
+        'baseline': float(session.baseline(scenario).loc[year, 'total']),
+        'optimum': evaluate(problem, x),
+        'verified': float(closedloop.loc[year, 'total']),
+        'iterations': int(iterations),
+        'seconds': seconds}
+
+
+def print_result(result):
+
+    print(f"   method:      {result['method']} ({result['iterations']} iterations, {result['seconds']:.2f} s)")
+    print(f"   total:       {result['baseline']:.4f} -> {result['optimum']:.4f} in {result['year']} (full model: {result['verified']:.4f})")
+    print(f"   effort:      {result['effort']:.4g}" + ('' if result['budget'] is None else f" of {result['budget']:.4g}"))
+
+    for lever in result['levers']:
+        print(f"   {lever['name']:<40} {lever['baseline']:10.4g} -> {lever['value']:10.4g}  (effort {lever['effort']:.4g})")
@@ -35,10 +35,29 @@ color = pd.DataFrame({
 })
 
 
+# Colors of the vehicle models: the color scheme above for known names, and evenly spaced colors of a colormap for all other names (tab20 for up to 20 further vehicle models, turbo beyond)
+
+def palette(names):
+
+    new = [name for name in dict.fromkeys(names) if name not in color.columns]
+
+    if len(new) <= 20:
+        generated = {name: plt.get_cmap('tab20')(k)[:3] for k, name in enumerate(new)}
+    else:
+        generated = {name: plt.get_cmap('turbo')(k / (len(new) - 1))[:3] for k, name in enumerate(new)}
+
+    return {name: tuple(color[name]) if name in color.columns else tuple(generated[name]) for name in names}
+
+
 
 def plot_data(export_path, scenario_id, scenario_name, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, cagr, fleet, closedloop, target_year):
 
 
+    vehicle_color = palette([vehicles_names.loc[veh, 'name'] for veh in set_vehicles])
+
+    legend_columns = 1 + (len(set_vehicles) - 1) // 20
+
+
     ### (1) REGISTRATIONS
 
     if n_scenarios == 1:
@@ -55,14 +74,14 @@ def plot_data(export_path, scenario_id, scenario_name, n_scenarios, set_years, s
 
         reg_total = list(map(operator.add, reg_total, reg))
 
-        plt.plot(set_years, reg, color=tuple(color[veh_name]), label=veh_name)
+        plt.plot(set_years, reg, color=vehicle_color[veh_name], label=veh_name)
 
     plt.plot(set_years, reg_total, color=tuple(color['total']), linestyle='--', label='total')
 
     plt.gca().yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{x:,.0f}"))
 
     plt.title(f'Vehicle registrations [M] with CAGR = {cagr:.2f}%')
-    plt.legend()
+    plt.legend(ncol=legend_columns)
 
     plt.savefig(f'{export_path}{name}', bbox_inches='tight')
     plt.clf()
@@ -86,14 +105,14 @@ def plot_data(export_path, scenario_id, scenario_name, n_scenarios, set_years, s
 
         stock_total = list(map(operator.add, stock_total, stock))
 
-        plt.plot(set_years, stock, color=tuple(color[veh_name]), label=veh_name)
+        plt.plot(set_years, stock, color=vehicle_color[veh_name], label=veh_name)
 
     plt.plot(set_years, stock_total, color=tuple(color['total']), linestyle='--', label='total')
 
     plt.gca().yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{x:,.0f}"))
 
     plt.title('Vehicle fleet [M]')
-    plt.legend()
+    plt.legend(ncol=legend_columns)
 
     plt.savefig(f'{export_path}{name}', bbox_inches='tight')
     plt.clf()
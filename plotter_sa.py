@@ -394,7 +394,9 @@ def plot_sa_data(export_path, scenario_id, scenario_name, n_scenarios, start_yea
     labels = sa_results[2]
     n_labels = len(labels)
 
-    for p in ['pp', 'pa', 'pc', 'abs', 'total']:
+    polymers = [column[len('demand_'):] for column in closedloop.columns if column.startswith('demand_') and column != 'demand_plastic']
+
+    for p in polymers + ['total']:
 
         if n_scenarios == 1:
             name = f'sa_tornado_{target_year}_{p}.pdf'
@@ -476,7 +478,7 @@ def plot_sa_data(export_path, scenario_id, scenario_name, n_scenarios, start_yea
     labels = sa_results[2]
     n_labels = len(labels)
 
-    for p in ['pp', 'pa', 'pc', 'abs', 'total']:
+    for p in polymers + ['total']:
 
         if n_scenarios == 1:
             name = f'sa_tornado_{target_year}_{p}.pdf'
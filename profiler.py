@@ -0,0 +1,200 @@
+####
+#
+# CAPsim
+# Instrumentation Module
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Records wall time, CPU time and peak memory per stage of a run:
+#
+#   with stage('calc_fleet', scenario='01'):
+#       fleet_detail, fleet = calc_fleet(...)
+#
+# Stages can be nested. While instrumentation is disabled (default), stage() returns a shared no-op context manager, so the overhead is a single function call per stage.
+
+
+
+import csv
+import json
+import os
+import time
+import tracemalloc
+
+
+
+_enabled = False
+_trace_memory = False
+_records = []
+_stack = []
+
+
+
+###
+###  (1) SWITCHES
+###
+
+def enable(trace_memory=True):
+
+    global _enabled, _trace_memory
+
+    _enabled = True
+    _trace_memory = trace_memory
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+
+    global _enabled, _trace_memory
+
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    _enabled = False
+    _trace_memory = False
+
+
+def is_enabled():
+
+    return _enabled
+
+
+def reset():
+
+    _records.clear()
+    _stack.clear()
+
+
+
+###
+###  (2) STAGES
+###
+
+class _NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self.child_peak = 0
+
+    def __enter__(self):
+
+        if _trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+
+            # Keep the peak reached so far in the parent stage before resetting it for this stage:
+
+            if _stack:
+                _stack[-1].child_peak = max(_stack[-1].child_peak, peak)
+
+            tracemalloc.reset_peak()
+            self.memory_start = current
+
+        self.path = ' > '.join([s.name for s in _stack] + [self.name])
+
+        _stack.append(self)
+
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+
+        _stack.pop()
+
+        record = {
+            'stage': self.name,
+            'path': self.path,
+            'depth': len(_stack),
+            'wall_s': wall,
+            'cpu_s': cpu}
+
+        if _trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+
+            if _stack:
+                _stack[-1].child_peak = max(_stack[-1].child_peak, peak)
+
+            record['memory_start_mb'] = self.memory_start / 1e6
+            record['memory_peak_mb'] = peak / 1e6
+
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+
+        record.update(self.info)
+
+        _records.append(record)
+
+        return False
+
+
+def stage(name, **info):
+
+    if not _enabled:
+        return _NULL_STAGE
+
+    return _Stage(name, info)
+
+
+
+###
+###  (3) RUN REPORT
+###
+
+def records():
+
+    return list(_records)
+
+
+# Write the run report (or other records, e.g. of the tasks of a run, see scheduler.py) as JSON and CSV (run_report.json, run_report.csv) to export_path
+
+def write_report(export_path, file_name='run_report', records=None):
+
+    if records is None:
+        records = _records
+
+    if not records:
+        return
+
+    json_file = os.path.join(export_path, f'{file_name}.json')
+    csv_file = os.path.join(export_path, f'{file_name}.csv')
+
+    with open(json_file, 'w') as f:
+        json.dump({'stages': records}, f, indent=2, default=str)
+
+    columns = list(dict.fromkeys(key for record in records for key in record))
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(records)
+
+    print(f'   {file_name}.json and {file_name}.csv exported.')
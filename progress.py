@@ -0,0 +1,277 @@
+####
+#
+# CAPsim
+# Progress Reporting
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Tracks the tasks of a run and estimates its remaining time. A run consists of the following tasks per scenario:
+#
+#   model       import and stages (1) to (5) (see main.model_scenario)
+#   sa_run      one run of the sensitivity analysis (one parameter and direction, see analyzer.run_sa)
+#   export      plots, Excel results and cache of the scenario
+#   sa_export   Excel results of one run of the sensitivity analysis (see writer_sa.py), which take most of the time of an export with SA
+#
+# main.run imports all input files before any scenario is modeled, so the number of scenarios and the number of SA runs of each scenario are known when a run starts; for scenarios not started yet or with unknown numbers of tasks (None), the mean number of tasks of the started scenarios is assumed. The duration of a task is the wall time since the previous task was completed (with parallel tasks, see scheduler.py, the time between completions), and the remaining time (ETA) is the number of remaining tasks of each kind times the mean duration of that kind. Remaining tasks of a kind without any measured duration yet are not included, and the ETA is shown as a lower bound ('ETA > ...') until they are. Tasks that are restored from checkpoints or reused from a previous run count as completed without a duration.
+#
+# The progress is appended to the terminal output and written as one JSON object per line (events file, 'progress.jsonl' in the results folder of a run):
+#
+#   {"event": "task", "time": ..., "scenario": "01", "kind": "sa_run", "label": "...", "n": 1, "seconds": 2.1, "done": 12, "total": 284, "elapsed_s": 40.2, "throughput_per_s": 0.3, "eta_s": 811.0, "eta_lower_bound": false}
+#
+# While progress reporting is disabled (default), all functions return immediately.
+
+
+
+import json
+import os
+import time
+
+
+
+KINDS = ['model', 'sa_run', 'export', 'sa_export']
+
+_enabled = False
+_events = None
+_n_scenarios = 0
+_scenario = None
+_planned = {}
+_reused = set()
+_done = {}
+_done_scenario = {}
+_measured = {}
+_start = None
+_last = None
+
+
+
+###
+###  (1) SWITCHES
+###
+
+def enable(n_scenarios, events_file=None):
+
+    global _enabled, _events, _n_scenarios, _scenario, _start, _last
+
+    disable()
+
+    _enabled = True
+    _n_scenarios = n_scenarios
+    _scenario = None
+    _planned.clear()
+    _reused.clear()
+    _done.clear()
+    _done_scenario.clear()
+    _measured.clear()
+    _start = _last = time.perf_counter()
+
+    if events_file is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(events_file)), exist_ok=True)
+        _events = open(events_file, 'a')
+
+    emit('start', scenarios=n_scenarios)
+
+
+def disable():
+
+    global _enabled, _events
+
+    if _enabled:
+        emit('end', **estimate())
+
+    if _events is not None:
+        _events.close()
+
+    _enabled = False
+    _events = None
+
+
+# Disable progress reporting in a worker process (forked from the main process) without ending the run
+
+def detach():
+
+    global _enabled, _events
+
+    _enabled = False
+    _events = None
+
+
+def is_enabled():
+
+    return _enabled
+
+
+
+###
+###  (2) TASKS
+###
+
+# Start a scenario with the known number of tasks per kind (None: not known yet, e.g. the SA runs before the import). Reused scenarios are not used to estimate the tasks of scenarios not started yet.
+
+def begin_scenario(scenario, reused=False, **tasks):
+
+    global _scenario
+
+    if not _enabled:
+        return
+
+    _scenario = str(scenario)
+    _planned[_scenario] = {kind: tasks.get(kind) for kind in KINDS}
+
+    if reused:
+        _reused.add(_scenario)
+
+    emit('scenario', scenario=_scenario, reused=reused, tasks=_planned[_scenario])
+
+
+# Set the number of tasks of a kind of a scenario (default: the current scenario)
+
+def plan(kind, n, scenario=None):
+
+    if not _enabled:
+        return
+
+    scenario = _scenario if scenario is None else str(scenario)
+
+    _planned[scenario][kind] = n
+
+    emit('plan', scenario=scenario, kind=kind, n=n)
+
+
+# Complete n tasks of a kind (at once, e.g. a batch of SA runs). Skipped tasks (restored or reused) have no duration.
+
+def done(kind, label=None, n=1, skipped=False, scenario=None):
+
+    global _last
+
+    if not _enabled or n == 0:
+        return
+
+    scenario = _scenario if scenario is None else str(scenario)
+
+    now = time.perf_counter()
+    seconds = now - _last
+    _last = now
+
+    _done[kind] = _done.get(kind, 0) + n
+    _done_scenario[scenario, kind] = _done_scenario.get((scenario, kind), 0) + n
+
+    if not skipped:
+        total, count = _measured.get(kind, (0.0, 0))
+        _measured[kind] = (total + seconds, count + n)
+
+    emit('task', scenario=scenario, kind=kind, label=label, n=n, seconds=None if skipped else seconds, skipped=skipped, **estimate())
+
+
+# Complete the remaining planned tasks of a kind of a scenario at once (e.g. of a task on a worker process, which cannot report its progress itself)
+
+def finish(kind, label=None, scenario=None):
+
+    if not _enabled:
+        return
+
+    scenario = _scenario if scenario is None else str(scenario)
+
+    done(kind, label, (_planned[scenario][kind] or 0) - _done_scenario.get((scenario, kind), 0), scenario=scenario)
+
+
+
+###
+###  (3) ESTIMATES
+###
+
+# Total number of tasks: planned tasks of the started scenarios and, for the others, the mean number of tasks of the started scenarios that were not reused
+
+def total_tasks():
+
+    total = {}
+
+    for kind in KINDS:
+        counts = [p[kind] for s, p in _planned.items() if p[kind] is not None and s not in _reused]
+        mean = sum(counts) / len(counts) if counts else 0
+
+        known = sum(p[kind] if p[kind] is not None else mean for p in _planned.values())
+
+        total[kind] = max(known + mean * (_n_scenarios - len(_planned)), _done.get(kind, 0))
+
+    return total
+
+
+def estimate():
+
+    total = total_tasks()
+
+    elapsed = time.perf_counter() - _start
+    seconds = sum(t for t, c in _measured.values())
+    count = sum(c for t, c in _measured.values())
+
+    remaining = {kind: total[kind] - _done.get(kind, 0) for kind in KINDS}
+
+    eta = None
+
+    if count > 0:
+        eta = sum(remaining[kind] * _measured[kind][0] / _measured[kind][1] for kind in KINDS if kind in _measured)
+
+    return {
+        'done': sum(_done.values()),
+        'total': round(sum(total.values())),
+        'elapsed_s': elapsed,
+        'throughput_per_s': count / seconds if seconds > 0 else None,
+        'eta_s': eta,
+        'eta_lower_bound': any(remaining[kind] > 0 and kind not in _measured for kind in KINDS)}
+
+
+def format_duration(seconds):
+
+    seconds = int(round(seconds))
+
+    if seconds >= 3600:
+        return f'{seconds // 3600} h {seconds % 3600 // 60:02d} min'
+
+    if seconds >= 60:
+        return f'{seconds // 60} min {seconds % 60:02d} s'
+
+    return f'{seconds} s'
+
+
+# Progress for the terminal output, e.g. '  [12/284 tasks, 0.30 tasks/s, ETA 13 min 31 s]' or '..., ETA > 8 s]' while the duration of some remaining tasks is not known ('' while disabled)
+
+def status():
+
+    if not _enabled:
+        return ''
+
+    e = estimate()
+
+    text = f"{e['done']}/{e['total']} tasks"
+
+    if e['throughput_per_s'] is not None:
+        text += f", {e['throughput_per_s']:.2f} tasks/s"
+
+    if e['eta_s'] is not None:
+        text += f", ETA {'> ' if e['eta_lower_bound'] else ''}{format_duration(e['eta_s'])}"
+
+    return f'  [{text}]'
+
+
+
+###
+###  (4) EVENTS FILE
+###
+
+def emit(event, **info):
+
+    if _events is None:
+        return
+
+    _events.write(json.dumps({'event': event, 'time': time.time()} | info, default=str) + '\n')
+    _events.flush()
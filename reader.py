@@ -15,21 +15,63 @@
 
 
 
+# Imports the input file of a scenario with import_data(file_path) in one of the following formats (by file extension, see READERS):
+#
+#   .xlsx, .xls              Excel template with the sheets 'Vehicles', 'Registrations', 'EoL' and 'Recycling' (see data/)
+#   .csv, .csv.gz            tidy table with one value per row (see below)
+#   .json                    the same table as a list of rows, e.g. [{"input": "loss", "column": "exports", "year": 2020, "value": 10.0}, ...]
+#   .parquet                 the same table (requires pyarrow or fastparquet)
+#
+# The tidy table has the columns input, column, id, year and value, where input is one of the imported DataFrames and column one of its columns (id only for inputs per vehicle model, year only for inputs per year):
+#
+#   input,column,id,year,value
+#   scenario,scenario_name,,,BASELINE
+#   scenario,start_year,,,1990
+#   scenario,end_year,,,2050
+#   scenario,cagr,,,1.0
+#   vehicles_names,name,1,,ICEV
+#   vehicles_data,total_mass,1,1990,1300.0            also plastic_content and <polymer>_content
+#   registrations,registrations,1,1990,2345678.0      initialization years from the start year
+#   loss,exports,,1990,10.0                           also unknown_whereabouts
+#   dismantling,pp_mass,1,1990,9.0                    <polymer>_mass
+#   recycling,pp_efficiency,,1990,28.23               <polymer>_efficiency
+#   production,pp_efficiency,,1990,95.0               <polymer>_efficiency and max_<polymer>
+#
+# The polymers are those of the <polymer>_content columns of vehicles_data, in the order of their first row. The rows may be in any order; the DataFrames are built by pivoting the rows of each input, so a table file gives the same scenario as the Excel file with the same values (write_input_table converts a scenario to a table file). All formats are checked by validator.py after the import.
+
+
+
+import json
+import os
+
+import numpy as np
 import pandas as pd
 
+from calculator import polymer_columns
+from validator import validate_inputs
 
 
-def import_data(file_path):
 
-    tmp = {}
+# Values of one row per vehicle model (rows) over n columns from column 2, flattened in the order [id, year]
+
+def block(cells, rows, n):
+
+    return cells[rows, 2:2+n].astype(float).ravel()
+
 
 
+# Import an input file in the Excel layout (fixed cell positions of the template, see data/)
+
+def import_excel(file_path):
+
     ### (1) IMPORT 'Vehicles' DATA
     
     # Import vehicle model data from sheet 'Vehicles' and basic scenario information (scenario name, start year, end year, number of vehicle models, vehicle model names)
     
     # vehicles_names[id] = {name}
     # vehicles_data[id, year] = {total_mass, plastic_content, pp_content, pa_content, pc_content, abs_content}
+
+    # The blocks of all vehicle models are read at once (8 rows per vehicle model from row 15), so large numbers of vehicle models import quickly
     
     try:
         df = pd.read_excel(file_path, sheet_name='Vehicles')
@@ -44,37 +86,30 @@ def import_data(file_path):
         print(f'   end year: {end_year}')
         print(f'   number of vehicles: {n_vehicles}')
 
+        cells = df.to_numpy()
+        rows = 15 + 8 * np.arange(n_vehicles)
+
         vehicles_names = pd.DataFrame({
-            'id': range(1, n_vehicles + 1)})
+            'id': range(1, n_vehicles + 1),
+            'name': cells[11, 2:2+n_vehicles]})
         vehicles_names.set_index('id', inplace=True)
 
-
         vehicles_data = pd.DataFrame({
-            'id': [i for i in range(1, n_vehicles + 1) for j in range(start_year, end_year + 1)],
-            'year': [j for i in range(1, n_vehicles + 1) for j in range(start_year, end_year + 1)]})
+            'id': np.repeat(np.arange(1, n_vehicles + 1), n_years),
+            'year': np.tile(np.arange(start_year, end_year + 1), n_vehicles),
+            'total_mass': block(cells, rows, n_years),  # [kg]
+            'plastic_content': block(cells, rows + 1, n_years),  # [%]
+            'pp_content': block(cells, rows + 2, n_years),  # [%]
+            'pa_content': block(cells, rows + 3, n_years),  # [%]
+            'pc_content': block(cells, rows + 4, n_years),  # [%]
+            'abs_content': block(cells, rows + 5, n_years)})  # [%]
         vehicles_data.set_index(['id', 'year'], inplace=True)
 
-        row = 15
-
-        for i in range(1, n_vehicles + 1):
-            for j in range(start_year, end_year + 1):
-                vehicles_names.loc[i, 'name'] = df.iat[11, 1+i]
-
-                vehicles_data.loc[(i, j), 'total_mass'] = df.iat[row, j-start_year+2]  # [kg]
-                vehicles_data.loc[(i, j), 'plastic_content'] = df.iat[row+1, j-start_year+2]  # [%]
-                vehicles_data.loc[(i, j), 'pp_content'] = df.iat[row+2, j-start_year+2]  # [%]
-                vehicles_data.loc[(i, j), 'pa_content'] = df.iat[row+3, j-start_year+2]  # [%]
-                vehicles_data.loc[(i, j), 'pc_content'] = df.iat[row+4, j-start_year+2]  # [%]
-                vehicles_data.loc[(i, j), 'abs_content'] = df.iat[row+5, j-start_year+2]  # [%]
-
-            row += 8
-
     except FileNotFoundError:
         raise Exception(f"ERROR: The input file '{file_path}' was not found.")
     
     except Exception as e:
-        print(f"(!) An error occurred while importing data from sheet 'Vehicles': {e}")
-        return None
+        raise ValueError(f"(!) An error occurred while importing data from sheet 'Vehicles' of '{file_path}': {e}") from e
     
 
     ### (2) IMPORT 'Registrations' DATA
@@ -93,20 +128,16 @@ def import_data(file_path):
         print(f'   number of model initialization years: {n_init_years}')
 
         registrations = pd.DataFrame({
-            'id': [i for i in range(1, n_vehicles + 1) for j in range(start_year, start_year + n_init_years)],
-            'year': [j for i in range(1, n_vehicles + 1) for j in range(start_year, start_year + n_init_years)]})
+            'id': np.repeat(np.arange(1, n_vehicles + 1), n_init_years),
+            'year': np.tile(np.arange(start_year, start_year + n_init_years), n_vehicles),
+            'registrations': block(df.to_numpy(), 7 + np.arange(n_vehicles), n_init_years)})
         registrations.set_index(['id', 'year'], inplace=True)
 
-        for i in range(1, n_vehicles + 1):
-            for j in range(start_year, start_year + n_init_years):
-                registrations.loc[(i, j), 'registrations'] = df.iat[6+i, j-start_year+2]
-
     except FileNotFoundError:
         raise Exception(f"ERROR: The input file '{file_path}' was not found.")
     
     except Exception as e:
-        print(f"(!) An error occurred while importing data from sheet 'Registrations': {e}")
-        return None
+        raise ValueError(f"(!) An error occurred while importing data from sheet 'Registrations' of '{file_path}': {e}") from e
     
 
     ### (3) IMPORT 'EoL' DATA
@@ -125,28 +156,23 @@ def import_data(file_path):
             'unknown_whereabouts': df.iloc[8, 2:2+n_years].values})  # [%]
         loss.set_index('year', inplace=True)
 
+        cells = df.to_numpy()
+        rows = 13 + 6 * np.arange(n_vehicles)
+
         dismantling = pd.DataFrame({
-            'id': [i for i in range(1, n_vehicles + 1) for j in range(start_year, end_year + 1)],
-            'year': [j for i in range(1, n_vehicles + 1) for j in range(start_year, end_year + 1)]})
+            'id': np.repeat(np.arange(1, n_vehicles + 1), n_years),
+            'year': np.tile(np.arange(start_year, end_year + 1), n_vehicles),
+            'pp_mass': block(cells, rows, n_years),  # [kg]
+            'pa_mass': block(cells, rows + 1, n_years),  # [kg]
+            'pc_mass': block(cells, rows + 2, n_years),  # [kg]
+            'abs_mass': block(cells, rows + 3, n_years)})  # [kg]
         dismantling.set_index(['id', 'year'], inplace=True)
 
-        row = 13
-
-        for i in range(1, n_vehicles + 1):
-            for j in range(start_year, end_year + 1):
-                dismantling.loc[(i, j), 'pp_mass'] = df.iat[row, j-start_year+2]  # [kg]
-                dismantling.loc[(i, j), 'pa_mass'] = df.iat[row+1, j-start_year+2]  # [kg]
-                dismantling.loc[(i, j), 'pc_mass'] = df.iat[row+2, j-start_year+2]  # [kg]
-                dismantling.loc[(i, j), 'abs_mass'] = df.iat[row+3, j-start_year+2]  # [kg]
-
-            row += 6
-
     except FileNotFoundError:
         raise Exception(f"ERROR: The input file '{file_path}' was not found.")
     
     except Exception as e:
-        print(f"(!) An error occurred while importing data from sheet 'EoL': {e}")
-        return None
+        raise ValueError(f"(!) An error occurred while importing data from sheet 'EoL' of '{file_path}': {e}") from e
     
 
     ### (4) IMPORT 'Recycling' DATA
@@ -184,14 +210,192 @@ def import_data(file_path):
         raise Exception(f"ERROR: The input file '{file_path}' was not found.")
     
     except Exception as e:
-        print(f"(!) An error occurred while importing data from sheet 'Production': {e}")
-        return None
+        raise ValueError(f"(!) An error occurred while importing data from sheet 'Recycling' of '{file_path}': {e}") from e
     
 
-    ### (5) SAVE TMP FILES
-    
+    return scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production
+
+
+
+# Read a tidy table file as a DataFrame with the columns input, column, id, year and value (values as text or numbers)
+
+def read_csv(file_path):
+
+    return pd.read_csv(file_path, dtype=str, keep_default_na=False)
+
+
+def read_json(file_path):
+
+    with open(file_path) as f:
+        return pd.DataFrame(json.load(f))
+
+
+def read_parquet(file_path):
+
+    try:
+        return pd.read_parquet(file_path)
+    except ImportError:
+        raise ValueError('(!) Reading Parquet files requires pyarrow or fastparquet. Please install it or use a CSV or JSON file.')
+
+
+TABLE_READERS = {
+    '.csv': read_csv,
+    '.csv.gz': read_csv,
+    '.json': read_json,
+    '.parquet': read_parquet}
+
+TABLE_COLUMNS = ['input', 'column', 'id', 'year', 'value']
+
+
+# Values as floats (exact for numbers written as text); values that are empty or not numbers as NaN
+
+def numbers(values):
+
+    values = np.asarray(values, dtype=object)
+
+    try:
+        return values.astype(float)
+
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+
+        for k, value in enumerate(values):
+            try:
+                out[k] = float(value)
+            except (TypeError, ValueError):
+                pass
+
+        return out
+
+
+# DataFrame of an input from its rows of the table, with the index (id, year), (id) or (year) and the expected columns first
+
+def pivot(file_path, name, rows, index, columns):
+
+    if rows.empty:
+        values = pd.DataFrame(columns=columns, dtype=float)
+        values.index = pd.MultiIndex.from_arrays([[]] * len(index), names=index) if len(index) > 1 else pd.Index([], name=index[0])
+        return values
+
+    keys = {key: numbers(rows[key]) for key in index}
+
+    for key, values in keys.items():
+        if np.isnan(values).any():
+            raise ValueError(f"(!) The input file '{file_path}' has {int(np.isnan(values).sum())} row(s) of {name} without {key}.")
+
+    rows = rows.assign(value=numbers(rows['value']), **{key: values.astype(np.int64) for key, values in keys.items()})
+
+    values = rows.pivot(index=index, columns='column', values='value')
+    values.columns.name = None
+
+    return values[[c for c in columns if c in values.columns] + [c for c in values.columns if c not in columns]]
+
+
+# Import an input file in a tidy table format (see above)
+
+def import_table(file_path):
+
+    suffix = next(suffix for suffix in TABLE_READERS if file_path.lower().endswith(suffix))
+
+    try:
+        table = TABLE_READERS[suffix](file_path)
+
+    except FileNotFoundError:
+        raise Exception(f"ERROR: The input file '{file_path}' was not found.")
+
+    missing = [c for c in TABLE_COLUMNS if c not in table.columns]
+
+    if missing:
+        raise ValueError(f"(!) The input file '{file_path}' has no column(s) {', '.join(missing)} (expected: {', '.join(TABLE_COLUMNS)}).")
+
+    table = table[TABLE_COLUMNS].copy()
+    table['input'] = table['input'].astype(str).str.strip()
+    table['column'] = table['column'].astype(str).str.strip()
+
+    # Each value may only be defined once:
+
+    keys = table[['input', 'column', 'id', 'year']].astype(str)
+    duplicated = keys.duplicated()
+
+    if duplicated.any():
+        k = int(np.argmax(duplicated.to_numpy()))
+        raise ValueError(f"(!) The input file '{file_path}' defines {int(duplicated.sum())} value(s) more than once (first: {', '.join(f'{c} {v}' for c, v in keys.iloc[k].items() if v not in ('', 'nan', 'None'))}).")
+
+    rows = {name: table[table['input'] == name] for name in table['input'].unique()}
+    empty = table.iloc[:0]
+
+    try:
+        scenario = rows.get('scenario', empty)
+        scenario = dict(zip(scenario['column'], scenario['value']))
+
+        scenario_name = str(scenario['scenario_name'])
+        start_year = int(float(scenario['start_year']))
+        end_year = int(float(scenario['end_year']))
+        n_years = int(end_year - start_year + 1)
+        cagr = float(scenario['cagr'])
+
+    except KeyError as e:
+        raise ValueError(f"(!) The input file '{file_path}' defines no value of scenario {e}.")
+
+    vehicles_names = rows.get('vehicles_names', empty)
+    vehicles_names = pd.DataFrame({'name': vehicles_names['value'].to_numpy()}, index=pd.Index(numbers(vehicles_names['id']).astype(np.int64), name='id')).sort_index()
+
+    n_vehicles = len(vehicles_names)
+
+    print(f'   start year: {start_year}')
+    print(f'   end year: {end_year}')
+    print(f'   number of vehicles: {n_vehicles}')
+
+    vehicles_rows = rows.get('vehicles_data', empty)
+    polymers = [column[:-len('_content')] for column in vehicles_rows['column'].unique() if column.endswith('_content') and column != 'plastic_content']
+    columns = polymer_columns(polymers)
+
+    vehicles_data = pivot(file_path, 'vehicles_data', vehicles_rows, ['id', 'year'], columns['vehicles_data'])
+    registrations = pivot(file_path, 'registrations', rows.get('registrations', empty), ['id', 'year'], ['registrations'])
+    loss = pivot(file_path, 'loss', rows.get('loss', empty), ['year'], ['exports', 'unknown_whereabouts'])
+    dismantling = pivot(file_path, 'dismantling', rows.get('dismantling', empty), ['id', 'year'], columns['dismantling'])
+    recycling = pivot(file_path, 'recycling', rows.get('recycling', empty), ['year'], columns['recycling'])
+    production = pivot(file_path, 'production', rows.get('production', empty), ['year'], columns['production'])
+
+    n_init_years = np.int64(registrations.index.get_level_values('year').nunique())  # NumPy integer as counted in import_excel, so the projected registrations are identical
+
+    print(f'   CAGR [%]: {cagr}')
+    print(f'   number of model initialization years: {n_init_years}')
+
+    return scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production
+
+
+
+###
+###  INPUT FILES
+###
+
+READERS = {
+    '.xlsx': import_excel,
+    '.xls': import_excel} | {suffix: import_table for suffix in TABLE_READERS}
+
+INPUT_FORMATS = tuple(READERS)
+
+
+def import_data(file_path):
+
+    tmp = {}
+
+    suffix = next((suffix for suffix in READERS if file_path.lower().endswith(suffix)), None)
+
+    if suffix is None:
+        raise ValueError(f"(!) The format of the input file '{file_path}' is not supported (supported: {', '.join(INPUT_FORMATS)}).")
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production = READERS[suffix](file_path)
+
+
+    # Check shapes, years, value ranges and share sums of all imported data at once and abort with a list of all problems before any modeling (see validator.py)
+
+    validate_inputs(file_path, start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production)
+
+
     # Save all imported data in a temporary dictionary tmp for quick checks of the imported data
-    
+
     tmp['vehicles_names'] = vehicles_names
     tmp['vehicles_data'] = vehicles_data
     tmp['loss'] = loss
@@ -202,4 +406,55 @@ def import_data(file_path):
 
     print('   import done.')
 
-    return scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp
\ No newline at end of file
+    return scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp
+
+
+# Tidy table (see above) of an imported scenario
+
+def scenario_table(scenario):
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = scenario
+
+    tables = [pd.DataFrame({
+        'input': 'scenario',
+        'column': ['scenario_name', 'start_year', 'end_year', 'cagr'],
+        'value': [scenario_name, start_year, end_year, cagr]})]
+
+    tables.append(pd.DataFrame({'input': 'vehicles_names', 'column': 'name', 'id': vehicles_names.index, 'value': vehicles_names['name'].to_numpy()}))
+
+    for name, df in [('vehicles_data', vehicles_data), ('registrations', registrations), ('loss', loss), ('dismantling', dismantling), ('recycling', recycling), ('production', production)]:
+        rows = df.astype(float).melt(ignore_index=False, var_name='column').reset_index()
+        tables.append(rows.assign(input=name))
+
+    table = pd.concat(tables, ignore_index=True)[TABLE_COLUMNS]
+    table['id'] = table['id'].astype('Int64')
+    table['year'] = table['year'].astype('Int64')
+
+    return table
+
+
+# Write an imported scenario as a tidy table file (.csv, .csv.gz, .json or .parquet)
+
+def write_input_table(scenario, file_path):
+
+    table = scenario_table(scenario)
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+
+    if file_path.lower().endswith(('.csv', '.csv.gz')):
+        table.to_csv(file_path, index=False)
+
+    elif file_path.lower().endswith('.json'):
+        rows = [{k: v for k, v in row.items() if not pd.isna(v)} for row in table.astype(object).to_dict('records')]
+
+        with open(file_path, 'w') as f:
+            f.write('[\n' + ',\n'.join(json.dumps(row, default=float) for row in rows) + '\n]\n')
+
+    elif file_path.lower().endswith('.parquet'):
+        try:
+            table.assign(value=table['value'].astype(str)).to_parquet(file_path, index=False)
+        except ImportError:
+            raise ValueError('(!) Writing Parquet files requires pyarrow or fastparquet. Please install it or write a CSV or JSON file.')
+
+    else:
+        raise ValueError(f"(!) The format of the table file '{file_path}' is not supported (supported: {', '.join(TABLE_READERS)}).")
@@ -0,0 +1,373 @@
+####
+#
+# CAPsim
+# Multi-Region Model
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Models several regions (e.g. EU member states) together, each defined by its own input file, and links them by the exports of used vehicles. The regions are declared in a JSON file:
+#
+#   {
+#     "regions": {"DE": "data/data_01.xlsx", "PL": "data/data_03.xlsx", "RO": "data/data_06.xlsx"},
+#     "flows": [
+#       {"from": "DE", "to": "PL", "share": 40},
+#       {"from": "DE", "to": "RO", "share": 15, "start_year": 2030},
+#       {"from": "PL", "to": "RO", "share": 25}
+#     ]
+#   }
+#
+# A flow sends a share (%) of the exported fleet exits (elvs_export) of one region to the vehicle fleet of another region, optionally for some years only (later flows replace earlier ones in overlapping years). The remaining exports leave the modelled regions. The flows of each year form a sparse matrix (origin x destination).
+#
+# All regions need the same time span, vehicle models (by name) and polymers. The stages run with a leading region axis:
+#
+#   registrations[region, id, year]                     new registrations of each region
+#   fleet_detail[region, id, year_reg, year_now, k]     stock and exits incl. imported used vehicles (k as in batch.FLEET_COLUMNS)
+#   imports[region, id, year]                           imported used vehicles
+#
+# Imported vehicles keep their vehicle model and year of registration, join the fleet of the destination in the year of export and leave it with the survival of the remaining lifetime (Weibull distribution conditional on their age). Their fleet exits are split by the end-of-life parameters of the destination, so re-exports are passed on again. Recycling uses the vehicle data and dismantling masses of the destination; closed-loop demand only results from new registrations.
+#
+# The fleet and end-of-life stages of the regions are independent of each other and run in parallel worker processes with the cohort survival kernel (kernel.py): first for the own registrations of all regions, then for the imports, generation by generation (the vehicles imported from the exports of the previous generation), until no vehicles are passed on. Recycling outputs and closed-loop rates run as array operations over the region axis (see batch.py).
+
+
+
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from reader import import_data
+from kernel import survival_active, weibull_pdf
+from calculator import polymers_of, polymer_columns
+from batch import FLEET_COLUMNS, LOSS_COLUMNS, stack_frames, ordered_sum, batch_registrations, batch_fleet, batch_eol, batch_recycling, batch_closedloop
+
+
+
+###
+###  (1) REGIONS
+###
+
+def load_regions(regions_file):
+
+    with open(regions_file) as f:
+        config = json.load(f)
+
+    if not config.get('regions'):
+        raise ValueError(f"(!) The file '{regions_file}' does not define any regions.")
+
+    for flow in config.get('flows', []):
+        for k in ('from', 'to'):
+            if flow.get(k) not in config['regions']:
+                raise ValueError(f"(!) Unknown region '{flow.get(k)}' in flow {flow}. Please choose one of {list(config['regions'])}.")
+
+        if flow['from'] == flow['to']:
+            raise ValueError(f"(!) The flow {flow} does not connect two different regions.")
+
+        if not 0 <= flow.get('share', -1) <= 100:
+            raise ValueError(f"(!) The share of flow {flow} must be between 0 and 100 %.")
+
+    return config
+
+
+# Import the input file of a region
+
+def import_region(name, import_file):
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        imported = import_data(import_file)
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = imported
+
+    return {
+        'region': name,
+        'scenario_name': scenario_name,
+        'start_year': start_year,
+        'end_year': end_year,
+        'vehicles_names': vehicles_names,
+        'vehicles_data': vehicles_data,
+        'cagr': cagr,
+        'n_init_years': n_init_years,
+        'registrations': registrations,
+        'loss': loss,
+        'dismantling': dismantling,
+        'recycling': recycling,
+        'production': production}
+
+
+# Check that all regions share time span, vehicle models and polymers
+
+def check_regions(regions):
+
+    first = regions[0]
+
+    for region in regions[1:]:
+        if (region['start_year'], region['end_year']) != (first['start_year'], first['end_year']):
+            raise ValueError(f"(!) Region '{region['region']}' spans {region['start_year']}-{region['end_year']}, region '{first['region']}' {first['start_year']}-{first['end_year']}. All regions need the same time span.")
+
+        if list(region['vehicles_names']['name']) != list(first['vehicles_names']['name']):
+            raise ValueError(f"(!) Region '{region['region']}' has the vehicle models {list(region['vehicles_names']['name'])}, region '{first['region']}' {list(first['vehicles_names']['name'])}. All regions need the same vehicle models.")
+
+        if polymers_of(region['vehicles_data']) != polymers_of(first['vehicles_data']):
+            raise ValueError(f"(!) Region '{region['region']}' has the polymers {polymers_of(region['vehicles_data'])}, region '{first['region']}' {polymers_of(first['vehicles_data'])}. All regions need the same polymers.")
+
+
+# Sparse flow matrices per year: matrices[year][origin, destination] = share of the exports of the origin (0-1)
+
+def flow_matrices(flows, names, set_years):
+
+    years = list(set_years)
+    shares = [{} for year in years]
+
+    for flow in flows:
+        for y, year in enumerate(years):
+            if flow.get('start_year', years[0]) <= year <= flow.get('end_year', years[-1]):
+                shares[y][(names.index(flow['from']), names.index(flow['to']))] = flow['share'] / 100
+
+    matrices = []
+
+    for y, year in enumerate(years):
+        keys = list(shares[y])
+        matrix = sparse.csr_matrix(([shares[y][k] for k in keys], ([k[0] for k in keys], [k[1] for k in keys])), shape=(len(names), len(names)))
+
+        total = np.asarray(matrix.sum(axis=1)).ravel()
+
+        if np.any(total > 1 + 1e-9):
+            raise ValueError(f"(!) The flows from region '{names[int(np.argmax(total))]}' in {year} add up to {100 * total.max():.1f} % of its exports (at most 100 %).")
+
+        matrices.append(matrix)
+
+    return matrices
+
+
+# Imported vehicles imports[destination, id, year_reg, year_now] from the exports of all origins (whole vehicles)
+
+def apply_flows(exports, matrices):
+
+    n_regions = exports.shape[0]
+
+    imports = np.zeros_like(exports)
+
+    for y, matrix in enumerate(matrices):
+        if matrix.nnz:
+            imports[..., y] = (matrix.T @ exports[..., y].reshape(n_regions, -1)).reshape(exports.shape[:-1])
+
+    return np.floor(imports)
+
+
+
+###
+###  (2) REGION STAGES
+###
+
+# Registrations and fleet_detail[id, year_reg, year_now, k] of the own registrations of a region
+
+def run_region(region, shape, scale):
+
+    set_years = range(region['start_year'], region['end_year'] + 1)
+    set_vehicles = range(1, len(region['vehicles_names']) + 1)
+
+    cagr = np.array([region['cagr']], dtype=float)
+
+    reg = batch_registrations(region['start_year'], region['end_year'], set_years, set_vehicles, cagr, region['n_init_years'], region['registrations'])
+
+    stock = batch_fleet(reg, cagr, np.array([shape], dtype=float), np.array([scale], dtype=float))
+
+    exits, exports, unknown, elvs_recycling = batch_eol(stock, stack_frames([region['loss']], LOSS_COLUMNS, set_years))
+
+    return reg[0], np.stack([stock, exits, exports, unknown, elvs_recycling], axis=-1)[0]
+
+
+# Stock of imported vehicles stock[id, year_reg, year_now] from the arrivals imports[id, year_reg, year_now]. The vehicles of age a arriving together leave the fleet like a cohort with the Weibull density of the ages after a divided by the share surviving age a.
+
+def imported_stock(imports, pdf):
+
+    n_vehicles, n_years, _ = imports.shape
+
+    surviving = 1 - np.cumsum(pdf)
+    stock = np.zeros_like(imports)
+
+    for a in range(1, n_years):
+        n_cohorts = n_years - a
+        cohorts = np.arange(n_cohorts)
+
+        arrivals = imports[:, cohorts, cohorts + a]  # [id, year_reg] arriving in year_reg + a
+
+        if not arrivals.any():
+            continue
+
+        pdf_a = np.zeros(n_cohorts)
+
+        if surviving[a] > 0:
+            pdf_a[1:] = pdf[a + 1:] / surviving[a]
+        elif n_cohorts > 1:
+            pdf_a[1] = 1
+
+        stock_age, _ = survival_active(np.ascontiguousarray(arrivals.reshape(-1)), pdf_a)
+
+        n_active = stock_age.shape[1]
+
+        age = np.arange(n_years)[None, :] - (cohorts + a)[:, None]  # years since arrival [year_reg, year_now]
+        valid = age >= 0
+        age = np.minimum(np.where(valid, age, 0), n_active - 1)
+
+        stock[:, :n_cohorts] += np.where(valid, stock_age.reshape(n_vehicles, n_cohorts, n_active)[:, cohorts[:, None], age], 0.0)
+
+    return stock
+
+
+# fleet_detail[id, year_reg, year_now, k] of the vehicles imported into a region
+
+def run_imports(region, imports, shape, scale):
+
+    set_years = range(region['start_year'], region['end_year'] + 1)
+
+    stock = imported_stock(imports, weibull_pdf(len(set_years), shape, scale))
+
+    # Fleet exits from the change in stock without the arrivals:
+
+    exits, exports, unknown, elvs_recycling = batch_eol((stock - np.cumsum(imports, axis=-1))[None], stack_frames([region['loss']], LOSS_COLUMNS, set_years))
+
+    return np.stack([stock, exits[0], exports[0], unknown[0], elvs_recycling[0]], axis=-1)
+
+
+
+###
+###  (3) MULTI-REGION MODEL
+###
+
+def run_regions(config, shape=3.2, scale=16.75, workers=None, max_generations=20):
+
+    names = list(config['regions'])
+    n_regions = len(names)
+
+    workers = min(workers or os.cpu_count() or 1, n_regions)
+
+    print(f'   {n_regions} region(s) on {workers} process(es)')
+
+    t = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        if workers == 1:
+            map_regions = map
+        else:
+            map_regions = stack.enter_context(ProcessPoolExecutor(max_workers=workers)).map
+
+        regions = list(map_regions(import_region, names, config['regions'].values()))
+
+        check_regions(regions)
+
+        first = regions[0]
+
+        set_years = range(first['start_year'], first['end_year'] + 1)
+        set_vehicles = range(1, len(first['vehicles_names']) + 1)
+
+        matrices = flow_matrices(config.get('flows', []), names, set_years)
+
+        print(f'   regions imported, {sum(m.nnz for m in matrices) / len(matrices):.0f} flow(s) per year on average ({time.perf_counter() - t:.1f} s)')
+
+        # Own registrations of all regions:
+
+        reg, fleet_detail = (np.stack(x) for x in zip(*map_regions(run_region, regions, [shape] * n_regions, [scale] * n_regions)))
+
+        print(f'   fleets of the own registrations done ({time.perf_counter() - t:.1f} s)')
+
+        # Imports, generation by generation:
+
+        imports_total = np.zeros(fleet_detail.shape[:-1])
+        exports = fleet_detail[..., 2]
+        generation = 0
+
+        while generation < max_generations:
+            imports = apply_flows(exports, matrices)
+
+            if not imports.any():
+                break
+
+            generation += 1
+
+            detail = np.stack(list(map_regions(run_imports, regions, imports, [shape] * n_regions, [scale] * n_regions)))
+
+            fleet_detail += detail
+            imports_total += imports
+            exports = detail[..., 2]
+
+            print(f'   generation {generation}: {imports.sum():,.0f} imported vehicles ({time.perf_counter() - t:.1f} s)')
+
+        else:
+            if apply_flows(exports, matrices).any():
+                print(f'   (!) Exports after {max_generations} generations are not passed on.')
+
+
+    # RECYCLING OUTPUTS AND CLOSED-LOOP RATES over the region axis
+
+    polymers = polymers_of(first['vehicles_data'])
+    columns = polymer_columns(polymers)
+
+    vehicles_data = stack_frames([region['vehicles_data'] for region in regions], columns['vehicles_data'], set_years, set_vehicles)
+
+    eol = batch_recycling(fleet_detail[..., 4], vehicles_data, stack_frames([region['dismantling'] for region in regions], columns['dismantling'], set_years, set_vehicles), stack_frames([region['recycling'] for region in regions], columns['recycling'], set_years))
+
+    closedloop = batch_closedloop(reg, vehicles_data, eol, stack_frames([region['production'] for region in regions], columns['production'], set_years))
+
+    print(f'   all stages done ({time.perf_counter() - t:.1f} s)')
+
+    return {
+        'regions': names,
+        'polymers': polymers,
+        'set_years': set_years,
+        'set_vehicles': set_vehicles,
+        'vehicles_names': first['vehicles_names'],
+        'generations': generation,
+        'registrations': reg,
+        'imports': ordered_sum(imports_total, axis=2),
+        'fleet_detail': fleet_detail,
+        'fleet': np.stack([ordered_sum(fleet_detail[..., k], axis=2) for k in range(len(FLEET_COLUMNS))], axis=-1),
+        'eol': eol,
+        'closedloop': closedloop}
+
+
+
+###
+###  (4) RESULTS
+###
+
+# Table with one row per region and year: registrations, imports, fleet results summed over the vehicle models, and closed-loop results
+
+def region_table(results):
+
+    names = results['regions']
+    years = list(results['set_years'])
+
+    n_regions = len(names)
+    n_years = len(years)
+
+    table = pd.DataFrame({
+        'region': np.repeat(names, n_years),
+        'year': np.tile(years, n_regions),
+        'registrations': ordered_sum(results['registrations'], axis=1).reshape(-1),
+        'imports': ordered_sum(results['imports'], axis=1).reshape(-1)})
+
+    fleet = ordered_sum(results['fleet'], axis=1)
+
+    for k, column in enumerate(FLEET_COLUMNS):
+        table[column] = fleet[..., k].reshape(-1)
+
+    for c, column in enumerate(polymer_columns(results['polymers'])['closedloop']):
+        table[column] = results['closedloop'][..., c].reshape(-1)
+
+    return table
@@ -0,0 +1,379 @@
+####
+#
+# CAPsim
+# Regression Module for Calculation Engines
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Captures golden outputs of the reference implementation (calculator.calc_all) for the shipped scenarios and synthetic edge cases, and compares alternative calculation engines against them with configurable tolerances per column.
+#
+#   python capsim.py regress capture            store golden outputs in 'golden/'
+#   python capsim.py regress check --engine X   compare engine X with the golden outputs
+#   python capsim.py regress compare --engine X run the reference and engine X side by side
+#   python capsim.py regress deviation --engine X summarize the deviations of a numerical mode (e.g. 'continuous')
+
+
+
+import contextlib
+import functools
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from reader import import_data
+from calculator import calc_all
+from benchmark import make_scenario
+
+
+
+OUTPUTS = ['registrations', 'fleet_detail', 'fleet', 'eol', 'closedloop']
+
+# Calculation engines with the signature of calculator.calc_all. The continuous mode does not floor fleet exits and is not expected to reproduce the golden outputs; its deviations are summarized by deviation_report().
+
+ENGINES = {
+    'reference': calc_all,
+    'kernel': functools.partial(calc_all, engine='kernel'),
+    'batch': functools.partial(calc_all, engine='batch'),
+    'continuous': functools.partial(calc_all, engine='continuous')}
+
+
+
+###
+###  (1) TOLERANCES
+###
+
+# Tolerances per output and column as (rtol, atol): a value passes if |candidate - reference| <= atol + rtol * |reference|. Integer vehicle stocks and fleet exits must be reproduced exactly, including the floor truncation and the clamping of negative stocks; aggregated numbers of vehicles and masses may differ by floating-point summation order. '*' is the default for all other columns.
+
+TOLERANCES = {
+    'registrations': {'*': (1e-12, 0)},
+    'fleet_detail': {'stock': (0, 0), 'elvs_exit': (0, 0), '*': (1e-12, 1e-9)},
+    'fleet': {'*': (1e-12, 1e-9)},
+    'eol': {'*': (1e-9, 1e-6)},
+    'closedloop': {'*': (1e-9, 1e-9)}}
+
+
+def load_tolerances(file_path=None):
+
+    tolerances = {output: dict(columns) for output, columns in TOLERANCES.items()}
+
+    if file_path is not None:
+        with open(file_path) as f:
+            for output, columns in json.load(f).items():
+                tolerances.setdefault(output, {}).update({column: tuple(tol) for column, tol in columns.items()})
+
+    return tolerances
+
+
+
+###
+###  (2) CASES
+###
+
+# Shipped scenarios are read from the data folder. Synthetic edge cases cover a single initialization year, no projected registrations, a vehicle model without registrations, a short horizon and a Weibull scale small enough to trigger the clamping of negative stocks.
+
+SYNTHETIC_CASES = {
+    'synthetic_base': {'n_vehicles': 2, 'n_years': 25, 'n_init_years': 15},
+    'synthetic_one_init_year': {'n_vehicles': 2, 'n_years': 20, 'n_init_years': 1},
+    'synthetic_no_projection': {'n_vehicles': 1, 'n_years': 15, 'n_init_years': 15},
+    'synthetic_zero_registrations': {'n_vehicles': 2, 'n_years': 20, 'n_init_years': 10, 'zero_vehicle': 2},
+    'synthetic_short_horizon': {'n_vehicles': 3, 'n_years': 3, 'n_init_years': 2},
+    'synthetic_clamp': {'n_vehicles': 1, 'n_years': 12, 'n_init_years': 6, 'scale': 1.0}}
+
+
+def synthetic_case(name, shape=3.2, scale=16.75):
+
+    spec = dict(SYNTHETIC_CASES[name])
+
+    shape = spec.pop('shape', shape)
+    scale = spec.pop('scale', scale)
+    zero_vehicle = spec.pop('zero_vehicle', None)
+
+    scenario = make_scenario(**spec)
+
+    if zero_vehicle is not None:
+        scenario[9].loc[zero_vehicle, 'registrations'] = 0.0
+
+    return scenario, shape, scale
+
+
+def shipped_cases(data_path='data/'):
+
+    return {os.path.splitext(file)[0]: os.path.join(data_path, file) for file in sorted(os.listdir(data_path)) if file.lower().startswith('data') and file.lower().endswith(('.xls', '.xlsx'))}
+
+
+def load_case(name, data_path='data/', shape=3.2, scale=16.75):
+
+    if name in SYNTHETIC_CASES:
+        return synthetic_case(name, shape, scale)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        scenario = import_data(shipped_cases(data_path)[name])
+
+    return scenario, shape, scale
+
+
+def all_cases(data_path='data/'):
+
+    return list(shipped_cases(data_path)) + list(SYNTHETIC_CASES)
+
+
+
+###
+###  (3) RUN ENGINES
+###
+
+# Run an engine for a case and return the outputs {output: DataFrame} and the run time
+
+def run_engine(engine, scenario, shape, scale):
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = scenario
+
+    set_years = range(start_year, end_year + 1)
+    set_vehicles = range(1, n_vehicles + 1)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t = time.perf_counter()
+        results = engine(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale)
+        seconds = time.perf_counter() - t
+
+    return dict(zip(OUTPUTS, results)), seconds
+
+
+
+###
+###  (4) GOLDEN OUTPUTS
+###
+
+# Golden outputs are stored as compressed CSV files (golden/<case>/<output>.csv.gz) with all digits of the float values
+
+def capture_golden(cases, golden_path='golden/', data_path='data/', shape=3.2, scale=16.75):
+
+    for name in cases:
+        scenario, _shape, _scale = load_case(name, data_path, shape, scale)
+
+        outputs, seconds = run_engine(ENGINES['reference'], scenario, _shape, _scale)
+
+        case_path = os.path.join(golden_path, name)
+        os.makedirs(case_path, exist_ok=True)
+
+        for output, df in outputs.items():
+            df.to_csv(os.path.join(case_path, f'{output}.csv.gz'), float_format='%.17g')
+
+        with open(os.path.join(case_path, 'case.json'), 'w') as f:
+            json.dump({'case': name, 'shape': _shape, 'scale': _scale, 'seconds': seconds}, f, indent=2)
+
+        print(f'   golden outputs of {name} captured ({seconds:.2f} s).')
+
+
+def load_golden(name, golden_path='golden/'):
+
+    case_path = os.path.join(golden_path, name)
+
+    with open(os.path.join(case_path, 'case.json')) as f:
+        case = json.load(f)
+
+    index_columns = {
+        'registrations': [0, 1],
+        'fleet_detail': [0, 1, 2],
+        'fleet': [0, 1],
+        'eol': [0, 1],
+        'closedloop': [0]}
+
+    outputs = {output: pd.read_csv(os.path.join(case_path, f'{output}.csv.gz'), index_col=index_columns[output], float_precision='round_trip') for output in OUTPUTS}
+
+    return outputs, case
+
+
+
+###
+###  (5) COMPARE
+###
+
+def int_index(df):
+
+    if isinstance(df.index, pd.MultiIndex):
+        index = pd.MultiIndex.from_arrays([df.index.get_level_values(k).astype(int) for k in range(df.index.nlevels)])
+    else:
+        index = df.index.astype(int)
+
+    return df.set_axis(index)
+
+
+# Compare candidate outputs with reference outputs column by column and return a list of records (output, column, max_abs, max_rel, n_fail, passed)
+
+def compare_outputs(reference, candidate, tolerances=TOLERANCES):
+
+    diffs = []
+
+    for output in OUTPUTS:
+        ref = int_index(reference[output])
+        cand = int_index(candidate[output])
+
+        missing_rows = len(ref.index.difference(cand.index))
+
+        for column in ref.columns:
+            rtol, atol = tolerances.get(output, {}).get(column, tolerances.get(output, {}).get('*', (0, 0)))
+
+            if column not in cand.columns:
+                diffs.append({'output': output, 'column': column, 'max_abs': np.nan, 'max_rel': np.nan, 'n_fail': len(ref), 'passed': False})
+                continue
+
+            a = ref[column].to_numpy(dtype=float)
+            b = cand[column].reindex(ref.index).to_numpy(dtype=float)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                delta = np.abs(b - a)
+                same = (a == b) | (np.isnan(a) & np.isnan(b))
+                delta = np.where(same, 0.0, delta)
+                fail = ~same & ~(delta <= atol + rtol * np.abs(a))
+                rel = np.where(same, 0.0, delta / np.abs(a))
+
+            diffs.append({
+                'output': output,
+                'column': column,
+                'max_abs': float(np.nanmax(delta)) if len(delta) else 0.0,
+                'max_rel': float(np.nanmax(rel)) if len(rel) else 0.0,
+                'n_fail': int(fail.sum()) + missing_rows,
+                'passed': not fail.any() and missing_rows == 0})
+
+    return diffs
+
+
+# Compare an engine with the golden outputs of all cases
+
+def check_golden(engine_name, cases, golden_path='golden/', data_path='data/', tolerances=TOLERANCES):
+
+    report = []
+
+    for name in cases:
+        golden, case = load_golden(name, golden_path)
+        scenario, shape, scale = load_case(name, data_path, case['shape'], case['scale'])
+
+        outputs, seconds = run_engine(ENGINES[engine_name], scenario, shape, scale)
+
+        report.append({
+            'case': name,
+            'reference_s': case['seconds'],
+            'engine_s': seconds,
+            'diffs': compare_outputs(golden, outputs, tolerances)})
+
+    return report
+
+
+# Run the reference implementation and an engine side by side for all cases
+
+def compare_engines(engine_name, cases, data_path='data/', tolerances=TOLERANCES, reference_name='reference'):
+
+    report = []
+
+    for name in cases:
+        scenario, shape, scale = load_case(name, data_path)
+
+        reference, reference_s = run_engine(ENGINES[reference_name], scenario, shape, scale)
+        outputs, seconds = run_engine(ENGINES[engine_name], scenario, shape, scale)
+
+        report.append({
+            'case': name,
+            'reference_s': reference_s,
+            'engine_s': seconds,
+            'diffs': compare_outputs(reference, outputs, tolerances)})
+
+    return report
+
+
+
+# Summarize the deviations of an engine from the golden outputs for key results. The relative deviation refers to the largest absolute value of the column in the golden outputs.
+
+DEVIATION_COLUMNS = [
+    ('fleet', 'stock'),
+    ('fleet', 'elvs_exit'),
+    ('fleet', 'elvs_recycling'),
+    ('eol', 'recycling_output_total'),
+    ('closedloop', 'supply_total'),
+    ('closedloop', 'total')]
+
+
+def deviation_report(engine_name, cases, golden_path='golden/', data_path='data/', columns=DEVIATION_COLUMNS):
+
+    report = []
+
+    for name in cases:
+        golden, case = load_golden(name, golden_path)
+        scenario, shape, scale = load_case(name, data_path, case['shape'], case['scale'])
+
+        outputs, seconds = run_engine(ENGINES[engine_name], scenario, shape, scale)
+
+        for output, column in columns:
+            ref = int_index(golden[output])[column]
+            cand = int_index(outputs[output])[column].reindex(ref.index)
+
+            max_abs = float((cand - ref).abs().max())
+            max_ref = float(ref.abs().max())
+
+            report.append({
+                'case': name,
+                'output': output,
+                'column': column,
+                'max_abs': max_abs,
+                'max_rel': max_abs / max_ref if max_ref > 0 else 0.0,
+                'reference_s': case['seconds'],
+                'engine_s': seconds})
+
+    return report
+
+
+
+###
+###  (6) REPORT
+###
+
+def print_report(report, verbose=False):
+
+    print(f"\n{'case':<32}{'reference [s]':>14}{'engine [s]':>12}{'speedup':>10}  result")
+
+    n_failed = 0
+
+    for r in report:
+        failed = [d for d in r['diffs'] if not d['passed']]
+        n_failed += bool(failed)
+
+        speedup = r['reference_s'] / r['engine_s'] if r['engine_s'] > 0 else np.inf
+
+        print(f"{r['case']:<32}{r['reference_s']:>14.3f}{r['engine_s']:>12.3f}{speedup:>9.1f}x  {'FAILED' if failed else 'passed'}")
+
+        for d in r['diffs']:
+            if verbose or not d['passed']:
+                print(f"   {d['output'] + '.' + d['column']:<40} max abs {d['max_abs']:.3e}  max rel {d['max_rel']:.3e}  failed values: {d['n_fail']}")
+
+    if n_failed:
+        print(f'\n(!) {n_failed} of {len(report)} case(s) failed.')
+    else:
+        print(f'\n   all {len(report)} case(s) passed.')
+
+    return n_failed == 0
+
+
+def print_deviation(report):
+
+    print(f"\n{'case':<32}{'result':<42}{'max abs':>12}{'max rel':>12}")
+
+    for r in report:
+        print(f"{r['case']:<32}{r['output'] + '.' + r['column']:<42}{r['max_abs']:>12.3e}{r['max_rel']:>12.3e}")
+
+    cases = {r['case']: (r['reference_s'], r['engine_s']) for r in report}
+
+    print(f"\n   run time: {sum(c[1] for c in cases.values()):.3f} s (reference: {sum(c[0] for c in cases.values()):.3f} s) for {len(cases)} case(s).")
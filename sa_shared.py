@@ -0,0 +1,240 @@
+####
+#
+# CAPsim
+# Shared-Memory Sensitivity Analysis
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Calculates the runs of the sensitivity analysis (see analyzer.run_sa) on parallel worker processes without sending DataFrames between the processes. The baseline inputs of a scenario are converted to arrays and published once in shared memory (multiprocessing.shared_memory). A task only sends the perturbation of its run:
+#
+#   (input, column, vehicle or None, factor, maximum or None)     e.g. ('recycling', 'pp_efficiency', None, 1.2, 100)
+#
+# and the workers write their results into preallocated shared output arrays (the registrations only depend on the CAGR and are built in the main process):
+#
+#   closedloop[run, direction, year, column]                      direction 0: +sensitivity, 1: -sensitivity
+#   fleet_detail[run, direction, id, year_reg, year_now, k]       k as in batch.FLEET_COLUMNS
+#   fleet[run, direction, id, year, k]
+#   eol[run, direction, id, year, column]
+#
+# The workers run the stages of batch.py for one member, so the results equal those of calc_all. The DataFrames of all runs are only built in the main process. With arrays_file, fleet_detail is a memory-mapped file (see storage.py) instead of a shared memory block, and the fleet_detail DataFrames of the runs remain views on that file.
+
+
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from storage import create_array, open_array
+from calculator import polymers_of, polymer_columns, calc_registrations
+from batch import FLEET_COLUMNS, LOSS_COLUMNS, stack_frames, init_registrations, grow_registrations, batch_details, to_frames
+
+
+
+INPUTS = ['vehicles_data', 'loss', 'dismantling', 'recycling', 'production']
+
+OUTPUTS = ['closedloop', 'fleet_detail', 'fleet', 'eol']
+
+
+
+###
+###  (1) SHARED ARRAYS
+###
+
+# Create a shared memory block per array: layout {name: (shape, dtype)} -> {name: block}
+
+def allocate(layout):
+
+    return {name: shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)) for name, (shape, dtype) in layout.items()}
+
+
+# Arrays on the shared memory blocks (the blocks can only be closed once these arrays are deleted)
+
+def views(blocks, layout):
+
+    return {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf) for name, (shape, dtype) in layout.items()}
+
+
+def release(blocks, unlink=False):
+
+    for block in blocks.values():
+        block.close()
+
+        if unlink:
+            block.unlink()
+
+
+
+###
+###  (2) WORKERS
+###
+
+# Shared memory blocks and settings of the worker processes (set once per process)
+
+_blocks = {}
+_settings = {}
+
+
+def init_worker(names, settings):
+
+    _blocks.clear()
+    _blocks.update({name: shared_memory.SharedMemory(name=block_name) for name, block_name in names.items()})
+
+    _settings.clear()
+    _settings.update(settings)
+
+
+# Calculate one run and write its results into the shared output arrays
+
+def run_task(task):
+
+    r, d, (input, column, vehicle, factor, limit) = task
+
+    s = _settings
+    arrays = views(_blocks, s['layout']) | {name: open_array(file, 'r+') for name, file in s['files'].items()}
+
+    inputs = {name: arrays[name][None] for name in INPUTS}
+    cagr = s['cagr']
+
+    if input == 'cagr':
+        cagr = cagr * factor
+
+    else:
+        values = arrays[input].copy()
+        rows = values[s['vehicles'].index(vehicle)] if vehicle is not None else values
+        k = s['columns'][input].index(column)
+
+        rows[..., k] = rows[..., k] * factor
+
+        if limit is not None:
+            rows[..., k] = np.minimum(rows[..., k], limit)
+
+        inputs[input] = values[None]
+
+    inputs['polymers'] = s['polymers']
+    inputs['cagr'] = np.array([cagr], dtype=float)
+    inputs['shape'] = np.array([s['shape']], dtype=float)
+    inputs['scale'] = np.array([s['scale']], dtype=float)
+
+    results = batch_details(grow_registrations(arrays['init'], s['start_year'], s['end_year'], [cagr], s['n_init_years']), inputs)
+
+    for name in OUTPUTS:
+        arrays[name][r, d] = results[name][0]
+
+    return r, d
+
+
+
+###
+###  (3) SENSITIVITY ANALYSIS RUNS
+###
+
+# Calculate the SA runs [(name, sign, perturbation)] on worker processes and return the results of calc_all (registrations, fleet_detail, fleet, eol, closedloop) for each run in the same order
+
+def calc_sa_shared(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, runs, workers, arrays_file=None):
+
+    polymers = polymers_of(vehicles_data)
+    columns = polymer_columns(polymers)
+
+    columns = {
+        'vehicles_data': columns['vehicles_data'],
+        'loss': LOSS_COLUMNS,
+        'dismantling': columns['dismantling'],
+        'recycling': columns['recycling'],
+        'production': columns['production'],
+        'closedloop': columns['closedloop'],
+        'eol': columns['eol']}
+
+    names = list(dict.fromkeys(name for name, sign, perturbation in runs))
+
+    n_runs = len(names)
+    n_vehicles = len(set_vehicles)
+    n_years = len(set_years)
+
+    baseline = {
+        'init': init_registrations(set_years, set_vehicles, n_init_years, registrations),
+        'vehicles_data': stack_frames([vehicles_data], columns['vehicles_data'], set_years, set_vehicles)[0],
+        'loss': stack_frames([loss], columns['loss'], set_years)[0],
+        'dismantling': stack_frames([dismantling], columns['dismantling'], set_years, set_vehicles)[0],
+        'recycling': stack_frames([recycling], columns['recycling'], set_years)[0],
+        'production': stack_frames([production], columns['production'], set_years)[0]}
+
+    layout = {name: (values.shape, 'f8') for name, values in baseline.items()}
+
+    layout.update({
+        'closedloop': ((n_runs, 2, n_years, len(columns['closedloop'])), 'f8'),
+        'fleet_detail': ((n_runs, 2, n_vehicles, n_years, n_years, len(FLEET_COLUMNS)), 'f8'),
+        'fleet': ((n_runs, 2, n_vehicles, n_years, len(FLEET_COLUMNS)), 'f8'),
+        'eol': ((n_runs, 2, n_vehicles, n_years, len(columns['eol'])), 'f8')})
+
+    # Output arrays in memory-mapped files:
+
+    mapped = {}
+
+    if arrays_file is not None:
+        mapped['fleet_detail'] = create_array(arrays_file, layout.pop('fleet_detail')[0])
+
+    settings = {
+        'layout': layout,
+        'files': {name: values.filename for name, values in mapped.items()},
+        'columns': columns,
+        'polymers': polymers,
+        'vehicles': list(set_vehicles),
+        'start_year': start_year,
+        'end_year': end_year,
+        'n_init_years': n_init_years,
+        'cagr': cagr,
+        'shape': shape,
+        'scale': scale}
+
+    tasks = [(names.index(name), 0 if sign == '+' else 1, perturbation) for name, sign, perturbation in runs]
+
+    blocks = allocate(layout)
+
+    try:
+
+        # Publish the baseline inputs:
+
+        arrays = views(blocks, layout)
+
+        for name, values in baseline.items():
+            arrays[name][...] = values
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=({name: block.name for name, block in blocks.items()}, settings)) as pool:
+            list(pool.map(run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+        outputs = {name: arrays[name].copy() for name in OUTPUTS if name in layout} | mapped
+
+    finally:
+        arrays = None
+        release(blocks, unlink=True)
+
+
+    # DATAFRAMES
+
+    # The registrations DataFrame is built once per distinct CAGR:
+
+    registrations_ = {}
+    results = []
+
+    for r, d, (input, column, vehicle, factor, limit) in tasks:
+        _cagr = cagr * factor if input == 'cagr' else cagr
+
+        if _cagr not in registrations_:
+            registrations_[_cagr] = calc_registrations(start_year, end_year, set_vehicles, _cagr, n_init_years, registrations)
+
+        run = {'polymers': polymers} | {name: outputs[name][r] for name in OUTPUTS}
+
+        results.append(to_frames(run, d, set_years, set_vehicles, registrations_[_cagr].copy()))
+
+    return results
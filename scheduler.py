@@ -0,0 +1,281 @@
+####
+#
+# CAPsim
+# Task Graph Scheduler
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Executes the tasks of a run as a directed acyclic graph (see main.run). A task is a function with its arguments; an argument may be the result of another task (the Result returned by add, also inside lists, tuples and dictionaries), which makes that task a dependency:
+#
+#   graph = Scheduler(workers=4, max_memory=8000)
+#   model = graph.add('model_01', model_task, import_file, ...)
+#   export = graph.add('export_01', export_task, model, ...)
+#   results = graph.run()
+#
+# Since a task can only depend on tasks added before it, the graph has no cycles. A task whose dependencies are completed is started in the order in which the tasks were added, as long as a worker is free and the estimated memory (MB) of the running tasks stays within max_memory; a task exceeding max_memory on its own only runs alone. The memory of a task may be given as a function of its arguments, which is evaluated once its dependencies are completed.
+#
+# With workers = 1, the tasks run one after another in the main process in the order in which they were added. With more workers, they run on worker processes (except local tasks, which always run in the main process), which receive their arguments and return their results by pickle (DataFrames on memory-mapped arrays as references, see storage.py); the terminal output of a task is printed once it is completed. A task only receives the results of its dependencies, so the results do not depend on the order of execution.
+#
+# Each task is recorded with its worker, start and end time, wall and CPU time and memory estimate (run_tasks.json, run_tasks.csv, see write_report). The results of a task are released once all tasks depending on it are completed, unless it is added with keep=True.
+
+
+
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import profiler
+import progress
+
+# storage.py (numpy, pandas) is imported when tasks run on worker processes, so that importing this module (e.g. by main.py) stays fast.
+
+
+
+###
+###  (1) TASK RESULTS
+###
+
+class Result:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'Result({self.name!r})'
+
+
+# Names of the tasks referenced in the arguments of a task
+
+def references(value):
+
+    if isinstance(value, Result):
+        return [value.name]
+
+    if isinstance(value, (list, tuple)):
+        return [name for v in value for name in references(v)]
+
+    if isinstance(value, dict):
+        return [name for v in value.values() for name in references(v)]
+
+    return []
+
+
+# Replace the references in the arguments of a task by the results of the tasks
+
+def resolve(value, results):
+
+    if isinstance(value, Result):
+        return results[value.name]
+
+    if isinstance(value, list):
+        return [resolve(v, results) for v in value]
+
+    if isinstance(value, tuple):
+        return tuple(resolve(v, results) for v in value)
+
+    if isinstance(value, dict):
+        return {k: resolve(v, results) for k, v in value.items()}
+
+    return value
+
+
+
+###
+###  (2) WORKERS
+###
+
+def init_worker():
+
+    progress.detach()
+
+
+# Run a task on a worker process and return its pickled result, its terminal output and its CPU time
+
+def execute(func, payload):
+
+    from storage import dumps, loads
+
+    args, kwargs = loads(payload)
+
+    output = io.StringIO()
+    cpu_start = time.process_time()
+
+    try:
+        with contextlib.redirect_stdout(output):
+            value = func(*args, **kwargs)
+
+    except Exception:
+        print(output.getvalue(), end='')
+        raise
+
+    return dumps(value), output.getvalue(), time.process_time() - cpu_start, os.getpid()
+
+
+
+###
+###  (3) SCHEDULER
+###
+
+class Scheduler:
+
+    def __init__(self, workers=1, max_memory=None, on_done=None):
+
+        self.workers = max(1, int(workers))
+        self.max_memory = max_memory
+        self.on_done = on_done
+        self.tasks = {}
+        self.records = []
+
+
+    # Add a task and return a reference to its result. Dependencies are the tasks referenced in the arguments and the tasks in after.
+
+    def add(self, name, func, *args, after=(), memory=0, local=False, keep=False, **kwargs):
+
+        if name in self.tasks:
+            raise ValueError(f"(!) Task '{name}' is already part of the run.")
+
+        deps = list(dict.fromkeys(references(args) + references(kwargs) + list(after)))
+
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"(!) Task '{name}' depends on the unknown task '{dep}'.")
+
+        self.tasks[name] = {
+            'func': func,
+            'args': args,
+            'kwargs': kwargs,
+            'deps': deps,
+            'memory': memory,
+            'local': local,
+            'keep': keep}
+
+        return Result(name)
+
+
+    # Execute all tasks and return the results of the tasks that were kept or that no other task depends on
+
+    def run(self):
+
+        results = {}
+        completed = set()
+        dependents = {name: [other for other, task in self.tasks.items() if name in task['deps']] for name in self.tasks}
+
+        pending = list(self.tasks)
+        running = {}
+        used = 0
+
+        self.start = time.time()
+
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) if self.workers > 1 else None
+
+        if pool is not None:
+            from storage import dumps, loads
+
+        def complete(name, value, start, cpu, worker, memory):
+
+            end = time.time()
+
+            results[name] = value
+            completed.add(name)
+
+            self.records.append({
+                'task': name,
+                'deps': ' '.join(self.tasks[name]['deps']),
+                'worker': worker,
+                'start_s': start - self.start,
+                'end_s': end - self.start,
+                'wall_s': end - start,
+                'cpu_s': cpu,
+                'memory_mb': memory})
+
+            if self.on_done is not None:
+                self.on_done(name, value)
+
+            # Release the results that are no longer needed:
+
+            for dep in self.tasks[name]['deps'] + [name]:
+                if not self.tasks[dep]['keep'] and dependents[dep] and all(d in completed for d in dependents[dep]):
+                    results.pop(dep, None)
+
+        try:
+            while pending or running:
+
+                started = False
+
+                for name in pending:
+                    task = self.tasks[name]
+
+                    if not all(dep in completed for dep in task['deps']):
+                        continue
+
+                    args = resolve(task['args'], results)
+                    kwargs = resolve(task['kwargs'], results)
+                    memory = task['memory'](*args, **kwargs) if callable(task['memory']) else task['memory']
+
+                    workers_busy = pool is not None and not task['local'] and len(running) >= self.workers
+                    memory_full = self.max_memory is not None and running and used + memory > self.max_memory
+
+                    if workers_busy or memory_full:
+                        continue
+
+                    pending.remove(name)
+                    started = True
+
+                    if pool is None or task['local']:
+                        start = time.time()
+                        cpu_start = time.process_time()
+
+                        value = task['func'](*args, **kwargs)
+
+                        complete(name, value, start, time.process_time() - cpu_start, 'main', memory)
+
+                    else:
+                        future = pool.submit(execute, task['func'], dumps((args, kwargs)))
+                        running[future] = (name, time.time(), memory)
+                        used += memory
+
+                    break
+
+                if started or not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in sorted(finished, key=lambda f: list(self.tasks).index(running[f][0])):
+                    name, start, memory = running.pop(future)
+                    used -= memory
+
+                    try:
+                        value, output, cpu, worker = future.result()
+                    except Exception:
+                        print(f'\n(!) Task {name} failed.')
+                        raise
+
+                    print(output, end='')
+
+                    complete(name, loads(value), start, cpu, worker, memory)
+
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        return results
+
+
+    # Write the timing of the tasks as run_tasks.json and run_tasks.csv to export_path
+
+    def write_report(self, export_path):
+
+        profiler.write_report(export_path, 'run_tasks', self.records)
@@ -0,0 +1,299 @@
+####
+#
+# CAPsim
+# What-If Service
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Answers what-if questions on the scenarios in a data folder without editing input files. The scenarios are imported once and their baseline results are kept in memory; a query overrides input parameters and only the stages and years affected by the overrides are recalculated (see diffing.py).
+#
+# Python session:
+#
+#   from service import Session
+#   session = Session('data/')
+#   session.whatif('data_01', [{'input': 'vehicles_data', 'column': 'plastic_content', 'factor': 1.05, 'vehicles': ['BEV']}])
+#
+# HTTP/JSON on localhost ('python capsim.py serve'):
+#
+#   GET  /scenarios                     scenario names, time spans, polymers and vehicle models
+#   GET  /baseline?scenario=data_01     closed-loop rates of the baseline
+#   POST /whatif                        {"scenario": "data_01", "cagr": 2.0, "overrides": [{...}]} -> closed-loop rates
+#
+# An override changes one column of an input ('registrations', 'vehicles_data', 'loss', 'dismantling', 'recycling', 'production') by a factor or to a value, optionally for some vehicle models (ids or names) and years only:
+#
+#   {"input": "recycling", "column": "pp_efficiency", "value": 80, "start_year": 2040, "end_year": 2050}
+
+
+
+import contextlib
+import io
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from reader import INPUT_FORMATS, import_data
+from calculator import polymers_of, calc_registrations, calc_all
+from diffing import STAGES, first_changes, calc_diff
+
+
+
+# Inputs that can be overridden (the columns depend on the polymers of the scenario, see calculator.polymer_columns):
+
+INPUTS = ['registrations', 'vehicles_data', 'loss', 'dismantling', 'recycling', 'production']
+
+# Inputs with a vehicle model level in their index:
+
+VEHICLE_INPUTS = ['registrations', 'vehicles_data', 'dismantling']
+
+
+
+###
+###  (1) OVERRIDES
+###
+
+# Apply an override to a copy of an input DataFrame
+
+def apply_override(frame, override, vehicles_names):
+
+    column = override.get('column')
+
+    if override.get('input') not in INPUTS:
+        raise ValueError(f"(!) Unknown input '{override.get('input')}'. Please choose one of {INPUTS}.")
+
+    if column not in frame.columns:
+        raise ValueError(f"(!) Unknown column '{column}' of input '{override['input']}'. Please choose one of {list(frame.columns)}.")
+
+    if ('factor' in override) == ('value' in override):
+        raise ValueError("(!) An override needs either a 'factor' or a 'value'.")
+
+    frame = frame.copy()
+    frame[column] = frame[column].astype(float)
+
+    years = frame.index.get_level_values('year')
+    rows = (years >= override.get('start_year', years.min())) & (years <= override.get('end_year', years.max()))
+
+    if override.get('vehicles') is not None:
+        if override['input'] not in VEHICLE_INPUTS:
+            raise ValueError(f"(!) Input '{override['input']}' is not defined per vehicle model.")
+
+        names = {str(name): i for i, name in vehicles_names['name'].items()}
+        ids = []
+
+        for v in override['vehicles']:
+            if str(v) in names:
+                ids.append(names[str(v)])
+            elif v in vehicles_names.index:
+                ids.append(v)
+            else:
+                raise ValueError(f"(!) Unknown vehicle model '{v}'. Please use one of the ids {list(vehicles_names.index)} or names {list(names)}.")
+
+        rows &= frame.index.get_level_values('id').isin(ids)
+
+    if 'factor' in override:
+        frame.loc[rows, column] = frame.loc[rows, column] * float(override['factor'])
+    else:
+        frame.loc[rows, column] = float(override['value'])
+
+    return frame
+
+
+
+###
+###  (2) SESSION
+###
+
+# Scenarios of a data folder with their baseline results in memory
+
+class Session:
+
+    def __init__(self, data_path='data/', files=None, shape=3.2, scale=16.75, engine='batch'):
+
+        if files is None:
+            files = sorted(file for file in os.listdir(data_path) if file.lower().startswith('data') and file.lower().endswith(INPUT_FORMATS))
+
+        self.shape = shape
+        self.scale = scale
+        self.engine = engine
+        self.scenarios = {}
+
+        for file in files:
+            with contextlib.redirect_stdout(io.StringIO()):
+                imported = import_data(os.path.join(data_path, file))
+
+            scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = imported
+
+            scenario = {
+                'scenario_name': scenario_name,
+                'start_year': start_year,
+                'end_year': end_year,
+                'n_vehicles': n_vehicles,
+                'vehicles_names': vehicles_names,
+                'vehicles_data': vehicles_data,
+                'cagr': cagr,
+                'n_init_years': n_init_years,
+                'registrations_origin': registrations,
+                'loss': loss,
+                'dismantling': dismantling,
+                'recycling': recycling,
+                'production': production,
+                'set_years': range(start_year, end_year + 1),
+                'set_vehicles': range(1, n_vehicles + 1)}
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                scenario['registrations'], scenario['fleet_detail'], scenario['fleet'], scenario['eol'], scenario['closedloop'] = calc_all(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, scenario['set_years'], scenario['set_vehicles'], shape, scale, engine)
+
+            self.scenarios[os.path.splitext(file)[0]] = scenario
+
+        print(f'   {len(self.scenarios)} scenario(s) loaded: {", ".join(self.scenarios)}')
+
+
+    def get(self, scenario):
+
+        if scenario not in self.scenarios:
+            raise ValueError(f"(!) Unknown scenario '{scenario}'. Please choose one of {list(self.scenarios)}.")
+
+        return self.scenarios[scenario]
+
+
+    def describe(self):
+
+        return [{
+            'scenario': name,
+            'scenario_name': s['scenario_name'],
+            'start_year': s['start_year'],
+            'end_year': s['end_year'],
+            'cagr': s['cagr'],
+            'polymers': polymers_of(s['vehicles_data']),
+            'vehicles': {int(i): str(name) for i, name in s['vehicles_names']['name'].items()}} for name, s in self.scenarios.items()]
+
+
+    def baseline(self, scenario):
+
+        return self.get(scenario)['closedloop']
+
+
+    # Closed-loop rates of a scenario with overridden inputs. Returns closedloop and the first recalculated year per stage ({stage: year or None}).
+
+    def whatif(self, scenario, overrides=(), cagr=None):
+
+        s = self.get(scenario)
+
+        inputs = {name: s['registrations_origin' if name == 'registrations' else name] for name in INPUTS}
+
+        if not isinstance(overrides, (list, tuple)) or not all(isinstance(override, dict) for override in overrides):
+            raise ValueError('(!) The overrides must be a list of objects, e.g. [{"input": "loss", "column": "exports", "factor": 0.5}].')
+
+        for override in overrides:
+            inputs[override.get('input')] = apply_override(inputs.get(override.get('input')), override, s['vehicles_names'])
+
+        cagr = s['cagr'] if cagr is None else float(cagr)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+
+            # The continuous mode has no exact partial recalculation:
+
+            if self.engine == 'continuous':
+                closedloop = calc_all(s['start_year'], s['end_year'], inputs['vehicles_data'], cagr, s['n_init_years'], inputs['registrations'], inputs['loss'], inputs['dismantling'], inputs['recycling'], inputs['production'], s['set_years'], s['set_vehicles'], self.shape, self.scale, self.engine)[4]
+
+                return closedloop, {k: s['start_year'] for k in STAGES}
+
+            registrations = calc_registrations(s['start_year'], s['end_year'], s['set_vehicles'], cagr, s['n_init_years'], inputs['registrations'])
+
+        changes = first_changes(s, s['start_year'], s['end_year'], s['set_years'], s['set_vehicles'], inputs['vehicles_data'], registrations, inputs['loss'], inputs['dismantling'], inputs['recycling'], inputs['production'])
+
+        _, _, _, closedloop = calc_diff(s, changes, inputs['vehicles_data'], registrations, inputs['loss'], inputs['dismantling'], inputs['recycling'], inputs['production'], s['set_years'], s['set_vehicles'], self.shape, self.scale)
+
+        return closedloop, {k: (s['set_years'][y] if y < len(s['set_years']) else None) for k, y in changes.items()}
+
+
+
+###
+###  (3) HTTP/JSON SERVICE
+###
+
+def to_json(closedloop):
+
+    return {'year': [int(y) for y in closedloop.index]} | {c: [None if np.isnan(v) else float(v) for v in closedloop[c].to_numpy(dtype=float)] for c in closedloop.columns}
+
+
+def make_handler(session):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_request(self, query):
+            url = urlparse(self.path)
+
+            try:
+                if url.path == '/scenarios' and query is None:
+                    return self.reply(200, session.describe())
+
+                if url.path == '/baseline' and query is None:
+                    scenario = parse_qs(url.query).get('scenario', [None])[0]
+                    return self.reply(200, {'scenario': scenario, 'closedloop': to_json(session.baseline(scenario))})
+
+                if url.path == '/whatif' and query is not None:
+                    if not isinstance(query, dict):
+                        raise ValueError('(!) The request body must be a JSON object.')
+
+                    t = time.perf_counter()
+                    closedloop, changes = session.whatif(query.get('scenario'), query.get('overrides', []), query.get('cagr'))
+
+                    return self.reply(200, {'scenario': query.get('scenario'), 'seconds': time.perf_counter() - t, 'recalculated_from': changes, 'closedloop': to_json(closedloop)})
+
+                return self.reply(404, {'error': f'(!) Unknown request {self.command} {url.path}.'})
+
+            except (ValueError, KeyError, TypeError) as e:
+                return self.reply(400, {'error': str(e)})
+
+        def do_GET(self):
+            self.handle_request(None)
+
+        def do_POST(self):
+            try:
+                query = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            except ValueError:
+                return self.reply(400, {'error': '(!) The request body is not valid JSON.'})
+
+            self.handle_request(query)
+
+        def log_message(self, format, *args):
+            print(f'   {self.address_string()} {format % args}')
+
+    return Handler
+
+
+def serve(session, host='127.0.0.1', port=8765):
+
+    server = ThreadingHTTPServer((host, port), make_handler(session))
+
+    print(f'   serving what-if queries on http://{host}:{port} (Ctrl+C to stop)')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,156 @@
+####
+#
+# CAPsim
+# Disk-Backed Cohort Arrays
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# The cohort arrays fleet_detail[member, id, year_reg, year_now, k] grow with the number of vehicle models and the square of the horizon, and the sensitivity analysis keeps one per run. With memmap = True (see main.py), they are stored as memory-mapped .npy files in the folder 'arrays/' of the scenario results:
+#
+#   fleet_detail.npy        fleet_detail of the scenario
+#   sa_fleet_detail.npy     fleet_detail of all SA runs
+#   sa_fleet_detail_resume<n>.npy   fleet_detail of the SA runs calculated after the n-th resume of an interrupted run (see resume_array_file)
+#
+# The stages of batch.py write directly into these files, and the fleet_detail DataFrames are views on them, so exporters only read the pages they need. The cached scenario state (see cache.py) and the results sent between the tasks of a run (see scheduler.py) refer to the files instead of holding copies of the arrays, so another process (e.g. 'capsim export') maps the same files without copying them.
+
+
+
+import io
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+
+
+###
+###  (1) ARRAY FILES
+###
+
+# Create a memory-mapped .npy file of zeros (an existing file is replaced, not overwritten, since it may be a hardlink to the results of a previous run)
+
+def create_array(path, shape):
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    return open_memmap(path, mode='w+', dtype=np.float64, shape=tuple(shape))
+
+
+# Unused file name for the arrays of a resumed calculation: runs restored from checkpoints may be views on the file of an earlier attempt, which must not be replaced (see analyzer.calc_sa)
+
+def resume_array_file(path):
+
+    base, ext = os.path.splitext(path)
+
+    attempt = 1
+
+    while os.path.exists(f'{base}_resume{attempt}{ext}'):
+        attempt += 1
+
+    return f'{base}_resume{attempt}{ext}'
+
+
+def open_array(path, mode='r'):
+
+    return np.load(path, mmap_mode=mode)
+
+
+# Memory-mapped file and byte offset of a contiguous array that is a view on a memory-mapped file, or None
+
+def mapped_array(values):
+
+    if not isinstance(values, np.ndarray) or not values.flags['C_CONTIGUOUS']:
+        return None
+
+    base = values
+
+    while isinstance(base, np.ndarray):
+        if isinstance(base, np.memmap) and not isinstance(base.base, np.ndarray) and base.filename is not None:
+            return base.filename, values.ctypes.data - base.ctypes.data
+
+        base = base.base
+
+    return None
+
+
+
+###
+###  (2) CACHED STATE
+###
+
+# Pickle a state with references (file relative to export_path or absolute without export_path, offset, shape) instead of the values of DataFrames on memory-mapped files
+
+class StatePickler(pickle.Pickler):
+
+    def __init__(self, file, export_path=None):
+
+        super().__init__(file)
+        self.export_path = export_path
+
+    def persistent_id(self, obj):
+
+        if not isinstance(obj, pd.DataFrame) or obj.empty or not (obj.dtypes == np.float64).all():
+            return None
+
+        values = obj.to_numpy()
+        mapped = mapped_array(values)
+
+        if mapped is None:
+            return None
+
+        file, offset = mapped
+
+        file = os.path.relpath(file, self.export_path) if self.export_path is not None else os.path.abspath(file)
+
+        return ('array', file, offset, values.shape, obj.columns, obj.index)
+
+
+class StateUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, export_path=None):
+
+        super().__init__(file)
+        self.export_path = export_path
+
+    def persistent_load(self, pid):
+
+        kind, file, offset, shape, columns, index = pid
+
+        if kind != 'array':
+            raise pickle.UnpicklingError(f'(!) Unknown reference {kind} in the cached state.')
+
+        values = open_array(os.path.join(self.export_path, file) if self.export_path is not None else file).reshape(-1)
+
+        start = offset // values.itemsize
+
+        return pd.DataFrame(values[start:start + int(np.prod(shape))].reshape(shape), columns=columns, index=index)
+
+
+# Pickle a state for another process of the same machine (references with absolute file names, see scheduler.py)
+
+def dumps(state):
+
+    f = io.BytesIO()
+    StatePickler(f).dump(state)
+
+    return f.getvalue()
+
+
+def loads(data):
+
+    return StateUnpickler(io.BytesIO(data)).load()
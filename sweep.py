@@ -0,0 +1,272 @@
+####
+#
+# CAPsim
+# Scenario Grid Runner
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Evaluates a grid of parameter combinations on one base input file and writes the closed-loop rates of all combinations to one table (one row per combination and year). The grid is declared in a JSON file:
+#
+#   {
+#     "file": "data/data_01.xlsx",
+#     "years": [2035, 2040],
+#     "axes": [
+#       {"name": "cagr", "values": [0, 1, 2, 3]},
+#       {"name": "scale", "values": [14.0, 16.75, 19.0]},
+#       {"name": "exports", "input": "loss", "column": "exports", "values": [10, 20, 30]},
+#       {"name": "max_pp", "input": "production", "column": "max_pp", "values": [10, 25, 50], "start_year": 2030},
+#       {"name": "bev_plastic", "input": "vehicles_data", "column": "plastic_content", "mode": "factor", "values": [1.0, 1.05], "vehicles": ["BEV"]}
+#     ]
+#   }
+#
+# Axes without an input are the model parameters 'cagr', 'shape' and 'scale'. Axes with an input override one column of 'vehicles_data', 'loss', 'dismantling', 'recycling' or 'production' by a value (default) or a factor, optionally for some vehicle models and years (see service.apply_override). "years" optionally restricts the years in the table.
+#
+# The combinations are split into chunks, which are evaluated in worker processes with the batched stages of batch.py (closed-loop results only, see calc_all_batch). The table is written as CSV (.csv, .csv.gz) or Parquet (.parquet, requires pyarrow).
+
+
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from reader import import_data
+from calculator import polymers_of, polymer_columns
+from batch import stack_inputs, calc_all_batch
+from service import INPUTS, apply_override
+
+
+
+PARAMETERS = ['cagr', 'shape', 'scale']
+
+# Columns of the table next to the axes: the axes may not use these names or those of the closed-loop columns (demand_<polymer>, demand_plastic, supply_<polymer>, supply_total, <polymer>, total)
+
+TABLE_COLUMNS = ['run', 'year']
+
+
+
+###
+###  (1) GRID
+###
+
+def load_grid(grid_file):
+
+    with open(grid_file) as f:
+        grid = json.load(f)
+
+    if not grid.get('axes'):
+        raise ValueError(f"(!) The grid '{grid_file}' does not define any axes.")
+
+    names = [axis.get('name') for axis in grid['axes']]
+
+    if len(set(names)) != len(names) or None in names:
+        raise ValueError(f'(!) Each axis of the grid needs a unique name, not {names}.')
+
+    reserved = [name for name in names if not isinstance(name, str) or name in TABLE_COLUMNS + ['demand_plastic', 'supply_total', 'total'] or name.startswith(('demand_', 'supply_'))]
+
+    if reserved:
+        raise ValueError(f"(!) The axis name(s) {reserved} are reserved for the columns of the table ({', '.join(TABLE_COLUMNS)} and the closed-loop columns). Please rename them.")
+
+    for axis in grid['axes']:
+        if not axis.get('values'):
+            raise ValueError(f"(!) Axis '{axis['name']}' does not define any values.")
+
+        if 'input' not in axis:
+            if axis['name'] not in PARAMETERS:
+                raise ValueError(f"(!) Axis '{axis['name']}' needs an input and a column, or must be one of the parameters {PARAMETERS}.")
+
+        elif axis['input'] not in INPUTS or axis['input'] == 'registrations':
+            raise ValueError(f"(!) Axis '{axis['name']}' cannot override input '{axis['input']}'. Please choose one of {[k for k in INPUTS if k != 'registrations']} (registrations are varied by the CAGR).")
+
+        if axis.get('mode', 'value') not in ('value', 'factor'):
+            raise ValueError(f"(!) Unknown mode '{axis['mode']}' of axis '{axis['name']}'. Please choose 'value' or 'factor'.")
+
+    return grid
+
+
+# All combinations of the axis values as a DataFrame (one column per axis). The model parameters vary slowest, so combinations sharing a vehicle fleet end up in the same chunks.
+
+def combinations(axes):
+
+    order = sorted(range(len(axes)), key=lambda k: 'input' in axes[k])
+
+    combos = pd.DataFrame(list(itertools.product(*[axes[k]['values'] for k in order])), columns=[axes[k]['name'] for k in order])
+
+    return combos[[axis['name'] for axis in axes]]
+
+
+
+###
+###  (2) EVALUATION
+###
+
+# Base scenario of the worker processes (set once per process)
+
+_base = {}
+
+
+def init_worker(base):
+
+    _base.clear()
+    _base.update(base)
+
+
+# Closed-loop results closedloop[b, year, column] of a chunk of combinations
+
+def run_chunk(axes, combos):
+
+    s = _base
+
+    vehicles_data, cagr, loss, dismantling, recycling, production, shape, scale = [], [], [], [], [], [], [], []
+
+    for combo in combos:
+        inputs = {name: s[name] for name in ('vehicles_data', 'loss', 'dismantling', 'recycling', 'production')}
+        parameters = {'cagr': s['cagr'], 'shape': s['shape'], 'scale': s['scale']}
+
+        for axis, value in zip(axes, combo):
+            if 'input' not in axis:
+                parameters[axis['name']] = float(value)
+                continue
+
+            override = {k: axis[k] for k in ('input', 'column', 'vehicles', 'start_year', 'end_year') if k in axis}
+            override[axis.get('mode', 'value')] = value
+
+            inputs[axis['input']] = apply_override(inputs[axis['input']], override, s['vehicles_names'])
+
+        vehicles_data.append(inputs['vehicles_data'])
+        loss.append(inputs['loss'])
+        dismantling.append(inputs['dismantling'])
+        recycling.append(inputs['recycling'])
+        production.append(inputs['production'])
+        cagr.append(parameters['cagr'])
+        shape.append(parameters['shape'])
+        scale.append(parameters['scale'])
+
+    stacked = stack_inputs(s['set_years'], s['set_vehicles'], vehicles_data, cagr, loss, dismantling, recycling, production, shape, scale)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return calc_all_batch(s['start_year'], s['end_year'], s['n_init_years'], s['registrations'], stacked, s['set_years'], s['set_vehicles'])
+
+
+def load_base(import_file, shape, scale):
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        imported = import_data(import_file)
+
+    scenario_name, start_year, end_year, n_years, n_vehicles, vehicles_names, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, tmp = imported
+
+    return {
+        'start_year': start_year,
+        'end_year': end_year,
+        'set_years': range(start_year, end_year + 1),
+        'set_vehicles': range(1, n_vehicles + 1),
+        'vehicles_names': vehicles_names,
+        'vehicles_data': vehicles_data,
+        'cagr': cagr,
+        'n_init_years': n_init_years,
+        'registrations': registrations,
+        'loss': loss,
+        'dismantling': dismantling,
+        'recycling': recycling,
+        'production': production,
+        'shape': shape,
+        'scale': scale}
+
+
+# Evaluate all combinations of a grid and return the table of closed-loop results (one row per combination and year)
+
+def run_sweep(grid, import_file=None, shape=3.2, scale=16.75, workers=None, chunk_size=256):
+
+    import_file = import_file or grid.get('file')
+
+    if import_file is None:
+        raise ValueError("(!) No base input file defined. Please set 'file' in the grid or pass an input file.")
+
+    axes = grid['axes']
+    base = load_base(import_file, shape, scale)
+
+    columns = polymer_columns(polymers_of(base['vehicles_data']))['closedloop']
+    collisions = [axis['name'] for axis in axes if axis['name'] in columns]
+
+    if collisions:
+        raise ValueError(f'(!) The axis name(s) {collisions} collide with the closed-loop columns {columns}. Please rename them.')
+
+    combos = combinations(axes)
+    values = combos.to_numpy(dtype=object)
+    chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(chunks))
+
+    print(f'   {len(combos)} combinations in {len(chunks)} chunk(s) on {workers} process(es)')
+
+    t = time.perf_counter()
+    results = []
+
+    if workers == 1:
+        init_worker(base)
+
+        for k, chunk in enumerate(chunks):
+            results.append(run_chunk(axes, chunk))
+
+            print(f'   chunk {k + 1}/{len(chunks)} done ({time.perf_counter() - t:.1f} s)')
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(base,)) as pool:
+            for k, closedloop in enumerate(pool.map(run_chunk, [axes] * len(chunks), chunks)):
+                results.append(closedloop)
+
+                print(f'   chunk {k + 1}/{len(chunks)} done ({time.perf_counter() - t:.1f} s)')
+
+    closedloop = np.concatenate(results)  # [combination, year, column]
+
+
+    # CONSOLIDATED TABLE
+
+    years = np.array(list(base['set_years']))
+    keep = np.isin(years, grid['years']) if grid.get('years') else np.ones(len(years), dtype=bool)
+
+    n_combos = len(combos)
+    n_keep = int(keep.sum())
+
+    table = pd.DataFrame({'run': np.repeat(np.arange(n_combos), n_keep)})
+
+    for name in combos.columns:
+        table[name] = np.repeat(combos[name].to_numpy(), n_keep)
+
+    table['year'] = np.tile(years[keep], n_combos)
+
+    for c, column in enumerate(polymer_columns(polymers_of(base['vehicles_data']))['closedloop']):
+        table[column] = closedloop[:, keep, c].reshape(-1)
+
+    return table
+
+
+def write_table(table, out):
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+
+    if out.endswith('.parquet'):
+        try:
+            table.to_parquet(out, index=False)
+        except ImportError:
+            raise ValueError('(!) Writing Parquet files requires pyarrow. Please install it or write a CSV file (.csv, .csv.gz).')
+
+    else:
+        table.to_csv(out, index=False)
@@ -0,0 +1,245 @@
+####
+#
+# CAPsim
+# Sub-Annual Time Resolution
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Models the vehicle fleet and the end-of-life stages (fleet exits, exports, unknown whereabouts, recycling inputs and outputs) in steps of 1/steps_per_year years, e.g. quarterly (4) or monthly (12).
+#
+# Each vehicle model is represented cohort by age: stock[id, cohort, age] for the registration period (cohort) and the age in steps, with ages limited to max_age years. Memory and work grow with horizon x max age instead of the squared horizon of fleet_detail[id, year_reg, year_now].
+#
+#   registrations per step = annual registrations / steps_per_year
+#   exit probability per step at age a (in steps) = weibull_pdf(a / steps_per_year) / steps_per_year
+#
+# The stock recursion (floor and clamp) is the cohort survival kernel of kernel.py over the active ages of the cohorts; older cohorts keep their residual stocks, which are summed with a cumulative sum over the cohorts. A cohort reaching max_age leaves the fleet with its residual stock as fleet exits in that step (and passes through exports, unknown whereabouts and recycling like all exits), so the stock plus the cumulated exits always equal the cumulated registrations (see check_balance). With steps_per_year = 1 and no age limit, the results equal those of calc_all.
+
+
+
+import functools
+
+import numpy as np
+import pandas as pd
+from scipy.stats import weibull_min
+
+from kernel import survival_active
+from calculator import polymer_columns, calc_registrations
+from batch import FLEET_COLUMNS, stack_inputs, batch_closedloop, to_frames
+
+
+
+###
+###  (1) KERNEL
+###
+
+# Exit probabilities per step and age, cached for repeated runs with the same parameters
+
+@functools.lru_cache(maxsize=32)
+def step_kernel(shape, scale, steps_per_year, n_ages):
+
+    pdf = weibull_min.pdf(np.arange(n_ages) / steps_per_year, shape, scale=scale) / steps_per_year
+    pdf.flags.writeable = False
+
+    return pdf
+
+
+def steps_index(set_vehicles, set_years, steps_per_year):
+
+    return pd.MultiIndex.from_product([list(set_vehicles), list(set_years), range(1, steps_per_year + 1)], names=['id', 'year', 'step'])
+
+
+
+###
+###  (2) FLEET AND END-OF-LIFE
+###
+
+# Fleet and end-of-life results per step and vehicle model:
+#
+#   fleet[id, step, column] with columns as in FLEET_COLUMNS
+#   eol[id, step, column] with columns as in EOL_COLUMNS
+#
+# reg[id, year] are the annual registrations, and all other inputs are stacked arrays of a single parameter set (see batch.stack_inputs).
+
+def calc_steps(reg, vehicles_data, loss, dismantling, recycling, shape, scale, steps_per_year=4, max_age=None):
+
+    n_vehicles, n_years = reg.shape
+    n_steps = n_years * steps_per_year
+    n_polymers = vehicles_data.shape[-1] - 2
+
+    n_ages = n_steps if max_age is None else min(n_steps, int(max_age * steps_per_year) + 1)
+
+    # Year of each step:
+
+    year = np.arange(n_steps) // steps_per_year
+
+    reg_steps = np.repeat(reg / steps_per_year, steps_per_year, axis=1)  # [id, cohort]
+
+
+    # VEHICLE STOCK PER COHORT AND AGE
+
+    stock_age, _ = survival_active(np.ascontiguousarray(reg_steps.reshape(-1)), step_kernel(shape, scale, steps_per_year, n_ages))
+
+    n_active = stock_age.shape[1]
+    stock_age = stock_age.reshape(n_vehicles, n_steps, n_active)
+
+    exit_age = np.zeros_like(stock_age)
+    exit_age[..., 1:] = stock_age[..., :-1] - stock_age[..., 1:]
+
+    # Arrange by current step and active age: value[id, step, age] of the cohort step - age
+
+    cohort = np.arange(n_steps)[:, None] - np.arange(n_active)[None, :]
+    valid = cohort >= 0
+    cohort = np.where(valid, cohort, 0)
+
+    ages = np.broadcast_to(np.arange(n_active), cohort.shape)
+
+    stock = np.where(valid, stock_age[:, cohort, ages], 0.0)
+    exits = np.where(valid, exit_age[:, cohort, ages], 0.0)
+
+    # Residual stocks of the cohorts beyond the active ages (and within the maximum age):
+
+    residual_sum = np.concatenate([np.zeros((n_vehicles, 1)), np.cumsum(stock_age[..., -1], axis=1)], axis=1)  # residual_sum[id, c] = sum over cohorts < c
+
+    step = np.arange(n_steps)
+    residual = residual_sum[:, np.maximum(step - n_active + 1, 0)] - residual_sum[:, np.maximum(step - n_ages + 1, 0)]
+
+    exports = exits * loss[year, 0][:, None] / 100
+    unknown = exits * loss[year, 1][:, None] / 100
+    elvs_recycling = exits - exports - unknown
+
+    # Cohorts reaching the maximum age in a step (cohort step - n_ages) leave the fleet with their residual stock:
+
+    retired_cohort = np.maximum(step - n_ages, 0)
+    retired = np.where(step >= n_ages, stock_age[:, retired_cohort, -1], 0.0)  # [id, step]
+
+    retired_exports = retired * loss[year, 0] / 100
+    retired_unknown = retired * loss[year, 1] / 100
+    retired_recycling = retired - retired_exports - retired_unknown
+
+    # Cohorts are summed in ascending order of registration (descending age) as in calculator.py, after the retired cohort:
+
+    def cohort_sum(x, total=None):
+        total = np.zeros(x.shape[:-1]) if total is None else total.copy()
+
+        for a in range(n_active - 1, -1, -1):
+            total += x[..., a]
+
+        return total
+
+    fleet = np.stack([cohort_sum(stock, residual)] + [cohort_sum(x, r) for x, r in ((exits, retired), (exports, retired_exports), (unknown, retired_unknown), (elvs_recycling, retired_recycling))], axis=-1)
+
+
+    # RECYCLING INPUTS AND OUTPUTS
+
+    cohort_year = year[cohort]  # year of registration [step, age]
+    retired_year = year[retired_cohort]
+
+    mass = vehicles_data[:, cohort_year, 0]
+    plastic = vehicles_data[:, cohort_year, 1]
+
+    inputs = np.stack([cohort_sum(elvs_recycling * mass * plastic / 100 * vehicles_data[:, cohort_year, 2 + p] / 100, retired_recycling * vehicles_data[:, retired_year, 0] * vehicles_data[:, retired_year, 1] / 100 * vehicles_data[:, retired_year, 2 + p] / 100) for p in range(n_polymers)], axis=-1)
+    input_elvs = fleet[..., 4]
+
+    dismantling_output = input_elvs[..., None] * dismantling[:, year, :]
+    recycling_output = (inputs - dismantling_output) * recycling[year, :][None] / 100
+
+    output_total = recycling_output[..., 0]
+    for p in range(1, n_polymers):
+        output_total = output_total + recycling_output[..., p]
+
+    eol = np.concatenate([inputs, input_elvs[..., None], dismantling_output, recycling_output, output_total[..., None]], axis=-1)
+
+    return fleet, eol
+
+
+# Check the mass balance of the results per step: the stock plus the cumulated fleet exits equal the cumulated registrations of each vehicle model
+
+def check_balance(reg, fleet_steps, steps_per_year):
+
+    registered = np.cumsum(np.repeat(reg / steps_per_year, steps_per_year, axis=1), axis=1)
+    balance = fleet_steps[..., 0] + np.cumsum(fleet_steps[..., 1], axis=1)
+
+    deviation = np.abs(balance - registered)
+    tolerance = 1e-9 * np.maximum(registered, 1)
+
+    if (deviation > tolerance).any():
+        i, t = np.unravel_index(np.argmax(deviation - tolerance), deviation.shape)
+        raise ValueError(f'(!) The sub-annual fleet is not balanced: stock plus cumulated exits deviate from the cumulated registrations by {deviation[i, t]:g} vehicles (vehicle model {i + 1}, step {t + 1}).')
+
+
+# Aggregate results per step to years: stocks at the end of each year, flows summed over the steps of each year
+
+def annual(fleet_steps, eol_steps, steps_per_year):
+
+    n_vehicles, n_steps = fleet_steps.shape[:2]
+    n_years = n_steps // steps_per_year
+
+    fleet_steps = fleet_steps.reshape(n_vehicles, n_years, steps_per_year, -1)
+    eol_steps = eol_steps.reshape(n_vehicles, n_years, steps_per_year, -1)
+
+    fleet = fleet_steps[:, :, 0].copy()
+    eol = eol_steps[:, :, 0].copy()
+
+    for s in range(1, steps_per_year):
+        fleet += fleet_steps[:, :, s]
+        eol += eol_steps[:, :, s]
+
+    fleet[..., 0] = fleet_steps[:, :, -1, 0]
+
+    return fleet, eol
+
+
+
+###
+###  (3) CALCULATE ALL
+###
+
+# Sub-annual counterpart of calculator.calc_all. Returns the results per step (fleet_steps, eol_steps indexed by id, year, step) and the annual results (registrations, fleet, eol, closedloop) aggregated from them.
+
+def calc_all_steps(start_year, end_year, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production, set_years, set_vehicles, shape, scale, steps_per_year=4, max_age=None):
+
+    if steps_per_year < 1 or int(steps_per_year) != steps_per_year:
+        raise ValueError(f'(!) The number of time steps per year must be a positive integer (e.g. 4 for quarters or 12 for months), not {steps_per_year}.')
+
+    steps_per_year = int(steps_per_year)
+
+    _registrations = calc_registrations(start_year, end_year, set_vehicles, cagr, n_init_years, registrations)
+
+    inputs = stack_inputs(set_years, set_vehicles, [vehicles_data], [cagr], [loss], [dismantling], [recycling], [production], [shape], [scale])
+
+    reg = _registrations['registrations'].reindex(pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])).to_numpy(dtype=float).reshape(len(set_vehicles), len(set_years))
+
+    fleet_steps, eol_steps = calc_steps(reg, inputs['vehicles_data'][0], inputs['loss'][0], inputs['dismantling'][0], inputs['recycling'][0], shape, scale, steps_per_year, max_age)
+
+    check_balance(reg, fleet_steps, steps_per_year)
+
+    fleet, eol = annual(fleet_steps, eol_steps, steps_per_year)
+
+    closedloop = batch_closedloop(reg[None], inputs['vehicles_data'], eol[None], inputs['production'])
+
+    results = {
+        'polymers': inputs['polymers'],
+        'registrations': reg[None],
+        'fleet_detail': None,
+        'fleet': fleet[None],
+        'eol': eol[None],
+        'closedloop': closedloop}
+
+    _registrations, _, _fleet, _eol, _closedloop = to_frames(results, 0, set_years, set_vehicles, _registrations)
+
+    index = steps_index(set_vehicles, set_years, steps_per_year)
+
+    _fleet_steps = pd.DataFrame(fleet_steps.reshape(-1, len(FLEET_COLUMNS)), columns=FLEET_COLUMNS, index=index)
+    _eol_steps = pd.DataFrame(eol_steps.reshape(-1, eol_steps.shape[-1]), columns=polymer_columns(inputs['polymers'])['eol'], index=index)
+
+    return _registrations, _fleet_steps, _eol_steps, _fleet, _eol, _closedloop
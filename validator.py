@@ -0,0 +1,210 @@
+####
+#
+# CAPsim
+# Input Validation
+#
+# AUTHOR: Dominik Reichert
+#         Technical University of Munich
+#         (dominik.reichert@tum.de)
+#
+# VERSION: 1.0.0
+#
+# LICENSE: Copyright 2025 Dominik Reichert
+#
+####
+
+
+
+# Checks the imported inputs of a scenario (see reader.import_data) before any modeling, so malformed input files are rejected within seconds instead of after the fleet calculation or the sensitivity analysis. The checks are evaluated on whole columns at once and all problems are reported together:
+#
+#   basic information   start year <= end year, at least one vehicle model and one initialization year, finite CAGR
+#   shapes and years    one row per vehicle model and year (vehicles_data, dismantling), per year (loss, recycling, production) and per vehicle model and initialization year (registrations); the same polymers in all inputs
+#   values              numbers only (no empty cells), masses and registrations >= 0, shares, rates and efficiencies between 0 and 100%
+#   sums                polymer contents of a vehicle model and year <= 100% of its plastic content, exports and unknown whereabouts of a year <= 100%
+#
+# A problem names the input, the column, the number of rows affected and the first of them, e.g.
+#
+#   vehicles_data: pp_content + pa_content + pc_content + abs_content above 100% in 3 of 122 rows (first: vehicle 2, year 2031: 104)
+
+
+
+import numpy as np
+import pandas as pd
+
+from calculator import polymers_of, polymer_columns
+
+
+
+###
+###  (1) CHECKS
+###
+
+# Label of a row for the problem messages, e.g. 'vehicle 2, year 2031' or 'year 2031'
+
+def row_label(index, k):
+
+    if isinstance(index, pd.MultiIndex):
+        return ', '.join(f"{'vehicle' if name == 'id' else name} {value}" for name, value in zip(index.names, index[k]))
+
+    return f'{index.name} {index[k]}'
+
+
+# Add a problem for the rows where mask is True
+
+def check(problems, name, text, mask, df, values):
+
+    n = int(np.count_nonzero(mask))
+
+    if n == 0:
+        return
+
+    k = int(np.argmax(mask))
+    value = values[k]
+
+    if isinstance(value, (float, np.floating)):
+        value = f'{value:g}'
+
+    problems.append(f'{name}: {text} in {n} of {len(mask)} rows (first: {row_label(df.index, k)}: {value})')
+
+
+# Check that the index of an input has one row per vehicle model and year (or per year)
+
+def check_index(problems, name, df, expected):
+
+    if len(df.index) != len(expected) or not (df.index == expected).all():
+        problems.append(f'{name}: expected {len(expected)} rows ({describe(expected)}), found {len(df.index)} rows ({describe(df.index)})')
+        return False
+
+    return True
+
+
+def describe(index):
+
+    if len(index) == 0:
+        return 'none'
+
+    if isinstance(index, pd.MultiIndex):
+        ids = index.get_level_values(0)
+        years = index.get_level_values(1)
+        return f'vehicles {ids.min()}-{ids.max()}, years {years.min()}-{years.max()}'
+
+    return f'years {index.min()}-{index.max()}'
+
+
+# Check the columns of an input and return its values as floats (non-numeric values as NaN)
+
+def check_values(problems, name, df, columns, lower=None, upper=None, unit=''):
+
+    missing = [c for c in columns if c not in df.columns]
+
+    if missing:
+        problems.append(f"{name}: missing column(s) {', '.join(missing)}")
+
+    columns = [c for c in columns if c in df.columns]
+    values = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    for c, column in enumerate(columns):
+        v = values[:, c]
+
+        check(problems, name, f'{column} is empty or not a number', np.isnan(v), df, df[column].to_numpy())
+
+        if lower is not None:
+            check(problems, name, f'{column} below {lower}{unit}', v < lower, df, v)
+
+        if upper is not None:
+            check(problems, name, f'{column} above {upper}{unit}', v > upper, df, v)
+
+    return dict(zip(columns, values.T))
+
+
+
+###
+###  (2) VALIDATION
+###
+
+# Problems of the imported inputs of a scenario (empty list if the inputs are valid)
+
+def check_inputs(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production):
+
+    problems = []
+
+    if end_year < start_year:
+        problems.append(f'Vehicles: end year {end_year} is before start year {start_year}')
+
+    if n_vehicles < 1:
+        problems.append(f'Vehicles: number of vehicle models is {n_vehicles}, at least one is required')
+
+    if n_init_years < 1:
+        problems.append('Registrations: no registration data defined, at least one year is required')
+
+    if not np.isfinite(cagr):
+        problems.append(f'Registrations: CAGR is not a number ({cagr})')
+
+    if problems:
+        return problems
+
+    set_years = pd.Index(range(start_year, end_year + 1), name='year')
+    set_vehicles = range(1, n_vehicles + 1)
+
+    by_vehicle = pd.MultiIndex.from_product([set_vehicles, set_years], names=['id', 'year'])
+    by_init_year = pd.MultiIndex.from_product([set_vehicles, range(start_year, start_year + n_init_years)], names=['id', 'year'])
+
+    polymers = polymers_of(vehicles_data)
+    columns = polymer_columns(polymers)
+
+    if not polymers:
+        problems.append('vehicles_data: no polymer contents (<polymer>_content) defined')
+
+
+    # Shapes and years of all inputs:
+
+    aligned = {
+        'vehicles_data': check_index(problems, 'vehicles_data', vehicles_data, by_vehicle),
+        'registrations': check_index(problems, 'registrations', registrations, by_init_year),
+        'loss': check_index(problems, 'loss', loss, set_years),
+        'dismantling': check_index(problems, 'dismantling', dismantling, by_vehicle),
+        'recycling': check_index(problems, 'recycling', recycling, set_years),
+        'production': check_index(problems, 'production', production, set_years)}
+
+
+    # Values and sums of the inputs with the expected rows:
+
+    if aligned['vehicles_data']:
+        check_values(problems, 'vehicles_data', vehicles_data, ['total_mass'], lower=0, unit=' kg')
+        values = check_values(problems, 'vehicles_data', vehicles_data, columns['vehicles_data'][1:], lower=0, upper=100, unit='%')
+
+        contents = [f'{p}_content' for p in polymers]
+        total = np.sum([values[c] for c in contents], axis=0)
+
+        check(problems, 'vehicles_data', f"{' + '.join(contents)} above 100%", total > 100 + 1e-9, vehicles_data, total)
+
+    if aligned['registrations']:
+        check_values(problems, 'registrations', registrations, ['registrations'], lower=0)
+
+    if aligned['loss']:
+        values = check_values(problems, 'loss', loss, ['exports', 'unknown_whereabouts'], lower=0, upper=100, unit='%')
+
+        if len(values) == 2:
+            total = values['exports'] + values['unknown_whereabouts']
+            check(problems, 'loss', 'exports + unknown_whereabouts above 100%', total > 100 + 1e-9, loss, total)
+
+    if aligned['dismantling']:
+        check_values(problems, 'dismantling', dismantling, columns['dismantling'], lower=0, unit=' kg')
+
+    if aligned['recycling']:
+        check_values(problems, 'recycling', recycling, columns['recycling'], lower=0, upper=100, unit='%')
+
+    if aligned['production']:
+        check_values(problems, 'production', production, columns['production'], lower=0, upper=100, unit='%')
+
+    return problems
+
+
+# Raise a ValueError listing all problems of the imported inputs of an input file
+
+def validate_inputs(file_path, start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production):
+
+    problems = check_inputs(start_year, end_year, n_years, n_vehicles, vehicles_data, cagr, n_init_years, registrations, loss, dismantling, recycling, production)
+
+    if problems:
+        raise ValueError(f"(!) The input file '{file_path}' is not valid ({len(problems)} problem(s)):\n" + '\n'.join(f'   - {problem}' for problem in problems))
@@ -15,425 +15,111 @@
 
 
 
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 
 
 
-def export_data(export_path, scenario_id, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, fleet, eol, closedloop):
-
-    if n_scenarios == 1:
-        file_name = 'results'
-    else:
-        file_name = f'{scenario_id}_results'
+# Sheet with a first row for the total and one row per vehicle model (id). The total is summed in the order of the vehicle models.
 
-    columns = ['vehicle'] + [str(year) for year in set_years]
+def vehicle_sheet(frame, column, set_years, set_vehicles, vehicles_names):
 
+    data = frame[column].reindex(pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])).to_numpy(dtype=float).reshape(len(set_vehicles), len(set_years))
 
-    ### (1) REGISTRATIONS
+    total = np.zeros(len(set_years))
 
-    sheet_registrations = pd.DataFrame({}, columns=columns)
+    for row in data:
+        total += row
 
-    sheet_registrations.loc[0, 'vehicle'] = 'Total'
+    sheet = pd.DataFrame(np.vstack([total[None, :], data]), columns=[str(year) for year in set_years])
+    sheet.insert(0, 'vehicle', ['Total'] + vehicles_names['name'].reindex(list(set_vehicles)).tolist())
 
-    total = [0 for year in set_years]
+    return sheet
 
-    for veh in set_vehicles:
-        sheet_registrations.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
 
-        data = [registrations.loc[(veh, year), 'registrations'] for year in set_years]
+# Sheet with one row per vehicle model (id) and polymer of the end-of-life columns '<prefix><polymer>'
 
-        idx = 0
+def polymer_sheet(eol, prefix, polymers, set_years, set_vehicles, vehicles_names):
 
-        for year in set_years:
-            sheet_registrations.loc[veh, str(year)] = data[idx]
+    n_polymers = len(polymers)
 
-            total[idx] += data[idx]
-            idx += 1
+    data = eol[[f'{prefix}{polymer}' for polymer in polymers]].reindex(pd.MultiIndex.from_product([list(set_vehicles), list(set_years)])).to_numpy(dtype=float)
+    data = data.reshape(len(set_vehicles), len(set_years), n_polymers).transpose(0, 2, 1).reshape(-1, len(set_years))
 
-    idx = 0
+    sheet = pd.DataFrame(data, columns=[str(year) for year in set_years])
+    sheet.insert(0, 'plastic', [polymer.upper() for polymer in polymers] * len(set_vehicles))
+    sheet.insert(0, 'vehicle', [name if k == 0 else None for name in vehicles_names['name'].reindex(list(set_vehicles)) for k in range(n_polymers)])
 
-    for year in set_years:
-        sheet_registrations.loc[0, str(year)] = total[idx]
-        idx += 1
+    return sheet
 
 
-    ### (2) FLEET
 
-    sheet_fleet = pd.DataFrame({}, columns=columns)
-
-    sheet_fleet.loc[0, 'vehicle'] = 'Total'
+def export_data(export_path, scenario_id, n_scenarios, set_years, set_vehicles, vehicles_names, registrations, fleet, eol, closedloop):
 
-    total = [0 for year in set_years]
+    if n_scenarios == 1:
+        file_name = 'results'
+    else:
+        file_name = f'{scenario_id}_results'
 
-    for veh in set_vehicles:
-        sheet_fleet.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
+    # The sheets are built from whole arrays per result, so the export time grows linearly with the number of vehicle models
 
-        data = [fleet.loc[(veh, year), 'stock'] for year in set_years]
 
-        idx = 0
+    ### (1) REGISTRATIONS
 
-        for year in set_years:
-            sheet_fleet.loc[veh, str(year)] = data[idx]
+    sheet_registrations = vehicle_sheet(registrations, 'registrations', set_years, set_vehicles, vehicles_names)
 
-            total[idx] += data[idx]
-            idx += 1
 
-    idx = 0
+    ### (2) FLEET
 
-    for year in set_years:
-        sheet_fleet.loc[0, str(year)] = total[idx]
-        idx += 1
+    sheet_fleet = vehicle_sheet(fleet, 'stock', set_years, set_vehicles, vehicles_names)
 
 
     ### (3) ELVS_EXIT
 
-    sheet_exit = pd.DataFrame({}, columns=columns)
-
-    sheet_exit.loc[0, 'vehicle'] = 'Total'
-
-    total = [0 for year in set_years]
-
-    for veh in set_vehicles:
-        sheet_exit.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        data = [fleet.loc[(veh, year), 'elvs_exit'] for year in set_years]
-
-        idx = 0
-
-        for year in set_years:
-            sheet_exit.loc[veh, str(year)] = data[idx]
-
-            total[idx] += data[idx]
-            idx += 1
-
-    idx = 0
-
-    for year in set_years:
-        sheet_exit.loc[0, str(year)] = total[idx]
-        idx += 1
+    sheet_exit = vehicle_sheet(fleet, 'elvs_exit', set_years, set_vehicles, vehicles_names)
 
 
     ### (4) ELVS_EXPORT
 
-    sheet_export = pd.DataFrame({}, columns=columns)
-
-    sheet_export.loc[0, 'vehicle'] = 'Total'
-
-    total = [0 for year in set_years]
-
-    for veh in set_vehicles:
-        sheet_export.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        data = [fleet.loc[(veh, year), 'elvs_export'] for year in set_years]
-
-        idx = 0
-
-        for year in set_years:
-            sheet_export.loc[veh, str(year)] = data[idx]
-
-            total[idx] += data[idx]
-            idx += 1
-
-    idx = 0
-
-    for year in set_years:
-        sheet_export.loc[0, str(year)] = total[idx]
-        idx += 1
+    sheet_export = vehicle_sheet(fleet, 'elvs_export', set_years, set_vehicles, vehicles_names)
 
 
     ### (5) ELVS_UNKNOWN
 
-    sheet_unknown = pd.DataFrame({}, columns=columns)
-
-    sheet_unknown.loc[0, 'vehicle'] = 'Total'
-
-    total = [0 for year in set_years]
-
-    for veh in set_vehicles:
-        sheet_unknown.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        data = [fleet.loc[(veh, year), 'elvs_unknown'] for year in set_years]
-
-        idx = 0
-
-        for year in set_years:
-            sheet_unknown.loc[veh, str(year)] = data[idx]
-
-            total[idx] += data[idx]
-            idx += 1
-
-    idx = 0
-
-    for year in set_years:
-        sheet_unknown.loc[0, str(year)] = total[idx]
-        idx += 1
+    sheet_unknown = vehicle_sheet(fleet, 'elvs_unknown', set_years, set_vehicles, vehicles_names)
 
 
     ### (6) ELVS_RECYCLING
 
-    sheet_recycling = pd.DataFrame({}, columns=columns)
-
-    sheet_recycling.loc[0, 'vehicle'] = 'Total'
-
-    total = [0 for year in set_years]
-
-    for veh in set_vehicles:
-        sheet_recycling.loc[veh, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        data = [fleet.loc[(veh, year), 'elvs_recycling'] for year in set_years]
-
-        idx = 0
-
-        for year in set_years:
-            sheet_recycling.loc[veh, str(year)] = data[idx]
-
-            total[idx] += data[idx]
-            idx += 1
-
-    idx = 0
-
-    for year in set_years:
-        sheet_recycling.loc[0, str(year)] = total[idx]
-        idx += 1
+    sheet_recycling = vehicle_sheet(fleet, 'elvs_recycling', set_years, set_vehicles, vehicles_names)
 
 
     ### (7) EOL_INPUT
 
-    columns = ['vehicle', 'plastic'] + [str(year) for year in set_years]
-
-    sheet_rec_input = pd.DataFrame({}, columns=columns)
-
-    row = 0
-
-    for veh in set_vehicles:
-        sheet_rec_input.loc[row, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        # PP:
-
-        sheet_rec_input.loc[row, 'plastic'] = 'PP'
-        data = [eol.loc[(veh, year), 'input_pp'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_input.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
+    # Polymers of the scenario (see calculator.polymers_of):
 
-        # PA:
+    polymers = [column[len('input_'):] for column in eol.columns if column.startswith('input_') and column != 'input_elvs']
 
-        sheet_rec_input.loc[row, 'plastic'] = 'PA'
-        data = [eol.loc[(veh, year), 'input_pa'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_input.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # PC:
-
-        sheet_rec_input.loc[row, 'plastic'] = 'PC'
-        data = [eol.loc[(veh, year), 'input_pc'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_input.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # ABS:
-
-        sheet_rec_input.loc[row, 'plastic'] = 'ABS'
-        data = [eol.loc[(veh, year), 'input_abs'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_input.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
+    sheet_rec_input = polymer_sheet(eol, 'input_', polymers, set_years, set_vehicles, vehicles_names)
 
 
     ### (8) EOL_DISMANTLING
 
-    sheet_rec_dismantling = pd.DataFrame({}, columns=columns)
-
-    row = 0
-
-    for veh in set_vehicles:
-        sheet_rec_dismantling.loc[row, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        # PP:
-        
-        sheet_rec_dismantling.loc[row, 'plastic'] = 'PP'
-        data = [eol.loc[(veh, year), 'dismantling_output_pp'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_dismantling.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # PA:
-
-        sheet_rec_dismantling.loc[row, 'plastic'] = 'PA'
-        data = [eol.loc[(veh, year), 'dismantling_output_pa'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_dismantling.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # PC:
-
-        sheet_rec_dismantling.loc[row, 'plastic'] = 'PC'
-        data = [eol.loc[(veh, year), 'dismantling_output_pc'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_dismantling.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # ABS:
-
-        sheet_rec_dismantling.loc[row, 'plastic'] = 'ABS'
-        data = [eol.loc[(veh, year), 'dismantling_output_abs'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_dismantling.loc[row, str(year)] = data[idx]
-            idx += 1
-        
-        row += 1
+    sheet_rec_dismantling = polymer_sheet(eol, 'dismantling_output_', polymers, set_years, set_vehicles, vehicles_names)
 
 
     ### (9) EOL_OUTPUT
 
-    sheet_rec_output = pd.DataFrame({}, columns=columns)
-
-    row = 0
-
-    for veh in set_vehicles:
-        sheet_rec_output.loc[row, 'vehicle'] = vehicles_names.loc[veh, 'name']
-
-        # PP:
-
-        sheet_rec_output.loc[row, 'plastic'] = 'PP'
-        data = [eol.loc[(veh, year), 'recycling_output_pp'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_output.loc[row, str(year)] = data[idx]
-            idx += 1
-        
-        row += 1
-
-        # PA:
-
-        sheet_rec_output.loc[row, 'plastic'] = 'PA'
-        data = [eol.loc[(veh, year), 'recycling_output_pa'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_output.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # PC:
-
-        sheet_rec_output.loc[row, 'plastic'] = 'PC'
-        data = [eol.loc[(veh, year), 'recycling_output_pc'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_output.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
-
-        # ABS:
-
-        sheet_rec_output.loc[row, 'plastic'] = 'ABS'
-        data = [eol.loc[(veh, year), 'recycling_output_abs'] for year in set_years]
-
-        idx = 0
-        for year in set_years:
-            sheet_rec_output.loc[row, str(year)] = data[idx]
-            idx += 1
-
-        row += 1
+    sheet_rec_output = polymer_sheet(eol, 'recycling_output_', polymers, set_years, set_vehicles, vehicles_names)
 
 
     ### (10) CLOSED-LOOP RATES
 
-    columns = [''] + [str(year) for year in set_years]
-
-    sheet_closedloop = pd.DataFrame({}, columns=columns)
-
-    # Total:
-
-    row = 0
-    sheet_closedloop.loc[row, ''] = 'Total'
-    data = [closedloop.loc[year, 'total'] for year in set_years]
-
-    idx = 0
-    for year in set_years:
-        sheet_closedloop.loc[row, str(year)] = data[idx]
-        idx += 1
-
-    # PP:
-
-    row += 1
-    sheet_closedloop.loc[row, ''] = 'PP'
-    data = [closedloop.loc[year, 'pp'] for year in set_years]
-
-    idx = 0
-    for year in set_years:
-        sheet_closedloop.loc[row, str(year)] = data[idx]
-        idx += 1
-
-    # PA:
-
-    row += 1
-    sheet_closedloop.loc[row, ''] = 'PA'
-    data = [closedloop.loc[year, 'pa'] for year in set_years]
-
-    idx = 0
-    for year in set_years:
-        sheet_closedloop.loc[row, str(year)] = data[idx]
-        idx += 1
-
-    # PC:
-
-    row += 1
-    sheet_closedloop.loc[row, ''] = 'PC'
-    data = [closedloop.loc[year, 'pc'] for year in set_years]
-
-    idx = 0
-    for year in set_years:
-        sheet_closedloop.loc[row, str(year)] = data[idx]
-        idx += 1
-
-    # ABS:
-
-    row += 1
-    sheet_closedloop.loc[row, ''] = 'ABS'
-    data = [closedloop.loc[year, 'abs'] for year in set_years]
+    rates = ['total'] + polymers
 
-    idx = 0
-    for year in set_years:
-        sheet_closedloop.loc[row, str(year)] = data[idx]
-        idx += 1
+    sheet_closedloop = pd.DataFrame(closedloop.loc[list(set_years), rates].to_numpy(dtype=float).T, columns=[str(year) for year in set_years])
+    sheet_closedloop.insert(0, '', ['Total' if rate == 'total' else rate.upper() for rate in rates])
 
 
     ### (11) EXPORT
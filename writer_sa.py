@@ -21,7 +21,12 @@ import os
 
 
 
-def export_sa_data(export_sa_path, export_sa_tmp_path, s, sa_results, tmp_tornado_1, tmp_tornado_2, results_range, start_year, end_year, set_years, target_year, plotter_end_year):
+# report(label) is called after the Excel results of each SA run are written (see progress.py)
+
+def export_sa_data(export_sa_path, export_sa_tmp_path, s, sa_results, tmp_tornado_1, tmp_tornado_2, results_range, start_year, end_year, set_years, target_year, plotter_end_year, report=None):
+
+    if report is None:
+        report = lambda label: None
 
     # Export SA results:
 
@@ -46,6 +51,8 @@ def export_sa_data(export_sa_path, export_sa_tmp_path, s, sa_results, tmp_tornad
                 if isinstance(data, pd.DataFrame):
                     data.to_excel(writer, sheet_name=element_name[:30], index=True)
 
+        report(f'sa_tmp_plus_{param_name}')
+
     for param_name, values_list in sa_results[s][4].items():
         fname = f'{export_sa_tmp_path}sa_tmp_minus_{param_name}.xlsx'
         with pd.ExcelWriter(fname, engine='xlsxwriter') as writer:
@@ -53,11 +60,13 @@ def export_sa_data(export_sa_path, export_sa_tmp_path, s, sa_results, tmp_tornad
                 if isinstance(data, pd.DataFrame):
                     data.to_excel(writer, sheet_name=element_name[:30], index=True)
 
+        report(f'sa_tmp_minus_{param_name}')
+
     # Export SA tornado data:
 
     fname = f'{export_sa_path}sa_tornado_{target_year}_data.xlsx'
     with pd.ExcelWriter(fname, engine='xlsxwriter') as writer:
-        for polymer in ['pp', 'pa', 'pc', 'abs', 'total']:
+        for polymer in tmp_tornado_1['polymer'].unique():
             df_polymer = tmp_tornado_1[tmp_tornado_1['polymer'] == polymer].copy()
 
             df_polymer = df_polymer.drop('polymer', axis=1)
@@ -69,7 +78,7 @@ def export_sa_data(export_sa_path, export_sa_tmp_path, s, sa_results, tmp_tornad
 
     fname = f'{export_sa_path}sa_tornado_{plotter_end_year}_data.xlsx'
     with pd.ExcelWriter(fname, engine='xlsxwriter') as writer:
-        for polymer in ['pp', 'pa', 'pc', 'abs', 'total']:
+        for polymer in tmp_tornado_2['polymer'].unique():
             df_polymer = tmp_tornado_2[tmp_tornado_2['polymer'] == polymer].copy()
 
             df_polymer = df_polymer.drop('polymer', axis=1)